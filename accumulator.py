@@ -0,0 +1,324 @@
+# -------------------------------------------
+#
+# accumulate the number of articles and citations per affiliation
+#
+# -------------------------------------------
+
+# modules
+import math
+import hashlib
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# columns of the table of affiliations
+COLUMNS = ['preprint', 'published', 'num_articles', 'preprint_ln', 'published_ln']
+
+# tolerance of the comparison of the number of articles of an affiliation with $num_articles_min$
+# the fractional credit is summed in different orders (chunks, worker processes, cache, store), so an affiliation with exactly $num_articles_min$ articles may be summed up slightly below it
+NUM_ARTICLES_TOLERANCE = 1e-6
+
+
+class AffiliationAccumulator:
+
+    # affiliations are interned into integer IDs and the totals are kept in a growable NumPy array (one row per column, one column per affiliation)
+    # contributions of articles are buffered and added with a scatter-add every $chunk_size$ contributions
+
+    def __init__(self, chunk_size=10000):
+        self.chunk_size = chunk_size
+        self.ids = {}
+        self.names = []
+        self.totals = np.zeros((len(COLUMNS), 1024))
+        self.buffer_ids = []
+        self.buffer_weights = []
+        self.buffer_preprint = []
+        self.buffer_published = []
+
+    def intern(self, affiliation):
+        affiliation_id = self.ids.get(affiliation)
+        if affiliation_id == None:
+            affiliation_id = len(self.names)
+            self.ids[affiliation] = affiliation_id
+            self.names.append(affiliation)
+        return affiliation_id
+
+    def grow(self):
+
+        # grow the array of totals by doubling so that it has a column for every interned affiliation
+        if len(self.names) > self.totals.shape[1]:
+            totals = np.zeros((len(COLUMNS), max(len(self.names), 2 * self.totals.shape[1])))
+            totals[:, :self.totals.shape[1]] = self.totals
+            self.totals = totals
+
+    def add(self, affiliations, citation_preprint, citation_published):
+
+        # $affiliations$ maps each affiliation of an article to its fractional credit
+        for affiliation, weight in affiliations.items():
+            self.buffer_ids.append(self.intern(affiliation))
+            self.buffer_weights.append(weight)
+            self.buffer_preprint.append(citation_preprint)
+            self.buffer_published.append(citation_published)
+
+        if len(self.buffer_ids) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+
+        if len(self.buffer_ids) == 0:
+            return
+
+        self.grow()
+
+        ids = np.array(self.buffer_ids)
+        weights = np.array(self.buffer_weights)
+        citation_preprint = np.array(self.buffer_preprint, dtype=float)
+        citation_published = np.array(self.buffer_published, dtype=float)
+        values = {
+            'preprint': citation_preprint * weights,
+            'published': citation_published * weights,
+            'num_articles': weights,
+            'preprint_ln': np.log(citation_preprint + 1) * weights,
+            'published_ln': np.log(citation_published + 1) * weights,
+        }
+        for k, column in enumerate(COLUMNS):
+            self.totals[k, :len(self.names)] += np.bincount(ids, weights=values[column], minlength=len(self.names))
+
+        self.buffer_ids = []
+        self.buffer_weights = []
+        self.buffer_preprint = []
+        self.buffer_published = []
+
+    def merge(self, other):
+
+        # add the totals of another accumulator (e.g., built by another worker) to this one
+        self.flush()
+        other.flush()
+        ids = np.array([self.intern(affiliation) for affiliation in other.names], dtype=int)
+        self.grow()
+        self.totals[:, ids] += other.totals[:, :len(other.names)]
+        return self
+
+    def to_arrays(self):
+        # interned affiliations and their totals (e.g., to be written to a partial-state file, see partial_state.py)
+        self.flush()
+        return list(self.names), self.totals[:, :len(self.names)].copy()
+
+    @classmethod
+    def from_arrays(cls, names, totals, chunk_size=10000):
+        accumulator = cls(chunk_size)
+        for affiliation in names:
+            accumulator.intern(affiliation)
+        accumulator.grow()
+        accumulator.totals[:, :len(names)] = totals
+        return accumulator
+
+    def to_frame(self):
+        self.flush()
+        return pd.DataFrame(self.totals[:, :len(self.names)].T, index=list(self.names), columns=COLUMNS)
+
+
+@lru_cache(maxsize=1 << 16)
+def sketch_cells(affiliation, depth, width):
+    # cells of an affiliation in the rows of a sketch (the most recent affiliations are cached, since the same affiliations are added to many sketches)
+    digest = hashlib.blake2b(repr(affiliation).encode('utf-8'), digest_size=8 * depth).digest()
+    return tuple([int.from_bytes(digest[8 * d:8 * d + 8], 'little') % width for d in range(depth)])
+
+
+class CountMinSketch:
+
+    # upper bounds of the numbers of articles of affiliations in a fixed-size array (depth x width) of about $memory_bytes$ bytes
+    # an affiliation adds its fractional credit to one cell of every row (chosen by a hash that is the same in all processes),
+    # and its estimate is the minimum of its cells, which is never below its number of articles
+    # it has the interface of AffiliationAccumulator.add, so it can be filled as an accumulator (the numbers of citations are ignored)
+
+    def __init__(self, memory_bytes=1 << 24, depth=4, chunk_size=10000):
+        self.depth = depth
+        self.width = max(1, memory_bytes // (8 * depth))
+        self.chunk_size = chunk_size
+        self.counts = np.zeros((depth, self.width))
+        self.buffer_cells = []
+        self.buffer_weights = []
+
+    def add(self, affiliations, citation_preprint=0, citation_published=0):
+        for affiliation, weight in affiliations.items():
+            self.buffer_cells.append(sketch_cells(affiliation, self.depth, self.width))
+            self.buffer_weights.append(weight)
+
+        if len(self.buffer_cells) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+
+        if len(self.buffer_cells) == 0:
+            return
+
+        cells = np.array(self.buffer_cells, dtype=np.int64)
+        weights = np.array(self.buffer_weights)
+        np.add.at(self.counts, (np.broadcast_to(np.arange(self.depth), cells.shape), cells), weights[:, None])
+
+        self.buffer_cells = []
+        self.buffer_weights = []
+
+    def estimate(self, affiliation):
+        self.flush()
+        return min([row[cell] for row, cell in zip(self.counts, sketch_cells(affiliation, self.depth, self.width))])
+
+    def merge(self, other):
+        # add the counts of another sketch of the same size (e.g., built by another worker) to this one
+        self.flush()
+        other.flush()
+        self.counts += other.counts
+        return self
+
+
+class BoundedAccumulator(AffiliationAccumulator):
+
+    # AffiliationAccumulator that keeps only the affiliations whose upper bound of the number of articles (see CountMinSketch) reaches $num_articles_min$
+    # the other affiliations have fewer articles than $num_articles_min$, so they are filtered out anyway (see citation_bias.affiliation_metrics);
+    # their totals are only summed up in $tail$ (in the order of COLUMNS), with their number of contributions in $tail_entries$
+    # bounds within $tolerance$ of $num_articles_min$ are kept, since the sketch sums the credit in another order than the accumulator
+
+    def __init__(self, sketch, num_articles_min, chunk_size=10000, tolerance=NUM_ARTICLES_TOLERANCE):
+        super().__init__(chunk_size)
+        self.sketch = sketch
+        self.num_articles_min = num_articles_min
+        self.tolerance = tolerance
+        self.tail = [0.0] * len(COLUMNS)
+        self.tail_entries = 0
+
+    def add(self, affiliations, citation_preprint, citation_published):
+
+        # affiliations that are already interned have been kept before, so the sketch is queried only for new ones
+        kept = {}
+        for affiliation, weight in affiliations.items():
+            if affiliation in self.ids or self.sketch.estimate(affiliation) >= self.num_articles_min - self.tolerance:
+                kept[affiliation] = weight
+            else:
+                values = [citation_preprint, citation_published, 1, math.log(citation_preprint + 1), math.log(citation_published + 1)]
+                self.tail = [total + weight * value for total, value in zip(self.tail, values)]
+                self.tail_entries += 1
+        super().add(kept, citation_preprint, citation_published)
+
+    def merge(self, other):
+        super().merge(other)
+        self.tail = [total + total_other for total, total_other in zip(self.tail, other.tail)]
+        self.tail_entries += other.tail_entries
+        return self
+
+
+# series of the table of monthly counts (see citation_time.py)
+MONTHLY_COLUMNS = ['num_citations_preprint', 'num_citations_published', 'num_citations_preprint_ln', 'num_citations_published_ln',
+                   'num_articles_preprint', 'num_articles_published']
+
+
+class MonthlyAccumulator:
+
+    # series per the number of months since preprint publication of groups of articles (e.g., journals or countries)
+    # groups are interned into integer IDs and the series are kept in a growable NumPy array (group x column x month)
+    # the numbers of preprints and publisher versions are kept as difference arrays (+weight at the first month and -weight after the last month)
+    # that are summed up cumulatively in to_arrays
+    # contributions of articles are buffered and added with a scatter-add every $chunk_size$ articles
+
+    def __init__(self, max_months, chunk_size=10000):
+        self.max_months = max_months
+        self.chunk_size = chunk_size
+        self.ids = {}
+        self.names = []
+        self.totals = np.zeros((64, len(MONTHLY_COLUMNS), max_months + 2))
+        self.num_articles = np.zeros(64)
+        self.buffer = []
+
+    def intern(self, group):
+        group_id = self.ids.get(group)
+        if group_id == None:
+            group_id = len(self.names)
+            self.ids[group] = group_id
+            self.names.append(group)
+        return group_id
+
+    def grow(self):
+
+        # grow the array of totals by doubling so that it has a row for every interned group
+        if len(self.names) > self.totals.shape[0]:
+            size = max(len(self.names), 2 * self.totals.shape[0])
+            totals = np.zeros((size,) + self.totals.shape[1:])
+            totals[:self.totals.shape[0]] = self.totals
+            self.totals = totals
+            num_articles = np.zeros(size)
+            num_articles[:len(self.num_articles)] = self.num_articles
+            self.num_articles = num_articles
+
+    def add(self, groups, preprint_end, published_start, published_end, citations):
+
+        # $groups$ maps each group of an article to its weight (e.g., fractional credit of a country)
+        # the article is a preprint in months [0, $preprint_end$) and a publisher version in months [$published_start$, $published_end$)
+        # $citations$ holds its numbers of citations (and their log-transformed values) per month in the order of MONTHLY_COLUMNS
+        self.buffer.append((groups, preprint_end, published_start, published_end, citations))
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+
+        if len(self.buffer) == 0:
+            return
+
+        entry_records = []
+        entry_ids = []
+        entry_weights = []
+        for k, (groups, preprint_end, published_start, published_end, citations) in enumerate(self.buffer):
+            for group, weight in groups.items():
+                entry_records.append(k)
+                entry_ids.append(self.intern(group))
+                entry_weights.append(weight)
+
+        self.add_entries(np.array(entry_records, dtype=int), np.array(entry_ids, dtype=int), np.array(entry_weights, dtype=float),
+                         np.array([record[1] for record in self.buffer]), np.array([record[2] for record in self.buffer]),
+                         np.array([record[3] for record in self.buffer]), np.array([record[4] for record in self.buffer]))
+        self.buffer = []
+
+    def add_entries(self, entry_records, entry_ids, entry_weights, preprint_end, published_start, published_end, citations):
+
+        # add articles at once: entry k gives weight $entry_weights[k]$ of the article $entry_records[k]$ to the interned group $entry_ids[k]$
+        # (arrays of the articles as in add; $citations$ has the shape article x 4 x months)
+        self.grow()
+        num_groups = len(self.names)
+        width = self.max_months + 2
+
+        # difference arrays of the numbers of preprints and publisher versions
+        preprint = np.bincount(entry_ids * width, weights=entry_weights, minlength=num_groups * width) - \
+            np.bincount(entry_ids * width + preprint_end[entry_records], weights=entry_weights, minlength=num_groups * width)
+        valid = published_start[entry_records] < published_end[entry_records]
+        published = np.bincount(entry_ids[valid] * width + published_start[entry_records[valid]], weights=entry_weights[valid], minlength=num_groups * width) - \
+            np.bincount(entry_ids[valid] * width + published_end[entry_records[valid]], weights=entry_weights[valid], minlength=num_groups * width)
+        self.totals[:num_groups, 4] += preprint.reshape(num_groups, width)
+        self.totals[:num_groups, 5] += published.reshape(num_groups, width)
+
+        # numbers of citations as one scatter-add over the entry x (column, month) array
+        size = citations.shape[1] * citations.shape[2]
+        keys = (entry_ids[:, None] * size + np.arange(size)[None, :]).ravel()
+        values = (citations[entry_records].reshape(len(entry_records), size) * entry_weights[:, None]).ravel()
+        self.totals[:num_groups, :4, :self.max_months + 1] += np.bincount(keys, weights=values, minlength=num_groups * size).reshape(num_groups, 4, self.max_months + 1)
+
+        self.num_articles[:num_groups] += np.bincount(entry_ids, weights=entry_weights, minlength=num_groups)
+
+    def merge(self, other):
+
+        # add the series of another accumulator (e.g., built by another worker) to this one
+        self.flush()
+        other.flush()
+        ids = np.array([self.intern(group) for group in other.names], dtype=int)
+        self.grow()
+        self.totals[ids] += other.totals[:len(other.names)]
+        self.num_articles[ids] += other.num_articles[:len(other.names)]
+        return self
+
+    def to_arrays(self):
+
+        # groups and their series as group x month arrays (and the number of articles of each group)
+        self.flush()
+        num_groups = len(self.names)
+        series = {column: self.totals[:num_groups, k, :self.max_months + 1].copy() for k, column in enumerate(MONTHLY_COLUMNS[:4])}
+        series['num_articles_preprint'] = np.cumsum(self.totals[:num_groups, 4], axis=1)[:, :self.max_months + 1]
+        series['num_articles_published'] = np.cumsum(self.totals[:num_groups, 5], axis=1)[:, :self.max_months + 1]
+        series['num_articles'] = self.num_articles[:num_groups].copy()
+        return list(self.names), series
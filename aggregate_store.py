@@ -0,0 +1,245 @@
+# -------------------------------------------
+#
+# SQLite store of per-article facts and affiliation weights for ad-hoc queries of the Gini coefficients
+#
+# -------------------------------------------
+
+# modules
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import dump_cache
+import weight_matrix
+import citation_histogram
+import citation_bias
+import citation_time
+import records
+
+#=========================#
+# setting
+#=========================#
+
+# version of the store (stores of other versions are rebuilt)
+STORE_VERSION = 2
+
+# numbers of months after preprint publication whose numbers of citations are stored
+MAX_MONTHS = [24]
+
+# affiliation levels and the fields of the columnar cache that define them
+LEVELS = {'institution': 'ror_name', 'country': 'ror_country'}
+
+# tables of the store
+# articles: records that can be analyzed (with DOI and publication month of the publisher version, and with authors)
+# windows: numbers of citations to the preprint and to the publisher version within max_months months after preprint publication
+# weights: fractional credit of the affiliations (see weight_matrix.py) by role of the author and affiliation level
+# affiliations: names of the affiliations (IDs are those of the string tables of the columnar cache)
+# the weights are clustered by record, role, and level, so that a query looks up the weights of each selected article (see query_affiliations)
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE articles (row INTEGER PRIMARY KEY, month INTEGER, lag INTEGER, journal TEXT, estimate INTEGER, num_citations INTEGER);
+CREATE TABLE windows (max_months INTEGER, row INTEGER, preprint INTEGER, published INTEGER, preprint_ln REAL, published_ln REAL,
+                      PRIMARY KEY (max_months, row)) WITHOUT ROWID;
+CREATE TABLE weights (target_author TEXT, level TEXT, affiliation INTEGER, row INTEGER, weight REAL,
+                      PRIMARY KEY (row, target_author, level, affiliation)) WITHOUT ROWID;
+CREATE TABLE affiliations (level TEXT, affiliation INTEGER, name TEXT, PRIMARY KEY (level, affiliation)) WITHOUT ROWID;
+'''
+
+# indexes created after the tables are filled (for ad-hoc queries of the articles themselves)
+INDEXES = '''
+CREATE INDEX articles_journal ON articles (journal, month);
+CREATE INDEX articles_lag ON articles (lag, month);
+'''
+
+
+def store_path(file_input, cache_dir='cache'):
+    # the store is kept in the directory of the columnar cache, so it is removed when the cache is rebuilt
+    return os.path.join(dump_cache.cache_path(file_input, cache_dir), 'aggregates.sqlite')
+
+
+def build_store(file_input, cache_dir='cache', max_months=MAX_MONTHS, store_file=None):
+
+    # export the columnar cache (and its weight matrices and citation histogram) to the store
+    if dump_cache.cache_valid(file_input, cache_dir) == False:
+        dump_cache.build_cache(file_input, cache_dir)
+    store_file = store_path(file_input, cache_dir) if store_file == None else store_file
+
+    articles = dump_cache.load_columns(file_input, 'articles', [
+        'month', 'published_doi', 'published_month', 'lag', 'journal', 'estimate', 'num_authors', 'num_citations'], cache_dir=cache_dir)
+    journals = dump_cache.load_strings(file_input, 'journal', cache_dir=cache_dir)
+
+    # records without DOI or publication month of the publisher version, or without authors, are never analyzed (see citation_bias.selected_articles)
+    rows = np.flatnonzero(np.asarray(articles['published_doi']) & (np.asarray(articles['published_month']) != -1) & (np.asarray(articles['num_authors']) > 0))
+
+    if os.path.dirname(store_file) != '':
+        os.makedirs(os.path.dirname(store_file), exist_ok=True)
+    if os.path.exists(store_file + '.tmp'):
+        os.remove(store_file + '.tmp')
+    connection = sqlite3.connect(store_file + '.tmp')
+    connection.execute('PRAGMA journal_mode = OFF')
+    connection.execute('PRAGMA synchronous = OFF')
+    connection.executescript(SCHEMA)
+
+    connection.executemany('INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?)', zip(
+        rows.tolist(), np.asarray(articles['month'])[rows].tolist(), np.asarray(articles['lag'])[rows].tolist(), [journals[j] for j in np.asarray(articles['journal'])[rows]],
+        np.asarray(articles['estimate'])[rows].astype(int).tolist(), np.asarray(articles['num_citations'])[rows].tolist()))
+
+    histogram = citation_histogram.load_histogram(file_input, cache_dir)
+    for window in max_months:
+        citation_preprint, citation_published = citation_histogram.window_counts(histogram, rows, window)
+        connection.executemany('INSERT INTO windows VALUES (?, ?, ?, ?, ?, ?)', zip(
+            [window] * len(rows), rows.tolist(), citation_preprint.tolist(), citation_published.tolist(),
+            np.log(citation_preprint + 1).tolist(), np.log(citation_published + 1).tolist()))
+
+    for level, ror_field in LEVELS.items():
+        connection.executemany('INSERT INTO affiliations VALUES (?, ?, ?)', [(level, k, name) for k, name in enumerate(dump_cache.load_strings(file_input, ror_field, cache_dir=cache_dir))])
+        for target_author in weight_matrix.TARGET_AUTHORS:
+            entry_rows, entry_columns, entry_weights = weight_matrix.row_entries(weight_matrix.load_weight_matrix(file_input, target_author, ror_field, cache_dir), rows)
+            connection.executemany('INSERT INTO weights VALUES (?, ?, ?, ?, ?)', zip(
+                [target_author] * len(entry_rows), [level] * len(entry_rows), entry_columns.tolist(), rows[entry_rows].tolist(), entry_weights.tolist()))
+
+    connection.executescript(INDEXES)
+    connection.executemany('INSERT INTO meta VALUES (?, ?)', [('version', str(STORE_VERSION)), ('max_months', json.dumps(list(max_months))),
+                                                             ('created', datetime.now().isoformat(timespec='seconds'))])
+    connection.commit()
+    connection.execute('ANALYZE')
+    connection.close()
+    os.replace(store_file + '.tmp', store_file)
+
+
+def open_store(file_input, cache_dir='cache', max_months=MAX_MONTHS, store_file=None):
+
+    # connection to the store, building it if it does not exist, is of another version, or lacks windows of $max_months$
+    store_file = store_path(file_input, cache_dir) if store_file == None else store_file
+    if dump_cache.cache_valid(file_input, cache_dir) == False or os.path.exists(store_file) == False:
+        build_store(file_input, cache_dir, max_months, store_file)
+
+    connection = sqlite3.connect(store_file)
+    meta = dict(connection.execute('SELECT key, value FROM meta').fetchall())
+    if int(meta['version']) != STORE_VERSION or set(max_months) - set(json.loads(meta['max_months'])):
+        connection.close()
+        build_store(file_input, cache_dir, sorted(set(max_months) | set(json.loads(meta['max_months']))), store_file)
+        connection = sqlite3.connect(store_file)
+    return connection
+
+
+def stored_windows(connection):
+    return json.loads(connection.execute("SELECT value FROM meta WHERE key = 'max_months'").fetchone()[0])
+
+
+def affiliation_query(config):
+
+    # SQL query (and its parameters) of the totals of the affiliations of the articles analyzed under $config$ (parameters of citation_ineq),
+    # as one GROUP BY over the weights of the selected articles
+    conditions = ['a.month <= ?']
+    parameters = [records.date_ordinal(config['latest_month']) - config['max_months']]
+    if config['target_journal'] != 'all':
+        conditions.append('a.journal = ?')
+        parameters.append(config['target_journal'])
+    if config['diff_month_preprint_publisher_min'] != 'na':
+        conditions.append('a.lag >= ?')
+        parameters.append(config['diff_month_preprint_publisher_min'])
+    if config['diff_month_preprint_publisher_max'] != 'na':
+        conditions.append('a.lag <= ?')
+        parameters.append(config['diff_month_preprint_publisher_max'])
+    if config['target_author'] != 'all':
+        conditions.append('a.estimate = 0')
+    if config['none_citation_included'] == False:
+        conditions.append('a.num_citations > 0')
+
+    # the articles are selected first (through the indexes on journal and lag, see INDEXES), and the weights of each of them are looked up by its row (see SCHEMA);
+    # CROSS JOIN keeps this order of the loops, so only the weights of the selected articles are read
+    # records in which no author plays the target role have no weights, so they are dropped by the join
+    # the sums of an affiliation may differ from those of the columnar cache by rounding (see accumulator.NUM_ARTICLES_TOLERANCE)
+    query = '''
+        SELECT w.affiliation, SUM(w.weight * c.preprint), SUM(w.weight * c.published), SUM(w.weight), SUM(w.weight * c.preprint_ln), SUM(w.weight * c.published_ln)
+        FROM (SELECT a.row FROM articles a WHERE ''' + ' AND '.join(conditions) + ''') s
+        CROSS JOIN weights w ON w.row = s.row AND w.target_author = ? AND w.level = ?
+        CROSS JOIN windows c ON c.max_months = ? AND c.row = s.row
+        GROUP BY w.affiliation
+        ORDER BY w.affiliation'''
+    return query, parameters + [config['target_author'], config['affiliation_level'], config['max_months']]
+
+
+def query_affiliations(connection, config):
+
+    # table of affiliations (as in citation_bias.affiliation_citations_cache) of the articles analyzed under $config$
+    if config['max_months'] not in stored_windows(connection):
+        raise ValueError('no numbers of citations within ' + str(config['max_months']) + ' months in the store (see MAX_MONTHS)')
+
+    query, parameters = affiliation_query(config)
+    totals = connection.execute(query, parameters).fetchall()
+    names = dict(connection.execute('SELECT affiliation, name FROM affiliations WHERE level = ?', [config['affiliation_level']]).fetchall())
+
+    return pd.DataFrame([total[1:] for total in totals], index=[names[total[0]] for total in totals],
+                        columns=['preprint', 'published', 'num_articles', 'preprint_ln', 'published_ln'], dtype=float)
+
+
+def citation_ineq_store(file_input, latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, fig=False, weighted=False, cache_dir='cache',
+                        store_file=None, connection=None):
+
+    # citation_ineq answered from the store (Gini coefficients, number of articles, and number of affiliations)
+    # if $connection$ is given (see open_store), it is reused, so that many queries do not open the store again
+    config = {'latest_month': latest_month, 'max_months': max_months, 'target_author': target_author, 'affiliation_level': affiliation_level, 'target_journal': target_journal,
+              'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max,
+              'num_articles_min': num_articles_min, 'none_citation_included': none_citation_included, 'unknown_excluded': unknown_excluded, 'metric': metric, 'fig': fig, 'weighted': weighted}
+
+    connection_query = open_store(file_input, cache_dir, [max_months], store_file) if connection == None else connection
+    try:
+        citations_affiliations = query_affiliations(connection_query, config)
+    finally:
+        if connection == None:
+            connection_query.close()
+
+    citations_affiliations = citation_bias.affiliation_metrics(citations_affiliations, num_articles_min, unknown_excluded, metric)
+    return citation_bias.affiliation_ineq(citations_affiliations, **config)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='SQLite store of per-article facts and affiliation weights for ad-hoc queries of the Gini coefficients')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    subparser = commands.add_parser('build', help='export the columnar cache of the input file to the store')
+    subparser.add_argument('--file-input', default='data/biorxiv_metadata-oc.jsonl.gz', help='input file')
+    subparser.add_argument('--cache-dir', default='cache', help='directory of the columnar cache of the input file')
+    subparser.add_argument('--store-file', default=None, help='SQLite file of the store (by default, in the directory of the columnar cache)')
+    subparser.add_argument('--max-months', default=MAX_MONTHS, type=int, nargs='+', help='numbers of months after preprint publication whose numbers of citations are stored')
+
+    subparser = commands.add_parser('query', help='Gini coefficients of the preprints and of the publisher versions from the store')
+    subparser.add_argument('--file-input', default='data/biorxiv_metadata-oc.jsonl.gz', help='input file')
+    subparser.add_argument('--cache-dir', default='cache', help='directory of the columnar cache of the input file')
+    subparser.add_argument('--store-file', default=None, help='SQLite file of the store (by default, in the directory of the columnar cache)')
+    subparser.add_argument('--latest-month', default='2021-06', help='latest month (YYYY-MM)')
+    subparser.add_argument('--max-months', default=24, type=int, help='number of months for counting the number of citations after preprint publication')
+    subparser.add_argument('--target-author', default='all', choices=weight_matrix.TARGET_AUTHORS, help='role of the authors whose affiliations are credited')
+    subparser.add_argument('--affiliation-level', default='country', choices=list(LEVELS.keys()), help='affiliation level')
+    subparser.add_argument('--target-journal', default='all', help="ISSNL of target journal ('all' for all journals)")
+    subparser.add_argument('--lag-min', default=0, type=citation_time.month_bound, help="minimum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+    subparser.add_argument('--lag-max', default='na', type=citation_time.month_bound, help="maximum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+    subparser.add_argument('--num-articles-min', default=0, type=float, help='minimum number of articles of an affiliation')
+    subparser.add_argument('--no-none-citation', action='store_true', help='filter out articles without citations')
+    subparser.add_argument('--unknown-included', action='store_true', help='keep the affiliation unknown')
+    subparser.add_argument('--metric', default='ln', choices=['ln', 'arithmetic-mean', 'total'], help='metric of the number of citations of an affiliation')
+    subparser.add_argument('--weighted', action='store_true', help='weight each affiliation by its number of articles')
+    subparser.add_argument('--fig', action='store_true', help='draw the Lorenz curves')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        build_store(args.file_input, args.cache_dir, args.max_months, args.store_file)
+        return
+
+    result = citation_ineq_store(args.file_input, datetime.strptime(args.latest_month, '%Y-%m'), args.max_months, args.target_author, args.affiliation_level, args.target_journal,
+                                 args.lag_min, args.lag_max, args.num_articles_min, args.no_none_citation == False, args.unknown_included == False, args.metric,
+                                 args.fig, args.weighted, args.cache_dir, args.store_file)
+    print('gini_preprint', result[0])
+    print('gini_publisher', result[1])
+    print('num_articles', result[2])
+    print('num_affiliations', result[3])
+
+
+if __name__ == '__main__':
+    main()
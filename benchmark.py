@@ -0,0 +1,119 @@
+# -------------------------------------------
+#
+# benchmark the analyses on a (synthetic) dump
+#
+# -------------------------------------------
+
+# modules
+import os
+import sys
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import reader
+import instrumentation
+import synthetic_dump
+
+#=========================#
+# settings
+#=========================#
+
+# input file (generated by synthetic_dump.py if it does not exist)
+file_input = 'data/synthetic-oc.jsonl.gz'
+num_records = 100000
+
+# latest month
+latest_month = datetime.strptime('2021-06', '%Y-%m')
+
+# directory of the columnar cache of the input file (if None, the JSON records are parsed)
+cache_dir = None
+
+# number of worker processes used when the JSON records are parsed
+num_workers = 1
+
+# combinations of citation_ineq
+target_authors = ['first', 'last', 'corresp', 'all']
+affiliation_levels = ['institution', 'country']
+metrics = ['ln', 'arithmetic-mean', 'total']
+
+# sizes of the inputs of gini
+gini_sizes = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+
+#=========================#
+
+
+def benchmark_citation_ineq(file_input, target_author, affiliation_level, metric, cache_dir=None, num_workers=1):
+    import citation_bias
+
+    start = time.perf_counter()
+    citation_bias.citation_ineq(file_input, latest_month, 24, target_author, affiliation_level, 'all', 0, 'na', 5, True, True, metric,
+                                fig=False, cache_dir=cache_dir, num_workers=num_workers)
+    return time.perf_counter() - start, max(instrumentation.peak_rss().values())
+
+
+def benchmark_gini(n):
+    from inequality import gini
+
+    x = np.random.default_rng(0).pareto(1.5, n)
+    start = time.perf_counter()
+    gini(x)
+    return time.perf_counter() - start, max(instrumentation.peak_rss().values())
+
+
+def benchmark_monthly_counts(file_input, cache_dir=None, num_workers=1):
+    import citation_time
+
+    start = time.perf_counter()
+    citation_time.monthly_counts(file_input, latest_month, 24, 0, 'na', cache_dir=cache_dir, num_workers=num_workers)
+    return time.perf_counter() - start, max(instrumentation.peak_rss().values())
+
+
+def quiet(function, *arguments):
+    # the progress lines of the analyses (also those of their worker processes) are sent to stderr, so that stdout holds only the table of the benchmarks
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return function(*arguments)
+
+
+def run(function, *arguments):
+    # each benchmark runs in a fresh process so that its peak RSS is not affected by the other benchmarks
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(quiet, function, *arguments).result()
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1:
+        file_input = sys.argv[1]
+
+    if os.path.exists(file_input) == False:
+        print('generating', file_input, flush=True)
+        os.makedirs(os.path.dirname(file_input) or '.', exist_ok=True)
+        synthetic_dump.generate_dump(file_input, num_records=num_records)
+
+    num_lines = sum([len(batch) for batch in reader.read_batches(file_input)])
+    print(file_input, '{:,}'.format(num_lines), 'records', flush=True)
+
+    # build the columnar cache beforehand so that it is not included in the timings
+    if cache_dir != None:
+        import dump_cache
+        if dump_cache.cache_valid(file_input, cache_dir) == False:
+            dump_cache.build_cache(file_input, cache_dir)
+
+    # peak RSS is the largest one of the benchmark process and of its worker processes (see instrumentation.peak_rss)
+    print('\t'.join(['benchmark', 'seconds', 'records/s', 'peak RSS (MB)']))
+
+    for target_author in target_authors:
+        for affiliation_level in affiliation_levels:
+            for metric in metrics:
+                seconds, rss = run(benchmark_citation_ineq, file_input, target_author, affiliation_level, metric, cache_dir, num_workers)
+                print('\t'.join(['citation_ineq ' + target_author + ' ' + affiliation_level + ' ' + metric,
+                                 '{:.3f}'.format(seconds), '{:,.0f}'.format(num_lines / seconds), '{:.1f}'.format(rss)]), flush=True)
+
+    for n in gini_sizes:
+        seconds, rss = run(benchmark_gini, n)
+        print('\t'.join(['gini n=' + str(n), '{:.3f}'.format(seconds), '{:,.0f}'.format(n / seconds), '{:.1f}'.format(rss)]), flush=True)
+
+    seconds, rss = run(benchmark_monthly_counts, file_input, cache_dir, num_workers)
+    print('\t'.join(['monthly_counts', '{:.3f}'.format(seconds), '{:,.0f}'.format(num_lines / seconds), '{:.1f}'.format(rss)]), flush=True)
@@ -0,0 +1,97 @@
+# -------------------------------------------
+#
+# bootstrap confidence intervals of the Gini coefficients
+#
+# -------------------------------------------
+
+# modules
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from inequality import gini_rows
+from accumulator import NUM_ARTICLES_TOLERANCE
+
+#=========================#
+# setting
+#=========================#
+
+# maximum size (in bytes) of the replicate x entry arrays of one chunk of replicates
+CHUNK_BYTES = 1 << 28
+
+
+def replicate_chunk(seed, num_replicates, num_articles, entry_rows, entry_columns, entry_weights, vectors, num_columns, included, num_articles_min, metric, weighted):
+
+    # Gini coefficients of the preprints and of the publisher versions in $num_replicates$ replicates
+    # in each replicate, the articles are resampled with replacement; the multiplicity of each article multiplies its weights
+    rng = np.random.default_rng(seed)
+    multiplicities = rng.multinomial(num_articles, np.full(num_articles, 1 / num_articles), size=num_replicates)
+    return replicate_ginis(multiplicities, entry_rows, entry_columns, entry_weights, vectors, num_columns, included, num_articles_min, metric, weighted)
+
+
+def replicate_ginis(multiplicities, entry_rows, entry_columns, entry_weights, vectors, num_columns, included, num_articles_min, metric, weighted):
+
+    # Gini coefficients of the preprints and of the publisher versions in each replicate
+    # $multiplicities$ holds the weights of the articles in the replicates (one row per replicate; e.g., the replicate weights of a sample, see sampling.py)
+    num_replicates = len(multiplicities)
+
+    # replicate x affiliation totals as one scatter-add over the replicate x entry array
+    keys = (np.arange(num_replicates)[:, None] * num_columns + entry_columns[None, :]).ravel()
+    entry_multiplicities = multiplicities[:, entry_rows] * entry_weights[None, :]
+    totals = {}
+    for name, vector in vectors.items():
+        values = entry_multiplicities if vector is None else entry_multiplicities * vector[entry_rows][None, :]
+        totals[name] = np.bincount(keys, weights=values.ravel(), minlength=num_replicates * num_columns).reshape(num_replicates, num_columns)
+
+    # affiliations are filtered and their metrics are calculated as in affiliation_metrics
+    num_articles_affiliations = totals['num_articles']
+    selected = included[None, :] & (num_articles_affiliations > 0) & (num_articles_affiliations >= num_articles_min - NUM_ARTICLES_TOLERANCE)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if metric == 'ln':
+            preprint_metric = totals['preprint_ln'] / num_articles_affiliations
+            published_metric = totals['published_ln'] / num_articles_affiliations
+        elif metric == 'arithmetic-mean':
+            preprint_metric = totals['preprint'] / num_articles_affiliations
+            published_metric = totals['published'] / num_articles_affiliations
+        elif metric == 'total':
+            preprint_metric = totals['preprint']
+            published_metric = totals['published']
+
+    weights = np.where(selected, num_articles_affiliations if weighted == True else 1, 0)
+    return gini_rows(preprint_metric, weights), gini_rows(published_metric, weights)
+
+
+def bootstrap_gini(entry_rows, entry_columns, entry_weights, vectors, num_articles, num_columns, included, num_articles_min, metric, weighted=False,
+                   num_replicates=1000, seed=0, confidence=0.95, num_workers=1, chunk_bytes=CHUNK_BYTES):
+
+    # bias-corrected percentile confidence intervals of the Gini coefficients of the preprints and of the publisher versions
+    # the Gini coefficient of resampled articles is biased upward (small affiliations are more unequal when resampled),
+    # so the replicates are shifted by their mean minus the point estimate before the percentiles are taken
+    # the articles are given as nonzero entries (article, affiliation, weight) of the article x affiliation matrix
+    # and $vectors$ of per-article values ('preprint', 'published', 'preprint_ln', 'published_ln'; None for 'num_articles')
+    # $included$ marks the affiliations that are not excluded (e.g., 'unknown')
+    # replicates are processed in chunks whose arrays have at most $chunk_bytes$ bytes, and the chunks may run in $num_workers$ processes
+    # every chunk has its own seed derived from $seed$, so the intervals do not depend on $num_workers$
+    if num_articles == 0 or num_replicates == 0:
+        return (np.nan, np.nan), (np.nan, np.nan)
+
+    chunk_size = int(max(1, min(num_replicates, chunk_bytes // (8 * max(len(entry_rows), num_articles, num_columns) * 3))))
+    chunk_sizes = [min(chunk_size, num_replicates - start) for start in range(0, num_replicates, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    arguments = [seeds, chunk_sizes] + [[argument] * len(chunk_sizes) for argument in [
+        num_articles, entry_rows, entry_columns, entry_weights, vectors, num_columns, included, num_articles_min, metric, weighted]]
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            chunks = list(executor.map(replicate_chunk, *arguments))
+    else:
+        chunks = list(map(replicate_chunk, *arguments))
+
+    # point estimates (every article once), filtered as in the replicates
+    estimates = replicate_ginis(np.ones((1, num_articles)), entry_rows, entry_columns, entry_weights, vectors, num_columns, included, num_articles_min, metric, weighted)
+
+    alpha = (1 - confidence) / 2
+    intervals = []
+    for k in range(2):
+        ginis = np.concatenate([chunk[k] for chunk in chunks])
+        bias = np.nanmean(ginis) - estimates[k][0]
+        intervals.append(tuple((np.nanquantile(ginis, [alpha, 1 - alpha]) - bias).tolist()))
+    return intervals[0], intervals[1]
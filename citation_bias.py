@@ -11,208 +11,578 @@ import os
 import traceback
 import gzip
 from datetime import datetime
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 from statistics import mean
 import math
+import dump_cache
+import weight_matrix
+import record_index
+import citation_histogram
+import bootstrap
+import permutation
+import sampling
+from inequality import gini, gini_lorenz, lorenz, inequality_table, EPSILONS, TOP_SHARES
+from accumulator import AffiliationAccumulator, BoundedAccumulator, CountMinSketch, NUM_ARTICLES_TOLERANCE
+import reader
+import records
+import result_cache
+import plotting
+import argparse
+import instrumentation
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 #=========================#
 # setting
 #=========================#
 
-plt.rcParams['font.size'] = 18
-pd.options.display.float_format = '{:,.2f}'.format
+# parameters of the bootstrap confidence intervals and of the permutation test (with their default values)
+TEST_PARAMETERS = {'bootstrap': 0, 'bootstrap_seed': 0, 'bootstrap_confidence': 0.95, 'permutation': 0, 'permutation_seed': 0, 'permutation_alpha': 0.05}
+
+# parameters of a configuration that determine its articles and their affiliations (configurations sharing them share a sketch, see bounded_accumulators)
+SKETCH_PARAMETERS = ['latest_month', 'max_months', 'target_author', 'affiliation_level', 'target_journal', 'diff_month_preprint_publisher_min',
+                     'diff_month_preprint_publisher_max', 'none_citation_included']
 
 
 def diff_month(d1, d2):
     return (d1.year - d2.year) * 12 + d1.month - d2.month
 
 
-def gini(x):
-    # https://stackoverflow.com/questions/39512260/calculating-gini-coefficient-in-python-numpy
-    # Mean absolute difference
-    mad = np.abs(np.subtract.outer(x, x)).mean()
-    # Relative mean absolute difference
-    rmad = mad / np.mean(x)
-    # Gini coefficient
-    g = 0.5 * rmad
-    return g
+def affiliation_weights(authors, target_author, ror_field):
 
+    # fractional credit that each affiliation receives from an article
+    affiliations = {}
+    author_identified = False
+    for author in authors:
+        if target_author == 'first':
+            if author['author_order'] != 1:
+                continue
+        elif target_author == 'corresp':
+            if author['corresp'] != True:
+                continue
+        elif target_author == 'last':
+            if author['author_order'] != len(authors):
+                continue
 
-def citation_ineq(file_input, latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, fig=True):
+        if target_author == 'all':
+            weight = 1 / len(authors)
+        else:
+            weight = 1
+            author_identified = True
 
-    print(latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, fig)
+        if len(author['affiliations']) > 0:
+            for a in author['affiliations']:
+                try:
+                    affiliations[a['ror'][ror_field]] = affiliations.get(a['ror'][ror_field], 0) + (weight / len(author['affiliations']))
+                except:
+                    affiliations['unknown'] = affiliations.get('unknown', 0) + (weight / len(author['affiliations']))
+        else:
+            affiliations['unknown'] = affiliations.get('unknown', 0) + weight
 
-    #=========================#
+        # only the first author who plays the target role is considered
+        if target_author != 'all':
+            break
 
-    if affiliation_level == 'institution':
-        ror_field = 'ror_name'
-    elif affiliation_level == 'country':
-        ror_field = 'ror_country'
+    return affiliations, author_identified
 
-    #=========================#
 
-    # プレプリントと出版者版の被引用数を記録するデータフレーム
-    citations_affiliations = pd.DataFrame(0, index=[], columns=[
-                                          'preprint', 'published', 'num_articles', 'preprint_ln', 'published_ln'], dtype='float')
+def count_citations(citation_months, citation_preprint_flags, biorxiv_month, max_months):
 
-    c = 0
-    with gzip.open(file_input, 'rt') as f:
-        for line in f:
+    # number of citations to the preprint and to the publisher version within $max_months$ months after preprint publication
+    months, window = records.citation_window(citation_months, biorxiv_month, max_months)
+    citation_preprint = int(np.count_nonzero(window & citation_preprint_flags))
+    citation_published = int(np.count_nonzero(window)) - citation_preprint
 
-            json_obj = json.loads(line.strip())
+    return citation_preprint, citation_published
 
-            biorxiv_month = datetime.strptime(json_obj['month'], '%Y-%m')
 
-            # DOI of publisher version
-            # if no DOI, filter out the record from the analysis
-            published_doi = json_obj.get('published_doi', None)
-            if published_doi == None:
-                continue
+def article_rejection(json_obj, biorxiv_month, published_month, config):
 
-            # target journal
-            if target_journal != 'all':
-                if json_obj.get('published_journalissnl', '') != target_journal:
-                    continue
+    # reason why the record is filtered out from the analysis under $config$ (None if it is analyzed)
+    # $biorxiv_month$ and $published_month$ are month ordinals (see records.py)
+    # target journal
+    if config['target_journal'] != 'all':
+        if json_obj.get('published_journalissnl', '') != config['target_journal']:
+            return 'not in target journal'
 
-            # publication of month of the publisher version
-            # if no publication month, filter out the record from the analysis
-            try:
-                published_month = datetime.strptime(
-                    json_obj['published_month'], '%Y-%m')
-            except:
-                continue
+    # if the record has a citation period whose length is less than $max_months$-month, filter out the record from the analysis
+    if records.date_ordinal(config['latest_month']) - biorxiv_month < config['max_months']:
+        return 'window too short'
 
-            # if the record has a citation period whose length is less than $max_months$-month, filter out the record from the analysis
-            if diff_month(latest_month, biorxiv_month) < max_months:
-                continue
+    # if the conditions for the number of months from publication of preprint to publication of publisher version are not met, filter out the record from the analysis
+    if config['diff_month_preprint_publisher_min'] != 'na':
+        if published_month - biorxiv_month < config['diff_month_preprint_publisher_min']:
+            return 'lag out of range'
+    if config['diff_month_preprint_publisher_max'] != 'na':
+        if published_month - biorxiv_month > config['diff_month_preprint_publisher_max']:
+            return 'lag out of range'
 
-            # if the conditions for the number of months from publication of preprint to publication of publisher version are not met, filter out the record from the analysis
-            if diff_month_preprint_publisher_min != 'na':
-                if diff_month(published_month, biorxiv_month) < diff_month_preprint_publisher_min:
-                    continue
-            if diff_month_preprint_publisher_max != 'na':
-                if diff_month(published_month, biorxiv_month) > diff_month_preprint_publisher_max:
-                    continue
+    if json_obj['author']['estimate'] == True and config['target_author'] != 'all':
+        return 'estimated authors'
 
-            # author affiliation
-            authors = json_obj['author']['authors']
-            if len(authors) == 0:
-                continue
-            if json_obj['author']['estimate'] == True and target_author != 'all':
+    if (config['none_citation_included'] == False) and (len(json_obj['oc']) == 0):
+        return 'zero citations'
+
+    return None
+
+
+def article_selected(json_obj, biorxiv_month, published_month, config):
+    return article_rejection(json_obj, biorxiv_month, published_month, config) == None
+
+
+def config_defaults(config):
+    # $config$ with the default values of its optional parameters (fig, weighted, and TEST_PARAMETERS)
+    return dict(dict({'fig': True, 'weighted': False}, **TEST_PARAMETERS), **config)
+
+
+def citation_ineq_sweep(file_input, configs, cache_dir=None, num_workers=1, decoder=None, result_dir=None, figures=None, memory_budget=None):
+
+    # $configs$ is a list of dictionaries holding the parameters of citation_ineq (except $file_input$)
+    # the input file is read only once and every record is routed to all configurations whose conditions it meets
+    # if $cache_dir$ is given, the columnar cache of the input file (see dump_cache.py) is used instead of the JSON records
+    # otherwise the records are split among $num_workers$ processes ($file_input$ may also be a list of shard files, see reader.py)
+    # and decoded by $decoder$ ('msgspec', 'orjson', or 'json'; if None, the fastest available one, see records.py)
+    # if $result_dir$ is given, results are cached there and only configurations without cached results are computed (see result_cache.py)
+    # if $bootstrap$ of a config is larger than 0, the bias-corrected percentile confidence intervals of the Gini coefficients (at $bootstrap_confidence$)
+    # from $bootstrap$ replicates are appended to its result (see bootstrap.py)
+    # if $permutation$ of a config is larger than 0, the p-value of the permutation test of the difference between the Gini coefficients
+    # with at most $permutation$ permutations is appended to its result (see permutation.py)
+    # the articles for both are taken from the columnar cache
+    # the Lorenz curves are drawn after all the configurations are computed, in $num_workers$ processes (see plotting.render)
+    # unless $figures$ is given, in which case they are only appended to it (e.g., to be drawn together with other figures)
+    # if $memory_budget$ (in bytes) is given, the JSON records are aggregated in the bounded-memory mode (see bounded_accumulators)
+    configs = [config_defaults(config) for config in configs]
+
+    for config in configs:
+        print(config['latest_month'], config['max_months'], config['target_author'], config['affiliation_level'], config['target_journal'], config['diff_month_preprint_publisher_min'],
+              config['diff_month_preprint_publisher_max'], config['num_articles_min'], config['none_citation_included'], config['unknown_excluded'], config['metric'], config['fig'])
+
+    figures_sweep = [] if figures == None else figures
+
+    results = [None] * len(configs)
+    if result_dir != None:
+        for k, config in enumerate(configs):
+            cached = result_cache.load_result(file_input, config, result_dir)
+            if cached == None:
                 continue
-            affiliations = {}
-            author_identified = False
-            for author in authors:
-                if target_author == 'first':
-                    if author['author_order'] == 1:
-                        author_identified = True
-                        if len(author['affiliations']) > 0:
-                            for a in author['affiliations']:
-                                try:
-                                    affiliations[a['ror'][ror_field]] = affiliations.get(a['ror'][ror_field], 0) + (1 / len(author['affiliations']))
-                                except:
-                                    affiliations['unknown'] = affiliations.get('unknown', 0) + (1 / len(author['affiliations']))
-                        else:
-                            affiliations['unknown'] = affiliations.get('unknown', 0) + 1
-                        break
-                elif target_author == 'corresp':
-                    if author['corresp'] == True:
-                        author_identified = True
-                        if len(author['affiliations']) > 0:
-                            for a in author['affiliations']:
-                                try:
-                                    affiliations[a['ror'][ror_field]] = affiliations.get(a['ror'][ror_field], 0) + (1 / len(author['affiliations']))
-                                except:
-                                    affiliations['unknown'] = affiliations.get('unknown', 0) + (1 / len(author['affiliations']))
-                        else:
-                            affiliations['unknown'] = affiliations.get('unknown', 0) + 1
-                        break
-                elif target_author == 'last':
-                    if author['author_order'] == len(authors):
-                        author_identified = True
-                        if len(author['affiliations']) > 0:
-                            for a in author['affiliations']:
-                                try:
-                                    affiliations[a['ror'][ror_field]] = affiliations.get(a['ror'][ror_field], 0) + (1 / len(author['affiliations']))
-                                except:
-                                    affiliations['unknown'] = affiliations.get('unknown', 0) + (1 / len(author['affiliations']))
-                        else:
-                            affiliations['unknown'] = affiliations.get('unknown', 0) + 1
-                        break
-                elif target_author == 'all':
-                    if len(author['affiliations']) > 0:
-                        for a in author['affiliations']:
-                            try:
-                                affiliations[a['ror'][ror_field]] = affiliations.get(a['ror'][ror_field], 0) + (1 / len(authors) / len(author['affiliations']))
-                            except:
-                                affiliations['unknown'] = affiliations.get('unknown', 0) + (1 / len(authors) / len(author['affiliations']))
-                    else:
-                        affiliations['unknown'] = affiliations.get('unknown', 0) + (1 / len(authors))
-
-            if (target_author != 'all') and (author_identified == False):
+            results[k] = cached['result']
+            # the Lorenz curve is drawn again only if its figure does not exist
+            if config['fig'] == True and os.path.exists(lorenz_filename(config)) == False:
+                affiliation_ineq(cached['affiliations'], **ineq_parameters(config), figures=figures_sweep)
+    configs_computed = [config for config, result in zip(configs, results) if result == None]
+
+    if len(configs_computed) > 0:
+        citations_affiliations_configs = affiliation_tables(file_input, configs_computed, cache_dir, num_workers, decoder, memory_budget)
+    else:
+        citations_affiliations_configs = []
+
+    configs_computed = iter(configs_computed)
+    citations_affiliations_configs = iter(citations_affiliations_configs)
+    for k in range(len(configs)):
+        if results[k] != None:
+            continue
+        config = next(configs_computed)
+        citations_affiliations = next(citations_affiliations_configs)
+        results[k] = affiliation_ineq(citations_affiliations, **ineq_parameters(config), figures=figures_sweep)
+        if config['bootstrap'] > 0:
+            results[k] += affiliation_bootstrap(file_input, config, 'ror_name' if config['affiliation_level'] == 'institution' else 'ror_country',
+                                                cache_dir if cache_dir != None else 'cache', num_workers)
+        if config['permutation'] > 0:
+            results[k] += (affiliation_permutation(file_input, config, 'ror_name' if config['affiliation_level'] == 'institution' else 'ror_country',
+                                                   cache_dir if cache_dir != None else 'cache', num_workers),)
+        if result_dir != None:
+            result_cache.save_result(file_input, config, results[k], citations_affiliations, result_dir)
+
+    if figures == None:
+        with instrumentation.stage('plotting'):
+            plotting.render(figures_sweep, num_workers)
+
+    return results
+
+
+def affiliation_tables(file_input, configs, cache_dir=None, num_workers=1, decoder=None, memory_budget=None):
+
+    # tables of affiliations with their metrics (see affiliation_metrics) for $configs$ (see citation_ineq_sweep for the other parameters)
+    ror_fields = []
+    for config in configs:
+        if config['affiliation_level'] == 'institution':
+            ror_fields.append('ror_name')
+        elif config['affiliation_level'] == 'country':
+            ror_fields.append('ror_country')
+
+    #=========================#
+
+    if cache_dir == None:
+        tasks = reader.shard_tasks(file_input, num_workers)
+        shard_files = [shard_file for shard_file, shard in tasks]
+        shards = [shard for shard_file, shard in tasks]
+        if memory_budget != None:
+            accumulators_tasks = bounded_accumulators(file_input, configs, ror_fields, num_workers, decoder, memory_budget)
+        else:
+            accumulators_tasks = [None] * len(tasks)
+        arguments = [shard_files, [configs] * len(tasks), [ror_fields] * len(tasks), shards, [decoder] * len(tasks), accumulators_tasks]
+        if num_workers > 1:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                partials = instrumentation.map_instrumented(executor, affiliation_citations_json, *arguments)
+        else:
+            partials = list(map(affiliation_citations_json, *arguments))
+
+        # merge the partial totals of the shards
+        with instrumentation.stage('aggregation'):
+            accumulators = partials[0]
+            for partial in partials[1:]:
+                for accumulator, accumulator_shard in zip(accumulators, partial):
+                    accumulator.merge(accumulator_shard)
+            citations_affiliations_configs = [accumulator.to_frame() for accumulator in accumulators]
+
+        # mass of the affiliations discarded in the bounded-memory mode
+        for k, accumulator in enumerate(accumulators):
+            if isinstance(accumulator, BoundedAccumulator):
+                report_tail(accumulator, k)
+    else:
+        with instrumentation.stage('aggregation'):
+            citations_affiliations_configs = affiliation_citations_cache(file_input, configs, ror_fields, cache_dir)
+
+    return [affiliation_metrics(citations_affiliations, config['num_articles_min'], config['unknown_excluded'], config['metric'])
+            for config, citations_affiliations in zip(configs, citations_affiliations_configs)]
+
+
+def bounded_accumulators(file_input, configs, ror_fields, num_workers=1, decoder=None, memory_budget=1 << 26):
+
+    # accumulators of the bounded-memory mode for every task of reader.shard_tasks (see affiliation_tables)
+    # a pre-pass over the records fills a count-min sketch of the numbers of articles of the affiliations for every configuration with $num_articles_min$ > 0
+    # (configurations with the same SKETCH_PARAMETERS share one sketch, and the sketches share $memory_budget$ bytes);
+    # then only the affiliations that can reach $num_articles_min$ are accumulated exactly (see accumulator.BoundedAccumulator),
+    # so the Gini coefficients are the same as without the bounded-memory mode
+    # note that every worker process holds a copy of the sketches
+    keys = [tuple(str(config[name]) for name in SKETCH_PARAMETERS) for config in configs]
+    bounded = [k for k, config in enumerate(configs) if config['num_articles_min'] > 0]
+    tasks = reader.shard_tasks(file_input, num_workers)
+    if len(bounded) == 0:
+        return [None] * len(tasks)
+
+    representatives = []
+    for k in bounded:
+        if keys[k] not in [keys[j] for j in representatives]:
+            representatives.append(k)
+    memory_bytes = memory_budget // len(representatives)
+    arguments = [[shard_file for shard_file, shard in tasks], [[configs[k] for k in representatives]] * len(tasks), [[ror_fields[k] for k in representatives]] * len(tasks),
+                 [shard for shard_file, shard in tasks], [decoder] * len(tasks), [[CountMinSketch(memory_bytes) for k in representatives] for task in tasks]]
+
+    # the records of the pre-pass are not counted again by the instrumentation
+    enabled = instrumentation.enabled
+    with instrumentation.stage('sketch'):
+        instrumentation.enabled = False
+        try:
+            if num_workers > 1:
+                with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                    partials = list(executor.map(affiliation_citations_json, *arguments))
+            else:
+                partials = list(map(affiliation_citations_json, *arguments))
+        finally:
+            instrumentation.enabled = enabled
+
+    sketches = partials[0]
+    for partial in partials[1:]:
+        for sketch, sketch_shard in zip(sketches, partial):
+            sketch.merge(sketch_shard)
+    sketches = {keys[k]: sketch for k, sketch in zip(representatives, sketches)}
+
+    return [[BoundedAccumulator(sketches[key], config['num_articles_min']) if config['num_articles_min'] > 0 else AffiliationAccumulator()
+             for config, key in zip(configs, keys)] for task in tasks]
+
+
+def report_tail(accumulator, k):
+
+    # share of the articles (fractional credit) and citations in the affiliations discarded by a bounded accumulator
+    tail_articles = accumulator.tail[2]
+    tail_citations = accumulator.tail[0] + accumulator.tail[1]
+    totals = accumulator.totals[:, :len(accumulator.names)].sum(axis=1) + accumulator.tail
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share_articles = tail_articles / np.float64(totals[2])
+        share_citations = tail_citations / np.float64(totals[0] + totals[1])
+    print('config', k, 'discarded tail:', accumulator.tail_entries, 'contributions,', round(tail_articles, 2), 'articles (' + format(share_articles, '.2%') + '),',
+          round(tail_citations, 2), 'citations (' + format(share_citations, '.2%') + ')')
+    if instrumentation.enabled:
+        instrumentation.count('tail contributions', accumulator.tail_entries, 'config ' + str(k))
+        instrumentation.count('tail articles', float(tail_articles), 'config ' + str(k))
+        instrumentation.count('tail citations', float(tail_citations), 'config ' + str(k))
+
+
+def inequality_sweep(file_input, configs, cache_dir=None, num_workers=1, decoder=None, result_dir=None, epsilons=EPSILONS, top_shares=TOP_SHARES, memory_budget=None):
+
+    # table of inequality measures (see inequality.inequality_measures) of the preprints and of the publisher versions for every config
+    # (parameters as in citation_ineq_sweep; tables of affiliations of cached results are reused, but no result is cached)
+    configs = [config_defaults(config) for config in configs]
+
+    citations_affiliations_configs = [None] * len(configs)
+    if result_dir != None:
+        for k, config in enumerate(configs):
+            cached = result_cache.load_result(file_input, config, result_dir)
+            if cached != None:
+                citations_affiliations_configs[k] = cached['affiliations']
+    computed = [k for k in range(len(configs)) if citations_affiliations_configs[k] is None]
+    if len(computed) > 0:
+        for k, citations_affiliations in zip(computed, affiliation_tables(file_input, [configs[k] for k in computed], cache_dir, num_workers, decoder, memory_budget)):
+            citations_affiliations_configs[k] = citations_affiliations
+
+    vectors = []
+    weights = []
+    labels = []
+    for config, citations_affiliations in zip(configs, citations_affiliations_configs):
+        for version in ['preprint', 'published']:
+            vectors.append(citations_affiliations[version + '_metric'].to_numpy())
+            weights.append(citations_affiliations['num_articles'].to_numpy() if config['weighted'] == True else np.ones(len(citations_affiliations)))
+            labels.append(dict({name: value for name, value in config.items() if name != 'fig' and name not in TEST_PARAMETERS}, version=version))
+    return inequality_table(vectors, weights, labels, epsilons, top_shares)
+
+
+def affiliation_citations_json(file_input, configs, ror_fields, shard=None, decoder=None, accumulators=None):
+
+    # プレプリントと出版者版の被引用数を記録するアキュムレータ
+    # (if $accumulators$ are given, e.g., sketches or bounded accumulators of the bounded-memory mode, they are filled instead)
+    if accumulators == None:
+        accumulators = [AffiliationAccumulator() for config in configs]
+
+    # records published in none of the target journals are rejected before decoding
+    target_journals = set([config['target_journal'] for config in configs])
+    if 'all' in target_journals:
+        target_journals = None
+
+    # if instrumentation is enabled, the time of each stage and the reason of every rejection are recorded (see instrumentation.py)
+    timed = instrumentation.enabled
+    clock = time.perf_counter
+
+    for json_obj in reader.read_records(file_input, shard, decoder, target_journals):
+
+        if timed:
+            start = clock()
+
+        biorxiv_month = records.month_ordinal(json_obj['month'])
+
+        # DOI of publisher version
+        # if no DOI, filter out the record from the analysis
+        published_doi = json_obj.get('published_doi', None)
+        if published_doi == None:
+            if timed:
+                instrumentation.count('no published_doi')
+            continue
+
+        # publication of month of the publisher version
+        # if no publication month, filter out the record from the analysis
+        published_month = records.month_ordinal(json_obj.get('published_month'))
+        if published_month == None:
+            if timed:
+                instrumentation.count('bad published_month')
+            continue
+
+        # author affiliation
+        authors = json_obj['author']['authors']
+        if len(authors) == 0:
+            if timed:
+                instrumentation.count('no authors')
+            continue
+
+        # affiliations and citations of a record are shared by the configurations with the same target author, affiliation level, and window
+        record_affiliations = {}
+        record_citations = {}
+        citation_months, citation_preprint_flags = records.citation_arrays(json_obj['oc'])
+
+        if timed:
+            instrumentation.count('passed')
+            instrumentation.add_time('date_parsing', clock() - start)
+
+        for k, (config, ror_field, accumulator) in enumerate(zip(configs, ror_fields, accumulators)):
+
+            if timed:
+                rejection = article_rejection(json_obj, biorxiv_month, published_month, config)
+                if rejection != None:
+                    instrumentation.count(rejection, scope='config ' + str(k))
+                    continue
+                start = clock()
+            elif article_selected(json_obj, biorxiv_month, published_month, config) == False:
                 continue
 
-            if (none_citation_included == False) and (len(json_obj['oc']) == 0):
+            if (config['target_author'], ror_field) not in record_affiliations:
+                record_affiliations[(config['target_author'], ror_field)] = affiliation_weights(
+                    authors, config['target_author'], ror_field)
+            affiliations, author_identified = record_affiliations[(
+                config['target_author'], ror_field)]
+
+            if timed:
+                instrumentation.add_time('affiliation_attribution', clock() - start)
+
+            if (config['target_author'] != 'all') and (author_identified == False):
+                if timed:
+                    instrumentation.count('role not found', scope='config ' + str(k))
                 continue
 
             #### preprints and publisher versions that reach this point are analyzed  ####
 
-            # count the number of articles
-            for affiliation in affiliations.keys():
-                if (affiliation in citations_affiliations.index.tolist()) == False:
-                    citations_affiliations.loc[affiliation] = [
-                        0] * len(citations_affiliations.columns)
-                citations_affiliations.at[affiliation,
-                                          'num_articles'] += affiliations[affiliation]
+            if timed:
+                start = clock()
 
             # count the number of citations
-            citations = json_obj['oc']
-            citation_preprint = 0
-            citation_published = 0
-            for citation in citations:
-                try:
-                    if len(citation['creation_month']) == 4:
-                        citation_month = datetime.strptime(
-                            citation['creation_month'] + '-01', '%Y-%m')
-                    else:
-                        citation_month = datetime.strptime(
-                            citation['creation_month'], '%Y-%m')
-                except:
-                    continue
+            if config['max_months'] not in record_citations:
+                record_citations[config['max_months']] = count_citations(
+                    citation_months, citation_preprint_flags, biorxiv_month, config['max_months'])
+            citation_preprint, citation_published = record_citations[config['max_months']]
+
+            # count the number of articles and citations per affiliation
+            accumulator.add(affiliations, citation_preprint, citation_published)
+
+            if timed:
+                instrumentation.count('analyzed', scope='config ' + str(k))
+                instrumentation.add_time('aggregation', clock() - start)
+
+    return accumulators
+
+
+def selected_articles(file_input, config, ror_field, cache_dir, scope=None, sample_rows=None):
+
+    # articles of the columnar cache that are analyzed under $config$,
+    # their sparse article x affiliation matrix of fractional credit (see weight_matrix.py),
+    # and their numbers of citations within $max_months$ months after preprint publication (see citation_histogram.py)
+    # the records satisfying the lag, journal, and month conditions are looked up in the indexes (see record_index.py),
+    # so that only these records (and their citation histograms) are read
+    articles = dump_cache.load_columns(file_input, 'articles', [
+        'month', 'published_doi', 'published_month', 'lag', 'journal', 'estimate', 'num_authors', 'num_citations'], cache_dir=cache_dir)
+    journals = dump_cache.load_strings(file_input, 'journal', cache_dir=cache_dir)
 
-                months = diff_month(citation_month, biorxiv_month)
-                if months < 0 or months > max_months:
-                    continue
+    # candidate records from the most selective index
+    # (target journal, conditions for the number of months from publication of preprint to publication of publisher version,
+    # and a citation period of at least $max_months$ months)
+    latest_month = records.date_ordinal(config['latest_month'])
+    lookups = [('month', None, latest_month - config['max_months'])]
+    if config['target_journal'] != 'all':
+        journal_id = journals.index(config['target_journal']) if config['target_journal'] in journals else -1
+        lookups.append(('journal', journal_id, journal_id))
+    if config['diff_month_preprint_publisher_min'] != 'na' or config['diff_month_preprint_publisher_max'] != 'na':
+        lookups.append(('lag', None if config['diff_month_preprint_publisher_min'] == 'na' else config['diff_month_preprint_publisher_min'],
+                        None if config['diff_month_preprint_publisher_max'] == 'na' else config['diff_month_preprint_publisher_max']))
+
+    # the index with the fewest matching records is chosen from the offsets, and only its positions are read (and sorted);
+    # the conditions of the other indexes are checked on these candidates below, so the cost is proportional to the number of candidates
+    lookups = [(record_index.load_index(file_input, column, cache_dir), value_min, value_max) for column, value_min, value_max in lookups]
+    rows = record_index.lookup(*min(lookups, key=lambda lookup: record_index.lookup_count(*lookup)))
+
+    # if $sample_rows$ (ascending) is given, only the sampled records are analyzed (see sampling.py)
+    if sample_rows is not None:
+        rows = np.intersect1d(rows, sample_rows, assume_unique=True)
+
+    # records without DOI or publication month of the publisher version, or without authors, are filtered out,
+    # and the other conditions are checked on the candidate records
+    conditions = [('no published_doi', articles['published_doi'][rows]), ('bad published_month', articles['published_month'][rows] != -1),
+                  ('no authors', articles['num_authors'][rows] > 0)]
+    if config['target_journal'] != 'all':
+        conditions.append(('not in target journal', articles['journal'][rows] == journal_id))
+    conditions.append(('window too short', (latest_month - articles['month'][rows]) >= config['max_months']))
+    if config['diff_month_preprint_publisher_min'] != 'na':
+        conditions.append(('lag out of range', articles['lag'][rows] >= config['diff_month_preprint_publisher_min']))
+    if config['diff_month_preprint_publisher_max'] != 'na':
+        conditions.append(('lag out of range', articles['lag'][rows] <= config['diff_month_preprint_publisher_max']))
+
+    if config['target_author'] != 'all':
+        conditions.append(('estimated authors', articles['estimate'][rows] == False))
+
+    if config['none_citation_included'] == False:
+        conditions.append(('zero citations', articles['num_citations'][rows] > 0))
 
-                if citation['cited_doi'].startswith('10.1101'):
-                    citation_preprint += 1
-                else:
-                    citation_published += 1
-
-            for affiliation in affiliations.keys():
-                citations_affiliations.at[affiliation, 'published'] += (
-                    citation_published * affiliations[affiliation])
-                citations_affiliations.at[affiliation,
-                                          'preprint'] += (citation_preprint * affiliations[affiliation])
-                citations_affiliations.at[affiliation, 'published_ln'] += math.log(
-                    citation_published + 1) * affiliations[affiliation]
-                citations_affiliations.at[affiliation, 'preprint_ln'] += math.log(
-                    citation_preprint + 1) * affiliations[affiliation]
-
-                # citations_affiliations.at[affiliation, 'published'] += (citation_published / len(affiliations))
-                # citations_affiliations.at[affiliation, 'preprint'] += (citation_preprint / len(affiliations))
-                # citations_affiliations.at[affiliation, 'published_ln'] += math.log(citation_published + 1) / len(affiliations)
-                # citations_affiliations.at[affiliation, 'preprint_ln'] += math.log(citation_preprint + 1) / len(affiliations)
+    # records in which no author plays the target role have an empty row
+    matrix = weight_matrix.load_weight_matrix(file_input, config['target_author'], ror_field, cache_dir)
+    conditions.append(('role not found', weight_matrix.rows_nonempty(matrix, rows)))
+
+    # if instrumentation is enabled and $scope$ is given, the records rejected by each condition (in this order) are counted in $scope$
+    counted = instrumentation.enabled and scope != None
+    selected = np.ones(len(rows), dtype=bool)
+    if counted:
+        instrumentation.count('rejected by index', len(articles['month']) - len(rows), scope)
+    for reason, condition in conditions:
+        if counted:
+            instrumentation.count(reason, int(np.count_nonzero(selected & ~condition)), scope)
+        selected &= condition
+    rows = rows[selected]
+    if counted:
+        instrumentation.count('analyzed', len(rows), scope)
+
+    citation_preprint, citation_published = citation_histogram.window_counts(citation_histogram.load_histogram(file_input, cache_dir), rows, config['max_months'])
+    vectors = {'preprint': citation_preprint, 'published': citation_published, 'num_articles': None,
+               'preprint_ln': np.log(citation_preprint + 1), 'published_ln': np.log(citation_published + 1)}
+
+    return rows, matrix, vectors
+
+
+def affiliation_citations_cache(file_input, configs, ror_fields, cache_dir):
+
+    # each config is a sparse matrix-vector product over per-article numbers of citations (see selected_articles)
+    if instrumentation.enabled:
+        instrumentation.count('read', len(dump_cache.load_columns(file_input, 'articles', ['month'], cache_dir=cache_dir)['month']))
+
+    citations_affiliations_configs = []
+    for k, (config, ror_field) in enumerate(zip(configs, ror_fields)):
+
+        rows, matrix, vectors = selected_articles(file_input, config, ror_field, cache_dir, 'config ' + str(k))
+
+        # sum up the number of articles and citations per affiliation
+        ror_names = dump_cache.load_strings(file_input, ror_field, cache_dir=cache_dir)
+        totals = weight_matrix.column_sums(matrix, rows, vectors, len(ror_names))
+
+        present = totals['present']
+        citations_affiliations_configs.append(pd.DataFrame({column: totals[column][present] for column in [
+            'preprint', 'published', 'num_articles', 'preprint_ln', 'published_ln']}, index=[ror_names[i] for i in np.flatnonzero(present)]))
+
+    return citations_affiliations_configs
+
+
+def affiliation_entries(file_input, config, ror_field, cache_dir):
+
+    # analyzed articles as nonzero entries (article, affiliation, weight) of the article x affiliation matrix,
+    # per-article numbers of citations, and the affiliations that are not excluded (see bootstrap.py and permutation.py)
+    rows, matrix, vectors = selected_articles(file_input, config, ror_field, cache_dir)
+    entry_rows, entry_columns, entry_weights = weight_matrix.row_entries(matrix, rows)
+    included = included_affiliations(file_input, config, ror_field, cache_dir)
+
+    return {'entry_rows': entry_rows, 'entry_columns': entry_columns, 'entry_weights': entry_weights, 'vectors': vectors,
+            'num_articles': len(rows), 'num_columns': len(included), 'included': included, 'num_articles_min': config['num_articles_min'],
+            'metric': config['metric'], 'weighted': config['weighted']}
+
+
+def included_affiliations(file_input, config, ror_field, cache_dir):
+
+    # affiliations of the columnar cache that are not excluded ('unknown' if $unknown_excluded$)
+    ror_names = dump_cache.load_strings(file_input, ror_field, cache_dir=cache_dir)
+    included = np.ones(len(ror_names), dtype=bool)
+    if config['unknown_excluded'] == True and 'unknown' in ror_names:
+        included[ror_names.index('unknown')] = False
+    return included
+
+
+def affiliation_bootstrap(file_input, config, ror_field, cache_dir, num_workers=1):
+
+    # bootstrap confidence intervals of the Gini coefficients of the preprints and of the publisher versions (see bootstrap.py)
+    # articles (not affiliations) are resampled, so the articles of the columnar cache are needed
+    return bootstrap.bootstrap_gini(**affiliation_entries(file_input, config, ror_field, cache_dir), num_replicates=config['bootstrap'],
+                                    seed=config['bootstrap_seed'], confidence=config['bootstrap_confidence'], num_workers=num_workers)
+
+
+def affiliation_permutation(file_input, config, ror_field, cache_dir, num_workers=1):
+
+    # p-value of the paired permutation test of the difference between the Gini coefficients of the preprints and of the publisher versions
+    # (see permutation.py); the preprint and publisher counts of articles are swapped, so the articles of the columnar cache are needed
+    return permutation.permutation_test(**affiliation_entries(file_input, config, ror_field, cache_dir), num_permutations=config['permutation'],
+                                        seed=config['permutation_seed'], alpha=config['permutation_alpha'], num_workers=num_workers)[0]
+
+
+def affiliation_metrics(citations_affiliations, num_articles_min, unknown_excluded, metric):
 
     # if unknown_excluded is set as True, remove articles and citations whose affiliation is unknown
     if unknown_excluded == True and 'unknown' in list(citations_affiliations.index.values):
         citations_affiliations = citations_affiliations.drop(index='unknown')
 
-    # filter out affiliations whose number of articles is less than num_articles_min
+    # filter out affiliations whose number of articles is less than num_articles_min (up to rounding, see accumulator.NUM_ARTICLES_TOLERANCE)
     citations_affiliations = citations_affiliations[
-        citations_affiliations['num_articles'] >= num_articles_min]
+        citations_affiliations['num_articles'] >= num_articles_min - NUM_ARTICLES_TOLERANCE].copy()
 
     if metric == 'ln':
         citations_affiliations['published_metric'] = citations_affiliations['published_ln'] / \
@@ -228,129 +598,262 @@ def citation_ineq(file_input, latest_month, max_months, target_author, affiliati
         citations_affiliations['published_metric'] = citations_affiliations['published']
         citations_affiliations['preprint_metric'] = citations_affiliations['preprint']
 
-    #####################
-    # depict Lorenz curve
-    #####################
-    citations_preprints = citations_affiliations['preprint_metric'].tolist()
-    citations_preprints.sort()
-    citations_preprints_cum = [citations_preprints[0]]
-    for i in range(1, len(citations_preprints)):
-        citations_preprints_cum.append(
-            citations_preprints_cum[i - 1] + citations_preprints[i])
-    citations_preprints_cum.insert(0, 0)
-
-    citations_published = citations_affiliations['published_metric'].tolist()
-    citations_published.sort()
-    citations_published_cum = [citations_published[0]]
-    for i in range(1, len(citations_published)):
-        citations_published_cum.append(
-            citations_published_cum[i - 1] + citations_published[i])
-    citations_published_cum.insert(0, 0)
+    return citations_affiliations
 
-    if fig == True:
 
-        l = [0]
-        for i in range(1, len(citations_affiliations) + 1):
-            l.append(i / len(citations_affiliations))
+def ineq_parameters(config):
+    # parameters of affiliation_ineq (the parameters of the bootstrap and the permutation test are not)
+    return {name: value for name, value in config.items() if name not in TEST_PARAMETERS}
 
-        fig, ax = plt.subplots()
 
-        plt.tight_layout()
+def lorenz_filename(config):
+    filename = config['target_author'] + '_' + config['affiliation_level'] + '_' + config['target_journal'] + '_' + str(config['diff_month_preprint_publisher_min']) + '-' + str(
+        config['diff_month_preprint_publisher_max']) + '_' + str(config['num_articles_min']) + '_' + str(config['unknown_excluded']).lower() + '_' + str(config['none_citation_included']).lower() + '_' + config['metric']
+    if config.get('weighted', False) == True:
+        filename += '_weighted'
+    return 'figure/lorenz_' + filename + '.png'
 
-        plt.xlim(0, 1)
-        plt.ylim(0, 1)
-        plt.plot(l, np.array(citations_preprints_cum) /
-                 citations_preprints_cum[-1], marker="x", markersize=0, linewidth=1, color='r', label='preprint')
-        plt.plot(l, np.array(citations_published_cum) /
-                 citations_published_cum[-1], marker="o", markersize=0, linewidth=1, color='b', label='publisher version')
-        plt.grid(which='both', axis='y')
-        ax.legend()
 
-        filename = target_author + '_' + affiliation_level + '_' + target_journal + '_' + str(diff_month_preprint_publisher_min) + '-' + str(
-            diff_month_preprint_publisher_max) + '_' + str(num_articles_min) + '_' + str(unknown_excluded).lower() + '_' + str(none_citation_included).lower() + '_' + metric
-        fig.savefig('figure/lorenz_' + filename + '.png', dpi=300)
+def affiliation_ineq(citations_affiliations, latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, fig=True, weighted=False, figures=None):
+
+    # $citations_affiliations$ is a table of affiliations returned by affiliation_metrics
+
+    #####################
+    # depict Lorenz curve
+    #####################
+    # if $weighted$ is set as True, each affiliation is weighted by its number of articles
+    if weighted == True:
+        weights = citations_affiliations['num_articles'].to_numpy()
+    else:
+        weights = None
+    with instrumentation.stage('gini'):
+        population_preprints, citations_preprints_cum = lorenz(citations_affiliations['preprint_metric'].to_numpy(), weights)
+        population_published, citations_published_cum = lorenz(citations_affiliations['published_metric'].to_numpy(), weights)
+        gini_preprints = gini_lorenz(population_preprints, citations_preprints_cum)
+        gini_published = gini_lorenz(population_published, citations_published_cum)
+
+    if fig == True:
+        task = (plotting.lorenz_figure, (lorenz_filename({'target_author': target_author, 'affiliation_level': affiliation_level, 'target_journal': target_journal,
+                                                          'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max,
+                                                          'num_articles_min': num_articles_min, 'none_citation_included': none_citation_included, 'unknown_excluded': unknown_excluded, 'metric': metric, 'weighted': weighted}),
+                                         plotting.lorenz_curve(population_preprints, citations_preprints_cum), plotting.lorenz_curve(population_published, citations_published_cum)))
+        # if $figures$ is given, drawing is deferred by appending the figure to it (see plotting.render)
+        if figures != None:
+            figures.append(task)
+        else:
+            with instrumentation.stage('plotting'):
+                plotting.render([task])
     #####################
 
     # return Gini coefficients, number of articles (i.e., pairs of preprints and publisher versions), and number of affiliations
-    return gini(np.array(citations_preprints)), gini(np.array(citations_published)), citations_affiliations['num_articles'].sum(), len(citations_affiliations)
+    return gini_preprints, gini_published, citations_affiliations['num_articles'].sum(), len(citations_affiliations)
+
+
+def citation_ineq(file_input, latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, fig=True, weighted=False, cache_dir=None, num_workers=1, decoder=None, result_dir=None,
+                  bootstrap=0, bootstrap_seed=0, bootstrap_confidence=0.95, permutation=0, permutation_seed=0, permutation_alpha=0.05, memory_budget=None):
+
+    # if $bootstrap$ is larger than 0, the confidence intervals of the Gini coefficients of the preprints and of the publisher versions
+    # are appended to the returned tuple, and if $permutation$ is larger than 0, the p-value of the test of their difference (see citation_ineq_sweep)
+    # if $memory_budget$ (in bytes) is given, the JSON records are aggregated in the bounded-memory mode (see bounded_accumulators)
+    return citation_ineq_sweep(file_input, [{'latest_month': latest_month, 'max_months': max_months, 'target_author': target_author, 'affiliation_level': affiliation_level, 'target_journal': target_journal,
+                                             'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max, 'num_articles_min': num_articles_min,
+                                             'none_citation_included': none_citation_included, 'unknown_excluded': unknown_excluded, 'metric': metric, 'fig': fig, 'weighted': weighted,
+                                             'bootstrap': bootstrap, 'bootstrap_seed': bootstrap_seed, 'bootstrap_confidence': bootstrap_confidence,
+                                             'permutation': permutation, 'permutation_seed': permutation_seed, 'permutation_alpha': permutation_alpha}], cache_dir=cache_dir, num_workers=num_workers, decoder=decoder, result_dir=result_dir,
+                               memory_budget=memory_budget)[0]
+
+
+def citation_ineq_sample(file_input, latest_month, max_months, target_author, affiliation_level, target_journal, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, num_articles_min, none_citation_included, unknown_excluded, metric, weighted=False, cache_dir='cache',
+                         sample_rate=0.01, sample_seed=0):
+
+    # approximate citation_ineq on a sample of the articles of the columnar cache (see sampling.py)
+    # the sampled articles are weighted up to the whole population, so the numbers of articles (also for $num_articles_min$) are estimates
+    # the means of affiliations with few sampled articles are noisy, which biases the Gini coefficients upward, so
+    # (1) affiliations also need sampled articles with a credit of at least $num_articles_min$ x $sample_rate$ (and sampling.MIN_SAMPLED_ARTICLES), and
+    # (2) the Gini coefficients are corrected by the jackknife estimates of their bias (with the affiliations selected in the full sample in all replicates)
+    # returns the bias-corrected Gini coefficients, the estimated number of articles and the number of affiliations,
+    # the standard errors of the Gini coefficients, and the estimated biases that were subtracted
+    config = {'latest_month': latest_month, 'max_months': max_months, 'target_author': target_author, 'affiliation_level': affiliation_level, 'target_journal': target_journal,
+              'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max,
+              'num_articles_min': num_articles_min, 'none_citation_included': none_citation_included, 'unknown_excluded': unknown_excluded, 'metric': metric, 'weighted': weighted}
+    ror_field = 'ror_name' if affiliation_level == 'institution' else 'ror_country'
+
+    sample = sampling.load_sample(file_input, sample_rate, sample_seed, cache_dir)
+    rows, matrix, vectors = selected_articles(file_input, config, ror_field, cache_dir, sample_rows=sample[0])
+    weights, groups = sampling.sample_weights(sample, rows)
+    entry_rows, entry_columns, entry_weights = weight_matrix.row_entries(matrix, rows)
+    included = included_affiliations(file_input, config, ror_field, cache_dir)
+
+    # affiliations selected by their estimated number of articles and by the credit of their sampled articles
+    num_articles_affiliations = np.bincount(entry_columns, weights=weights[entry_rows] * entry_weights, minlength=len(included))
+    num_sampled_affiliations = np.bincount(entry_columns, weights=entry_weights, minlength=len(included))
+    selected = included & (num_articles_affiliations > 0) & (num_articles_affiliations >= num_articles_min - NUM_ARTICLES_TOLERANCE) & \
+        (num_sampled_affiliations >= max(num_articles_min * sample_rate, sampling.MIN_SAMPLED_ARTICLES) - NUM_ARTICLES_TOLERANCE)
+
+    # Gini coefficients of the full sample and of its replicates (of the same affiliations)
+    ginis_preprint, ginis_published = bootstrap.replicate_ginis(sampling.replicate_weights(weights, groups), entry_rows, entry_columns, entry_weights, vectors,
+                                                                len(included), selected, 0, metric, weighted)
+    bias_preprint, bias_published = sampling.jackknife_bias(ginis_preprint, sample_rate), sampling.jackknife_bias(ginis_published, sample_rate)
+
+    return (ginis_preprint[0] - bias_preprint, ginis_published[0] - bias_published, num_articles_affiliations[selected].sum(), int(np.count_nonzero(selected)),
+            sampling.standard_errors(ginis_preprint, sample_rate), sampling.standard_errors(ginis_published, sample_rate), bias_preprint, bias_published)
+
+
+def paper_configs(latest_month, max_months=24):
+
+    # configurations of the analyses in Sections 3.2-3.4
+
+    # parameters shared by all the analyses
+    base_config = {'latest_month': latest_month, 'max_months': max_months, 'target_journal': 'all', 'diff_month_preprint_publisher_min': 0, 'diff_month_preprint_publisher_max': 'na',
+                   'none_citation_included': True, 'unknown_excluded': True, 'metric': 'ln'}
+
+    # Section 3.2
+    configs_institution_target_authors = [dict(base_config, target_author=at, affiliation_level='institution', num_articles_min=5) for at in ['first', 'last', 'corresp', 'all']]
+    configs_country_target_authors = [dict(base_config, target_author=at, affiliation_level='country', num_articles_min=10) for at in ['first', 'last', 'corresp', 'all']]
+
+    # Section 3.3
+    configs_institution_all = [dict(base_config, target_author='all', affiliation_level='institution', diff_month_preprint_publisher_min=i, diff_month_preprint_publisher_max=i, num_articles_min=3, fig=False) for i in range(0, 24)]
+    configs_country_all = [dict(base_config, target_author='all', affiliation_level='country', diff_month_preprint_publisher_min=i, diff_month_preprint_publisher_max=i, num_articles_min=5, fig=False) for i in range(0, 24)]
+
+    # Section 3.4
+    # 1932-6203 PLoS ONE
+    # 2045-2322 Scientific Reports
+    # 0305-1048 Nucleic acids research
+    # 0006-3495 Biophysical journal
+    # 1061-4036 Nature Genetics
+    # 0028-0836 Nature
+    # 0036-8075 Science
+    configs_journals = [dict(base_config, target_author=at, affiliation_level=al, target_journal=tj, num_articles_min=0, fig=False)
+                        for tj in ['1932-6203', '2045-2322', '0305-1048', '0006-3495', '1061-4036', '0028-0836', '0036-8075'] for al in ['institution', 'country'] for at in ['all']]
+
+    return {'institution_target_authors': configs_institution_target_authors, 'country_target_authors': configs_country_target_authors,
+            'institution_all': configs_institution_all, 'country_all': configs_country_all, 'journals': configs_journals}
 
 
 ##############################
 
-# file input
-file_input = 'data/biorxiv_metadata-oc.jsonl.gz'
-
-# latest month
-latest_month = datetime.strptime('2021-06', '%Y-%m')
-
-
-##########
-# Section 3.2
-##########
-print('============')
-print('Section 3.2')
-print('============')
-
-fw = open('result/gini_institution_target-authors.tsv', 'w')
-for at in ['first', 'last', 'corresp', 'all']:
-    gini_preprint, gini_publisher, num_articles, num_affiliations = citation_ineq(file_input=file_input, latest_month=latest_month, max_months=24, target_author=at, affiliation_level='institution',
-                                                                                  target_journal='all', diff_month_preprint_publisher_min=0, diff_month_preprint_publisher_max='na', num_articles_min=5, none_citation_included=True, unknown_excluded=True, metric='ln')
-    fw.write(at + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
-             '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
-fw.close()
-
-fw = open('result/gini_country_target-authors.tsv', 'w')
-for at in ['first', 'last', 'corresp', 'all']:
-    gini_preprint, gini_publisher, num_articles, num_affiliations = citation_ineq(file_input=file_input, latest_month=latest_month, max_months=24, target_author=at, affiliation_level='country',
-                                                                                  target_journal='all', diff_month_preprint_publisher_min=0, diff_month_preprint_publisher_max='na', num_articles_min=10, none_citation_included=True, unknown_excluded=True, metric='ln')
-    fw.write(at + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
-             '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
-fw.close()
-
-##########
-# Section 3.3
-##########
-print('============')
-print('Section 3.3')
-print('============')
-
-fw = open('result/gini_institution_all_3.tsv', 'w')
-for i in range(0, 24):
-    gini_preprint, gini_publisher, num_articles, num_affiliations = citation_ineq(file_input=file_input, latest_month=latest_month, max_months=24, target_author='all', affiliation_level='institution',
-                                                                                  target_journal='all', diff_month_preprint_publisher_min=i, diff_month_preprint_publisher_max=i, num_articles_min=3, none_citation_included=True, unknown_excluded=True, metric='ln', fig=False)
-    fw.write(str(i) + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
-             '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
-fw.close()
-
-fw = open('result/gini_country_all_5.tsv', 'w')
-for i in range(0, 24):
-    gini_preprint, gini_publisher, num_articles, num_affiliations = citation_ineq(file_input=file_input, latest_month=latest_month, max_months=24, target_author='all', affiliation_level='country',
-                                                                                  target_journal='all', diff_month_preprint_publisher_min=i, diff_month_preprint_publisher_max=i, num_articles_min=5, none_citation_included=True, unknown_excluded=True, metric='ln', fig=False)
-    fw.write(str(i) + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
-             '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
-fw.close()
-
-##########
-# Section 3.4
-##########
-print('============')
-print('Section 3.4')
-print('============')
-
-# 1932-6203 PLoS ONE
-# 2045-2322 Scientific Reports
-# 0305-1048 Nucleic acids research
-# 0006-3495 Biophysical journal
-# 1061-4036 Nature Genetics
-# 0028-0836 Nature
-# 0036-8075 Science
-
-fw = open('result/gini_journals.tsv', 'w')
-for tj in ['1932-6203', '2045-2322', '0305-1048', '0006-3495', '1061-4036', '0028-0836', '0036-8075']:
-    for al in ['institution', 'country']:
-        for at in ['all']:
-            gini_preprint, gini_publisher, num_articles, num_affiliations = citation_ineq(file_input=file_input, latest_month=latest_month, max_months=24, target_author=at, affiliation_level=al,
-                                                                                          target_journal=tj, diff_month_preprint_publisher_min=0, diff_month_preprint_publisher_max='na', num_articles_min=0, none_citation_included=True, unknown_excluded=True, metric='ln', fig=False)
-            fw.write(tj + '\t' + al + '\t' + at + '\t' + str(gini_preprint) + '\t' + str(
+# sections of the paper and the configurations computed for them (see paper_configs)
+SECTIONS = {'3.2': ['institution_target_authors', 'country_target_authors'], '3.3': ['institution_all', 'country_all'], '3.4': ['journals']}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Lorenz curves and Gini coefficients of Sections 3.2-3.4')
+    parser.add_argument('--file-input', default=['data/biorxiv_metadata-oc.jsonl.gz'], help='input file (or shard files)', nargs='+')
+    parser.add_argument('--latest-month', default='2021-06', help='latest month (YYYY-MM)')
+    parser.add_argument('--max-months', default=24, type=int, help='number of months for counting the number of citations after preprint publication')
+    parser.add_argument('--cache-dir', default='cache', help='directory of the columnar cache of the input file')
+    parser.add_argument('--no-cache', action='store_true', help='parse the JSON records instead of using the columnar cache')
+    parser.add_argument('--previous-cache', default=None, help='cache directory of the previous dump, from which the columnar cache of the input file is updated if it is not valid (see dump_cache.update_cache)')
+    parser.add_argument('--num-workers', default=1, type=int, help='number of worker processes used when the JSON records are parsed')
+    parser.add_argument('--result-dir', default='cache/results', help='directory of the cached results of citation_ineq')
+    parser.add_argument('--no-result-cache', action='store_true', help='compute everything again')
+    parser.add_argument('--report-file', default=None, help='report of the time of each stage and the number of rejected records (see instrumentation.py)')
+    parser.add_argument('--sections', default=list(SECTIONS.keys()), choices=list(SECTIONS.keys()), nargs='+', help='sections to run')
+    parser.add_argument('--memory-budget', default=None, type=float, help='memory (in MB) of the sketches of the bounded-memory mode used when the JSON records are parsed (if not given, all affiliations are accumulated)')
+    args = parser.parse_args(argv)
+
+    # the columnar cache is built from a single dump, so shard files are parsed from their JSON records
+    if len(args.file_input) > 1 and not args.no_cache:
+        parser.error('several input files (shard files) require --no-cache')
+
+    # file input
+    file_input = args.file_input[0] if len(args.file_input) == 1 else args.file_input
+
+    # latest month
+    latest_month = datetime.strptime(args.latest_month, '%Y-%m')
+
+    # directory of the columnar cache of the input file (if None, the JSON records are parsed)
+    cache_dir = None if args.no_cache else args.cache_dir
+    if cache_dir != None:
+        dump_cache.prepare_cache(file_input, cache_dir, args.previous_cache)
+
+    # results of citation_ineq are cached in this directory (if None, everything is computed again)
+    result_dir = None if args.no_result_cache else args.result_dir
+
+    # report of the time of each stage and the number of rejected records (if None, nothing is recorded; see instrumentation.py)
+    report_file = args.report_file
+    if report_file != None:
+        instrumentation.enable()
+
+    pd.options.display.float_format = '{:,.2f}'.format
+    os.makedirs('result', exist_ok=True)
+
+    configs = paper_configs(latest_month, args.max_months)
+    configs_institution_target_authors = configs['institution_target_authors']
+    configs_country_target_authors = configs['country_target_authors']
+    configs_institution_all = configs['institution_all']
+    configs_country_all = configs['country_all']
+    configs_journals = configs['journals']
+
+    # all the configurations of the sections are computed in a single pass over the input file
+    configs = [config for section in args.sections for name in SECTIONS[section] for config in configs[name]]
+    # results are returned in the order of the configurations
+    results = iter(citation_ineq_sweep(file_input, configs, cache_dir=cache_dir, num_workers=args.num_workers, result_dir=result_dir,
+                                       memory_budget=int(args.memory_budget * (1 << 20)) if args.memory_budget != None else None))
+
+    ##########
+    # Section 3.2
+    ##########
+    if '3.2' in args.sections:
+        print('============')
+        print('Section 3.2')
+        print('============')
+
+        fw = open('result/gini_institution_target-authors.tsv', 'w')
+        for config in configs_institution_target_authors:
+            gini_preprint, gini_publisher, num_articles, num_affiliations = next(results)
+            fw.write(config['target_author'] + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
+                     '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
+        fw.close()
+
+        fw = open('result/gini_country_target-authors.tsv', 'w')
+        for config in configs_country_target_authors:
+            gini_preprint, gini_publisher, num_articles, num_affiliations = next(results)
+            fw.write(config['target_author'] + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
+                     '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
+        fw.close()
+
+    ##########
+    # Section 3.3
+    ##########
+    if '3.3' in args.sections:
+        print('============')
+        print('Section 3.3')
+        print('============')
+
+        fw = open('result/gini_institution_all_3.tsv', 'w')
+        for config in configs_institution_all:
+            gini_preprint, gini_publisher, num_articles, num_affiliations = next(results)
+            fw.write(str(config['diff_month_preprint_publisher_min']) + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
+                     '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
+        fw.close()
+
+        fw = open('result/gini_country_all_5.tsv', 'w')
+        for config in configs_country_all:
+            gini_preprint, gini_publisher, num_articles, num_affiliations = next(results)
+            fw.write(str(config['diff_month_preprint_publisher_min']) + '\t' + str(gini_preprint) + '\t' + str(gini_publisher) +
+                     '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
+        fw.close()
+
+    ##########
+    # Section 3.4
+    ##########
+    if '3.4' in args.sections:
+        print('============')
+        print('Section 3.4')
+        print('============')
+
+        fw = open('result/gini_journals.tsv', 'w')
+        for config in configs_journals:
+            gini_preprint, gini_publisher, num_articles, num_affiliations = next(results)
+            fw.write(config['target_journal'] + '\t' + config['affiliation_level'] + '\t' + config['target_author'] + '\t' + str(gini_preprint) + '\t' + str(
                 gini_publisher) + '\t' + str(num_articles) + '\t' + str(num_affiliations) + '\n')
-fw.close()
+        fw.close()
+
+    if report_file != None:
+        instrumentation.write_report(report_file, configs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -------------------------------------------
+#
+# number of citations per article and month since preprint publication
+#
+# -------------------------------------------
+
+# modules
+import os
+import shutil
+import numpy as np
+import dump_cache
+import record_index
+
+#=========================#
+# setting
+#=========================#
+
+# arrays of the histogram in a ragged (compressed sparse row) layout:
+# row i holds the numbers of citations to the preprint and to the publisher version of the i-th article
+# in months 0, 1, ..., (month of its last citation) since preprint publication
+PARTS = ['indptr', 'preprint', 'published']
+
+# maximum number of citations in one month (counts are saturated)
+MAX_COUNT = np.iinfo(np.uint16).max
+
+
+def histogram_path(file_input, cache_dir='cache'):
+    # the histogram is stored in the directory of the columnar cache, so it is removed when the cache is rebuilt
+    return os.path.join(dump_cache.cache_path(file_input, cache_dir), 'histogram')
+
+
+def build_histogram(file_input, cache_dir='cache'):
+
+    articles = dump_cache.load_columns(file_input, 'articles', ['month'], cache_dir=cache_dir)
+    citations = dump_cache.load_columns(file_input, 'citations', cache_dir=cache_dir)
+    num_records = len(articles['month'])
+
+    # citations whose citing entity has no publication month, or which are made before preprint publication, are never counted
+    months = citations['month'] - articles['month'][citations['article']]
+    valid = (citations['month'] != -1) & (months >= 0)
+    article = citations['article'][valid]
+    months = months[valid]
+    preprint = citations['preprint'][valid]
+
+    lengths = np.zeros(num_records, dtype=np.int64)
+    np.maximum.at(lengths, article, months + 1)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+
+    positions = indptr[article] + months
+    counts = {'preprint': np.bincount(positions[preprint], minlength=indptr[-1]),
+              'published': np.bincount(positions[~preprint], minlength=indptr[-1])}
+
+    path = histogram_path(file_input, cache_dir)
+    path_tmp = path + '.tmp'
+    shutil.rmtree(path_tmp, ignore_errors=True)
+    os.makedirs(path_tmp)
+    np.save(os.path.join(path_tmp, 'indptr.npy'), indptr)
+    for name in ['preprint', 'published']:
+        np.save(os.path.join(path_tmp, name + '.npy'), np.minimum(counts[name], MAX_COUNT).astype(np.uint16))
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(path_tmp, path)
+
+
+def load_histogram(file_input, cache_dir='cache'):
+
+    # (indptr, preprint, published) of the histogram (memory-mapped), building it if necessary
+    if dump_cache.cache_valid(file_input, cache_dir) == False:
+        dump_cache.build_cache(file_input, cache_dir)
+
+    path = histogram_path(file_input, cache_dir)
+    if os.path.exists(path) == False:
+        build_histogram(file_input, cache_dir)
+
+    return tuple([np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in PARTS])
+
+
+def window_entries(histogram, rows, max_months):
+
+    # entries of the articles $rows$ within $max_months$ months after preprint publication:
+    # index in $rows$, month since preprint publication, and numbers of citations to the preprint and to the publisher version
+    indptr, preprint, published = histogram
+    positions = record_index.range_positions(indptr, rows, max_months + 1)
+    counts = np.minimum(indptr[rows + 1] - indptr[rows], max_months + 1)
+    entry_rows = np.repeat(np.arange(len(rows)), counts)
+    entry_months = positions - indptr[rows][entry_rows]
+    return entry_rows, entry_months, preprint[positions].astype(np.int64), published[positions].astype(np.int64)
+
+
+def window_counts(histogram, rows, max_months):
+
+    # numbers of citations to the preprint and to the publisher version of the articles $rows$ within $max_months$ months after preprint publication
+    entry_rows, entry_months, preprint, published = window_entries(histogram, rows, max_months)
+    return (np.bincount(entry_rows, weights=preprint, minlength=len(rows)).astype(np.int64),
+            np.bincount(entry_rows, weights=published, minlength=len(rows)).astype(np.int64))
@@ -5,19 +5,30 @@
 # -------------------------------------------
 
 import json
+import re
 import pandas as pd
 import os
 import traceback
 import gzip
 from datetime import datetime
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 from statistics import mean
 import math
 from operator import truediv
-
-pd.options.display.float_format = '{:,.2f}'.format
+import dump_cache
+import reader
+import records
+import instrumentation
+import time
+import citation_histogram
+import citation_bias
+import weight_matrix
+import sampling
+from accumulator import MonthlyAccumulator
+import plotting
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 #=========================#
 # settings
@@ -32,9 +43,15 @@ latest_month = datetime.strptime('2021-06', '%Y-%m')
 # number of months for counting the number of citations after preprint publication
 max_months = 24
 
-# ISSNL of target journal (if 'all', all journals are considered)
+# ISSNL of target journal (if 'all', all journals are considered; otherwise Figure 1 is drawn from the series of the journal, see GROUPS)
 target_journal = 'all'
 
+# groups of the variants of Figure 1 per group ('journal', 'country', or 'institution'; if None, no variants are drawn)
+group_by = None
+
+# number of the largest groups (by the number of articles) whose variants of Figure 1 are drawn
+num_groups = 10
+
 # conditions for the number of months from publication of preprint to publication of publisher version (if no criteria, set 'na')
 diff_month_preprint_publisher_min = 0
 diff_month_preprint_publisher_max = 'na'
@@ -43,162 +60,488 @@ diff_month_preprint_publisher_max = 'na'
 metric = 'ln' # arithmetic mean of the log-transformed number of citation after addition of 1
 # metric = 'arithmetic-mean' # arithmetic mean
 
+# directory of the columnar cache of the input file (if None, the JSON records are parsed)
+cache_dir = 'cache'
+
+# number of worker processes used when the JSON records are parsed
+num_workers = 1
+
+# report of the time of each stage and the number of rejected records (if None, nothing is recorded; see instrumentation.py)
+report_file = None
+
 #=========================#
 
 #=========================#
 # count the number of citations
 #=========================#
 
-# lists that record the number of citations, preprints, and publisher versions per the number of months since preprint publication
-num_citations_preprint = [0] * (max_months + 1)
-num_citations_published = [0] * (max_months + 1)
-num_citations_preprint_ln = [0] * (max_months + 1)
-num_citations_published_ln = [0] * (max_months + 1)
-num_articles_preprint = [0] * (max_months + 1)
-num_articles_published = [0] * (max_months + 1)
+# names of the lists that record the number of citations, preprints, and publisher versions per the number of months since preprint publication
+COUNTERS = ['num_citations_preprint', 'num_citations_published', 'num_citations_preprint_ln',
+            'num_citations_published_ln', 'num_articles_preprint', 'num_articles_published']
+
+# groups of the grouped series and the field (string table of the columnar cache) that defines them
+# journal: ISSN-L of the journal of the publisher version, country and institution: ROR of the affiliations of all the authors (fractional credit)
+GROUPS = {'journal': 'journal', 'country': 'ror_country', 'institution': 'ror_name'}
 
 def diff_month(d1, d2):
     return (d1.year - d2.year) * 12 + d1.month - d2.month
 
-c = 0
-num_articles = 0
+def monthly_counts_json(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, shard=None, decoder=None, group_by=None):
+
+    # arrays that record the number of citations per the number of months since preprint publication
+    num_citations_preprint = np.zeros(max_months + 1, dtype=int)
+    num_citations_published = np.zeros(max_months + 1, dtype=int)
+    num_citations_preprint_ln = np.zeros(max_months + 1)
+    num_citations_published_ln = np.zeros(max_months + 1)
+
+    # months in which each article is a preprint ([0, preprint_end)) and a publisher version ([published_start, published_end))
+    # (the numbers of preprints and publisher versions per month are their difference arrays summed up cumulatively)
+    preprint_ends = []
+    published_starts = []
+    published_ends = []
 
-with gzip.open(file_input,'rt') as f:
-    for line in f:
+    # if $group_by$ is given, the series are also accumulated per group of articles (see GROUPS)
+    grouped = MonthlyAccumulator(max_months) if group_by != None else None
+
+    latest_month = records.date_ordinal(latest_month)
+    month_index = np.arange(max_months + 1)
+
+    c = 0
+    num_articles = 0
+
+    # if instrumentation is enabled, the time of each stage and the reason of every rejection are recorded (see instrumentation.py)
+    timed = instrumentation.enabled
+    clock = time.perf_counter
+
+    # records without DOI of the publisher version are rejected before decoding
+    for json_obj in reader.read_records(file_input, shard, decoder):
         if c % 10000 == 0:
             print(c, flush=True)
         c += 1
 
-        json_obj = json.loads(line.strip())
+        if timed:
+            start = clock()
 
-        biorxiv_month = datetime.strptime(json_obj['month'], '%Y-%m')
+        biorxiv_month = records.month_ordinal(json_obj['month'])
 
         # DOI of publisher version
         # if no DOI, filter out the record from the analysis
         published_doi = json_obj.get('published_doi', None)
         if published_doi == None:
+            if timed:
+                instrumentation.count('no published_doi')
             continue
 
         # publication of month of the publisher version
         # if no publication month, filter out the record from the analysis
-        try:
-            published_month = datetime.strptime(json_obj['published_month'], '%Y-%m')
-        except:
+        published_month = records.month_ordinal(json_obj.get('published_month'))
+        if published_month == None:
+            if timed:
+                instrumentation.count('bad published_month')
             continue
 
+        if timed:
+            instrumentation.add_time('date_parsing', clock() - start)
+
         # if the record has a citation period whose length is less than $max_months$-month, filter out the record from the analysis
-        if diff_month(latest_month, biorxiv_month) < max_months:
+        if latest_month - biorxiv_month < max_months:
+            if timed:
+                instrumentation.count('window too short')
             continue
 
         # if the conditions for the number of months from publication of preprint to publication of publisher version are not met, filter out the record from the analysis
         if diff_month_preprint_publisher_min != 'na':
-            if diff_month(published_month, biorxiv_month) < diff_month_preprint_publisher_min:
+            if published_month - biorxiv_month < diff_month_preprint_publisher_min:
+                if timed:
+                    instrumentation.count('lag out of range')
                 continue
         if diff_month_preprint_publisher_max != 'na':
-            if diff_month(published_month, biorxiv_month) > diff_month_preprint_publisher_max:
+            if published_month - biorxiv_month > diff_month_preprint_publisher_max:
+                if timed:
+                    instrumentation.count('lag out of range')
                 continue
 
         # author affiliation
         authors = json_obj['author']['authors']
         if len(authors) == 0:
+            if timed:
+                instrumentation.count('no authors')
             continue
 
         #### preprints and publisher versions that reach this point are analyzed  ####
 
         num_articles += 1
 
-        # count the number of preprints and publisher versions per the number of months since preprint publication
-        available_months = diff_month(latest_month, biorxiv_month)
-        for i in range(0, diff_month(published_month, biorxiv_month)):
-            if i > max_months:
-                break
-            num_articles_preprint[i] += 1
-        for i in range(diff_month(published_month, biorxiv_month), available_months + 1):
-            if i > max_months:
-                break
-            num_articles_published[i] += 1
-
-        # count the number of citations per the number of months since preprint publication
-        citations = json_obj['oc']
-        month_citations = {}
-        for citation in citations:
-            # get publication month of a citing entity
-            # if no publication month, filter out the citation from the analysis
-            try:
-                if len(citation['creation_month']) == 4:
-                    citation_month = datetime.strptime(citation['creation_month'] + '-01', '%Y-%m')
-                else:
-                    citation_month = datetime.strptime(citation['creation_month'], '%Y-%m')
-            except:
-                continue
-
-            # count the number of months from publication of preprint to citation
-            # if the number of months is smaller than 0 or exceeds $max_month$ months, filter out the citation
-            months = diff_month(citation_month, biorxiv_month)
-            if months < 0 or months > max_months:
-                continue
-            month_citations[citation_month] = month_citations.get(citation_month, 0) + 1
-
-            # judge whether a citation is to preprint or publisher version
-            if citation['cited_doi'].startswith('10.1101') == False:
-                num_citations_published[months] += 1
-            else:
-                num_citations_preprint[months] += 1
-
-
-        for key in month_citations.keys():
-            if diff_month(key, published_month) > 0:
-                num_citations_published[diff_month(key, biorxiv_month)] += month_citations[key]
-                num_citations_published_ln[diff_month(key, biorxiv_month)] += math.log(month_citations[key] + 1)
-            else:
-                num_citations_preprint[diff_month(key, biorxiv_month)] += month_citations[key]
-                num_citations_preprint_ln[diff_month(key, biorxiv_month)] += math.log(month_citations[key] + 1)
-
-
-if metric == 'ln':
-    num_citations_preprint_final = list(map(truediv, num_citations_preprint_ln, num_articles_preprint))
-    num_citations_published_final = list(map(truediv, num_citations_published_ln, num_articles_published))
-elif metric == 'arithmetic-mean':
-    num_citations_preprint_final = list(map(truediv, num_citations_preprint, num_articles_preprint))
-    num_citations_published_final = list(map(truediv, num_citations_published, num_articles_published))
-
-print(num_articles)
-
-#=========================#
-# generate a figure
-#=========================#
-
-l = list(range(0, max_months + 1))
-
-fig = plt.figure()
-
-ax1 = fig.add_subplot(2, 1, 1)
-ax2 = fig.add_subplot(2, 1, 2)
-
-ax1.minorticks_on()
-ax1.grid(which='major', axis='x')
-ax1.grid(which='major', axis='y')
-ax1.grid(which='minor', axis='y', linestyle=':')
+        if timed:
+            instrumentation.count('analyzed')
+            start = clock()
 
-ax2.set_axisbelow(True)
-ax2.grid(which='both', axis='x')
-ax2.grid(which='both', axis='y')
+        # the article is a preprint until publication of the publisher version, and a publisher version from then until $latest_month$
+        available_months = latest_month - biorxiv_month
+        lag = published_month - biorxiv_month
+        preprint_ends.append(min(max(lag, 0), max_months + 1))
+        published_starts.append(max(lag, 0))
+        published_ends.append(min(available_months, max_months) + 1)
+
+        # count the number of citations per the number of months since preprint publication
+        # citations whose citing entity has no publication month, or which are made before preprint publication or after $max_months$ months, are filtered out
+        citation_months, citation_preprint_flags = records.citation_arrays(json_obj['oc'])
+        months, window = records.citation_window(citation_months, biorxiv_month, max_months)
+
+        # judge whether a citation is to preprint or publisher version, and
+        # classify citations per month by whether they are made after publication of the publisher version
+        month_citations = np.bincount(months[window], minlength=max_months + 1)
+        after_published = month_index > lag
+        citations_preprint = np.bincount(months[window & citation_preprint_flags], minlength=max_months + 1) + np.where(after_published, 0, month_citations)
+        citations_published = np.bincount(months[window & ~citation_preprint_flags], minlength=max_months + 1) + np.where(after_published, month_citations, 0)
+        citations_preprint_ln = np.where(~after_published & (month_citations > 0), np.log(month_citations + 1), 0)
+        citations_published_ln = np.where(after_published & (month_citations > 0), np.log(month_citations + 1), 0)
+        num_citations_preprint += citations_preprint
+        num_citations_published += citations_published
+        num_citations_preprint_ln += citations_preprint_ln
+        num_citations_published_ln += citations_published_ln
+
+        if grouped != None:
+            grouped.add(record_groups(json_obj, group_by), preprint_ends[-1], published_starts[-1], published_ends[-1],
+                        np.array([citations_preprint, citations_published, citations_preprint_ln, citations_published_ln]))
+
+        if timed:
+            instrumentation.add_time('aggregation', clock() - start)
+
+    num_articles_preprint, num_articles_published = articles_at_risk(np.array(preprint_ends, dtype=int), np.array(published_starts, dtype=int), np.array(published_ends, dtype=int), max_months)
+
+    counts = {'num_citations_preprint': num_citations_preprint.tolist(), 'num_citations_published': num_citations_published.tolist(),
+              'num_citations_preprint_ln': num_citations_preprint_ln.tolist(), 'num_citations_published_ln': num_citations_published_ln.tolist(),
+              'num_articles_preprint': num_articles_preprint, 'num_articles_published': num_articles_published, 'num_articles': num_articles}
+    if grouped != None:
+        counts['groups'] = grouped
+    return counts
+
+
+def articles_at_risk(preprint_ends, published_starts, published_ends, max_months, weights=None):
+
+    # numbers of preprints and publisher versions per the number of months since preprint publication from the difference arrays
+    # (+1 at the first month and -1 after the last month of each article)
+    num_articles = len(preprint_ends) if weights is None else weights.sum()
+    num_articles_preprint = (num_articles - np.cumsum(np.bincount(preprint_ends, weights=weights, minlength=max_months + 2))[:max_months + 1]).tolist()
+    valid = published_starts < published_ends
+    published_weights = weights[valid] if weights is not None else None
+    num_articles_published = np.cumsum(np.bincount(published_starts[valid], weights=published_weights, minlength=max_months + 2) -
+                                       np.bincount(published_ends[valid], weights=published_weights, minlength=max_months + 2))[:max_months + 1].tolist()
+    return num_articles_preprint, num_articles_published
+
+
+def record_groups(json_obj, group_by):
+
+    # groups of an article (with their weights) for the grouped series
+    if group_by == 'journal':
+        return {json_obj.get('published_journalissnl', ''): 1}
+    return citation_bias.affiliation_weights(json_obj['author']['authors'], 'all', GROUPS[group_by])[0]
+
+
+def selected_records(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir, sample_rows=None):
+
+    # columns of the cache that are needed for counting
+    articles = dump_cache.load_columns(file_input, 'articles', ['month', 'published_doi', 'published_month', 'lag', 'num_authors'], cache_dir=cache_dir)
+
+    # records that are analyzed (the same conditions as in monthly_counts_json)
+    available_months = records.date_ordinal(latest_month) - articles['month']
+    conditions = [('no published_doi', articles['published_doi']), ('bad published_month', articles['published_month'] != -1),
+                  ('window too short', available_months >= max_months)]
+    if diff_month_preprint_publisher_min != 'na':
+        conditions.append(('lag out of range', articles['lag'] >= diff_month_preprint_publisher_min))
+    if diff_month_preprint_publisher_max != 'na':
+        conditions.append(('lag out of range', articles['lag'] <= diff_month_preprint_publisher_max))
+    conditions.append(('no authors', articles['num_authors'] > 0))
+
+    # if $sample_rows$ is given, only the sampled records are analyzed (see sampling.py)
+    if sample_rows is not None:
+        sampled = np.zeros(len(articles['month']), dtype=bool)
+        sampled[sample_rows] = True
+        conditions.append(('not sampled', sampled))
+
+    # if instrumentation is enabled, the records rejected by each condition (in this order) are counted
+    selected = np.ones(len(articles['month']), dtype=bool)
+    for reason, condition in conditions:
+        if instrumentation.enabled:
+            instrumentation.count(reason, int(np.count_nonzero(selected & ~condition)))
+        selected &= condition
+
+    if instrumentation.enabled:
+        instrumentation.count('read', len(selected))
+        instrumentation.count('analyzed', int(selected.sum()))
+
+    return articles, available_months, np.flatnonzero(selected)
+
+
+def counts_of_records(file_input, articles, available_months, rows, max_months, cache_dir, weights=None):
+
+    # numbers of citations, preprints, and publisher versions per the number of months since preprint publication of the records $rows$
+    # if $weights$ of the records are given (e.g., of a sample, see sampling.py), weighted sums are returned
+    num_articles = len(rows) if weights is None else weights.sum()
+
+    # count the number of preprints and publisher versions per the number of months since preprint publication
+    # (an article is a preprint for months [0, lag) and a publisher version for months [lag, available months])
+    lag = articles['lag'][rows]
+    num_articles_preprint, num_articles_published = articles_at_risk(np.clip(lag, 0, max_months + 1), np.maximum(lag, 0), np.minimum(available_months[rows], max_months) + 1, max_months, weights)
+
+    # count the number of citations per the number of months since preprint publication (see citation_histogram.py)
+    entry_rows, entry_months, preprint, published = citation_histogram.window_entries(citation_histogram.load_histogram(file_input, cache_dir), rows, max_months)
+    entry_weights = weights[entry_rows] if weights is not None else np.ones(len(entry_rows))
+    num_citations_preprint = np.bincount(entry_months, weights=preprint * entry_weights, minlength=max_months + 1)
+    num_citations_published = np.bincount(entry_months, weights=published * entry_weights, minlength=max_months + 1)
+
+    # citations per article and month are classified by whether they are made after publication of the publisher version
+    month_citations = preprint + published
+    cited = month_citations > 0
+    article_months_month = entry_months[cited]
+    month_citations = month_citations[cited]
+    entry_weights = entry_weights[cited]
+    after_published = article_months_month > lag[entry_rows[cited]]
+    num_citations_published = num_citations_published + np.bincount(article_months_month[after_published], weights=month_citations[after_published] * entry_weights[after_published], minlength=max_months + 1)
+    num_citations_preprint = num_citations_preprint + np.bincount(article_months_month[~after_published], weights=month_citations[~after_published] * entry_weights[~after_published], minlength=max_months + 1)
+    if weights is None:
+        num_citations_published = num_citations_published.astype(int)
+        num_citations_preprint = num_citations_preprint.astype(int)
+    num_citations_published_ln = np.bincount(article_months_month[after_published], weights=np.log(month_citations[after_published] + 1) * entry_weights[after_published], minlength=max_months + 1).tolist()
+    num_citations_preprint_ln = np.bincount(article_months_month[~after_published], weights=np.log(month_citations[~after_published] + 1) * entry_weights[~after_published], minlength=max_months + 1).tolist()
+
+    return {'num_citations_preprint': num_citations_preprint.tolist(), 'num_citations_published': num_citations_published.tolist(),
+            'num_citations_preprint_ln': num_citations_preprint_ln, 'num_citations_published_ln': num_citations_published_ln,
+            'num_articles_preprint': num_articles_preprint, 'num_articles_published': num_articles_published, 'num_articles': num_articles}
+
+
+def grouped_records(file_input, articles, available_months, rows, max_months, cache_dir, group_by, chunk_size=10000):
+
+    # series of the records $rows$ per group (see GROUPS), with the same counting as counts_of_records
+    grouped = MonthlyAccumulator(max_months)
+    names = dump_cache.load_strings(file_input, GROUPS[group_by], cache_dir=cache_dir)
+    if group_by == 'journal':
+        journal = dump_cache.load_columns(file_input, 'articles', ['journal'], cache_dir=cache_dir)['journal']
+    else:
+        matrix = weight_matrix.load_weight_matrix(file_input, 'all', GROUPS[group_by], cache_dir)
+    histogram = citation_histogram.load_histogram(file_input, cache_dir)
+
+    for start in range(0, len(rows), chunk_size):
+        rows_chunk = rows[start:start + chunk_size]
+
+        # groups of the records as entries (record, group, weight)
+        if group_by == 'journal':
+            entry_records, entry_columns, entry_weights = np.arange(len(rows_chunk)), np.asarray(journal[rows_chunk]), np.ones(len(rows_chunk))
+        else:
+            entry_records, entry_columns, entry_weights = weight_matrix.row_entries(matrix, rows_chunk)
+        columns, entry_columns = np.unique(entry_columns, return_inverse=True)
+        entry_ids = np.array([grouped.intern(names[column]) for column in columns], dtype=int)[entry_columns]
+
+        # citations per record and month (see counts_of_records)
+        lag = articles['lag'][rows_chunk]
+        entry_rows, entry_months, preprint, published = citation_histogram.window_entries(histogram, rows_chunk, max_months)
+        month_citations = preprint + published
+        after_published = entry_months > lag[entry_rows]
+        citations = np.zeros((len(rows_chunk), 4, max_months + 1))
+        citations[entry_rows, 0, entry_months] = preprint + np.where(after_published, 0, month_citations)
+        citations[entry_rows, 1, entry_months] = published + np.where(after_published, month_citations, 0)
+        citations[entry_rows, 2, entry_months] = np.where(~after_published & (month_citations > 0), np.log(month_citations + 1), 0)
+        citations[entry_rows, 3, entry_months] = np.where(after_published & (month_citations > 0), np.log(month_citations + 1), 0)
+
+        grouped.add_entries(entry_records, entry_ids, entry_weights, np.clip(lag, 0, max_months + 1), np.maximum(lag, 0),
+                            np.minimum(available_months[rows_chunk], max_months) + 1, citations)
+
+    return grouped
+
+
+def monthly_counts_cache(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir, group_by=None):
+    articles, available_months, rows = selected_records(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir)
+    counts = counts_of_records(file_input, articles, available_months, rows, max_months, cache_dir)
+    if group_by != None:
+        counts['groups'] = grouped_records(file_input, articles, available_months, rows, max_months, cache_dir, group_by)
+    return counts
+
+
+def monthly_counts_sample(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, metric='ln', cache_dir='cache',
+                          sample_rate=0.01, sample_seed=0):
+
+    # approximate monthly_counts on a sample of the articles of the columnar cache (see sampling.py)
+    # the counts are weighted up to the whole population, and the per-month means of $metric$ (as in Figure 1) are returned
+    # as 'num_citations_preprint_final' and 'num_citations_published_final' with their standard errors ('..._se')
+    sample = sampling.load_sample(file_input, sample_rate, sample_seed, cache_dir)
+    articles, available_months, rows = selected_records(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir, sample[0])
+    weights, groups = sampling.sample_weights(sample, rows)
+
+    # counts of the full sample and of its replicates
+    replicates = [counts_of_records(file_input, articles, available_months, rows, max_months, cache_dir, replicate) for replicate in sampling.replicate_weights(weights, groups)]
+    if metric == 'ln':
+        names = ['num_citations_preprint_ln', 'num_citations_published_ln']
+    elif metric == 'arithmetic-mean':
+        names = ['num_citations_preprint', 'num_citations_published']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means_preprint = [np.array(counts[names[0]]) / np.array(counts['num_articles_preprint']) for counts in replicates]
+        means_published = [np.array(counts[names[1]]) / np.array(counts['num_articles_published']) for counts in replicates]
+
+    counts = replicates[0]
+    counts['num_citations_preprint_final'] = means_preprint[0].tolist()
+    counts['num_citations_published_final'] = means_published[0].tolist()
+    counts['num_citations_preprint_final_se'] = sampling.standard_errors(means_preprint, sample_rate).tolist()
+    counts['num_citations_published_final_se'] = sampling.standard_errors(means_published, sample_rate).tolist()
+    return counts
+
+def merge_monthly_counts(counts_shards):
+
+    # the lists of the shards are added element-wise
+    counts = {}
+    for name in COUNTERS:
+        counts[name] = [sum(values) for values in zip(*[counts_shard[name] for counts_shard in counts_shards])]
+    counts['num_articles'] = sum([counts_shard['num_articles'] for counts_shard in counts_shards])
+    if 'groups' in counts_shards[0]:
+        counts['groups'] = counts_shards[0]['groups']
+        for counts_shard in counts_shards[1:]:
+            counts['groups'].merge(counts_shard['groups'])
+    return counts
+
+def monthly_counts(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir=None, num_workers=1, decoder=None, group_by=None):
+
+    # if $cache_dir$ is given, the columnar cache of the input file (see dump_cache.py) is used instead of the JSON records
+    # otherwise the records are split among $num_workers$ processes ($file_input$ may also be a list of shard files, see reader.py)
+    # and decoded by $decoder$ ('msgspec', 'orjson', or 'json'; if None, the fastest available one, see records.py)
+    # if $group_by$ is given (see GROUPS), counts['groups'] holds the series per group in the same pass, as (groups, {counter: group x month array})
+    if cache_dir != None:
+        with instrumentation.stage('aggregation'):
+            counts = monthly_counts_cache(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir, group_by)
+        if group_by != None:
+            counts['groups'] = counts['groups'].to_arrays()
+        return counts
+
+    tasks = reader.shard_tasks(file_input, num_workers)
+    arguments = [[shard_file for shard_file, shard in tasks], [latest_month] * len(tasks), [max_months] * len(tasks),
+                 [diff_month_preprint_publisher_min] * len(tasks), [diff_month_preprint_publisher_max] * len(tasks), [shard for shard_file, shard in tasks], [decoder] * len(tasks), [group_by] * len(tasks)]
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            counts_shards = instrumentation.map_instrumented(executor, monthly_counts_json, *arguments)
+    else:
+        counts_shards = list(map(monthly_counts_json, *arguments))
+
+    counts = merge_monthly_counts(counts_shards)
+    if group_by != None:
+        counts['groups'] = counts['groups'].to_arrays()
+    return counts
+
+
+def month_bound(value):
+    # bound of the number of months from publication of preprint to publication of publisher version ('na' means no criteria)
+    return value if value == 'na' else int(value)
+
+
+def group_counts(counts, group):
+
+    # counts of one group of the grouped series (counts['groups'] returned by monthly_counts), as those of all articles
+    names, series = counts['groups']
+    k = names.index(group)
+    return dict({name: series[name][k].tolist() for name in COUNTERS}, num_articles=series['num_articles'][k])
+
+
+def group_figures(counts, metric, group_by, num_groups):
+
+    # variants of Figure 1 for the $num_groups$ largest groups of the grouped series
+    names, series = counts['groups']
+    largest = np.argsort(-series['num_articles'], kind='stable')[:num_groups]
+    return [time_figure(group_counts(counts, names[k]), metric, 'figure/time_articles_citations_' + group_by + '_' + re.sub('[^0-9A-Za-z-]+', '_', str(names[k])) + '.png')
+            for k in largest]
+
+
+def time_figure(counts, metric, filename='figure/time_articles_citations.png'):
+
+    # Figure 1 of the counts returned by monthly_counts (drawn by plotting.render)
+    num_citations_preprint = counts['num_citations_preprint']
+    num_citations_published = counts['num_citations_published']
+    num_citations_preprint_ln = counts['num_citations_preprint_ln']
+    num_citations_published_ln = counts['num_citations_published_ln']
+    num_articles_preprint = counts['num_articles_preprint']
+    num_articles_published = counts['num_articles_published']
+
+    # months without preprints or publisher versions (e.g., of small groups) are not drawn
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if metric == 'ln':
+            num_citations_preprint_final = (np.array(num_citations_preprint_ln, dtype=float) / np.array(num_articles_preprint)).tolist()
+            num_citations_published_final = (np.array(num_citations_published_ln, dtype=float) / np.array(num_articles_published)).tolist()
+        elif metric == 'arithmetic-mean':
+            num_citations_preprint_final = (np.array(num_citations_preprint, dtype=float) / np.array(num_articles_preprint)).tolist()
+            num_citations_published_final = (np.array(num_citations_published, dtype=float) / np.array(num_articles_published)).tolist()
+
+    return (plotting.time_figure, (filename, num_citations_preprint_final, num_citations_published_final, num_articles_preprint, num_articles_published))
+
+
+def citation_time(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, metric, cache_dir, num_workers, report_file,
+                  target_journal='all', group_by=None, num_groups=10):
+
+    pd.options.display.float_format = '{:,.2f}'.format
+
+    if report_file != None:
+        instrumentation.enable()
+
+    # Figure 1 of a target journal is drawn from the series grouped by journal
+    if target_journal != 'all':
+        if group_by != None and group_by != 'journal':
+            raise ValueError('target_journal requires group_by to be None or journal')
+        grouping = 'journal'
+    else:
+        grouping = group_by
+
+    counts = monthly_counts(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, cache_dir=cache_dir, num_workers=num_workers,
+                            group_by=grouping)
+    counts_figure = counts
+    if target_journal != 'all':
+        counts_figure = group_counts(counts, target_journal) if target_journal in counts['groups'][0] else dict({name: [0] * (max_months + 1) for name in COUNTERS}, num_articles=0)
+    print(int(round(counts_figure['num_articles'])))
+
+    #=========================#
+    # generate figures
+    #=========================#
+
+    figures = [time_figure(counts_figure, metric, 'figure/time_articles_citations.png' if target_journal == 'all' else 'figure/time_articles_citations_' + target_journal + '.png')]
+    if group_by != None:
+        figures += group_figures(counts, metric, group_by, num_groups)
+    with instrumentation.stage('plotting'):
+        plotting.render(figures, num_workers)
+
+    if report_file != None:
+        instrumentation.write_report(report_file, {'file_input': file_input, 'latest_month': latest_month, 'max_months': max_months, 'metric': metric,
+                                                   'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max,
+                                                   'target_journal': target_journal, 'group_by': group_by})
+
+    #=========================#
 
-ax1.set_xlim(-1.3925000000000003, 25.392500000000002)
-ax1.plot(l, num_citations_preprint_final, marker="x", markersize=2, linewidth=1, color='r', label='preprint')
-ax1.plot(l, num_citations_published_final, marker="o", markersize=2, linewidth=1, color='b', label='publisher version')
-ax1.tick_params(labelbottom=False, bottom=False)
-
-ax2.bar(l, num_articles_preprint, 0.35, color='r', label='preprint')
-ax2.bar(l, num_articles_published, 0.35, color='b', bottom=num_articles_preprint, label='publisher version')
-
-ax1.set_ylabel('number of citations\n(log-transformed\nafter addition of 1)')
-ax2.set_ylabel('number of articles')
-ax2.set_xlabel('months after preprint publication')
 
-ax1.legend()
-ax2.legend()
-fig.tight_layout()
-fig.savefig('figure/time_articles_citations.png', dpi=300)
+def main(argv=None):
+
+    # the settings above are the defaults of the command line options
+    parser = argparse.ArgumentParser(description='Figure 1: number of citations and articles per month since preprint publication')
+    parser.add_argument('--file-input', default=[file_input] if isinstance(file_input, str) else file_input, help='input file (or shard files)', nargs='+')
+    parser.add_argument('--latest-month', default=latest_month.strftime('%Y-%m'), help='latest month (YYYY-MM)')
+    parser.add_argument('--max-months', default=max_months, type=int, help='number of months for counting the number of citations after preprint publication')
+    parser.add_argument('--lag-min', default=diff_month_preprint_publisher_min, type=month_bound, help="minimum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+    parser.add_argument('--lag-max', default=diff_month_preprint_publisher_max, type=month_bound, help="maximum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+    parser.add_argument('--metric', default=metric, choices=['ln', 'arithmetic-mean'], help='metric of the number of citations')
+    parser.add_argument('--target-journal', default=target_journal, help="ISSNL of target journal ('all' for all journals)")
+    parser.add_argument('--group-by', default=group_by, choices=list(GROUPS.keys()), help='groups of the variants of Figure 1 per group')
+    parser.add_argument('--num-groups', default=num_groups, type=int, help='number of the largest groups whose variants of Figure 1 are drawn')
+    parser.add_argument('--cache-dir', default=cache_dir, help='directory of the columnar cache of the input file')
+    parser.add_argument('--no-cache', action='store_true', help='parse the JSON records instead of using the columnar cache')
+    parser.add_argument('--previous-cache', default=None, help='cache directory of the previous dump, from which the columnar cache of the input file is updated if it is not valid (see dump_cache.update_cache)')
+    parser.add_argument('--num-workers', default=num_workers, type=int, help='number of worker processes used when the JSON records are parsed')
+    parser.add_argument('--report-file', default=report_file, help='report of the time of each stage and the number of rejected records (see instrumentation.py)')
+    args = parser.parse_args(argv)
 
-#=========================#
+    # the columnar cache is built from a single dump, so shard files are parsed from their JSON records
+    if len(args.file_input) > 1 and not args.no_cache:
+        parser.error('several input files (shard files) require --no-cache')
+
+    # the columnar cache is updated from the cache of the previous dump if it is given
+    if args.no_cache == False:
+        dump_cache.prepare_cache(args.file_input[0], args.cache_dir, args.previous_cache)
+
+    citation_time(args.file_input[0] if len(args.file_input) == 1 else args.file_input, datetime.strptime(args.latest_month, '%Y-%m'), args.max_months, args.lag_min, args.lag_max, args.metric,
+                  None if args.no_cache else args.cache_dir, args.num_workers, args.report_file, args.target_journal, args.group_by, args.num_groups)
+
+
+if __name__ == '__main__':
+    main()
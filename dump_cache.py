@@ -0,0 +1,337 @@
+# -------------------------------------------
+#
+# columnar on-disk cache of the bioRxiv/OpenCitations dump
+#
+# -------------------------------------------
+
+# modules
+import json
+import os
+import sys
+import shutil
+import hashlib
+from functools import lru_cache
+from array import array
+import numpy as np
+import records
+import reader
+import record_index
+
+#=========================#
+# setting
+#=========================#
+
+CACHE_VERSION = 2
+
+# columns of each table
+# articles: one row per record of the input file
+# authors: one row per pair of an author and one of his/her affiliations (one row with num_affiliations = 0 for an author without affiliation)
+# citations: one row per citation in 'oc'
+# doi_hash and line_hash are hashes of the DOI of the preprint and of the whole line (used by update_cache)
+TABLES = {
+    'articles': ['month', 'published_doi', 'published_month', 'lag', 'journal', 'estimate', 'num_authors', 'num_citations', 'doi_hash', 'line_hash'],
+    'authors': ['article', 'author_index', 'author_order', 'corresp', 'num_affiliations', 'ror_name', 'ror_country'],
+    'citations': ['article', 'month', 'preprint'],
+}
+
+# string tables referred to by integer IDs
+STRINGS = ['journal', 'ror_name', 'ror_country']
+
+DTYPES = {
+    'published_doi': np.bool_,
+    'estimate': np.bool_,
+    'corresp': np.bool_,
+    'preprint': np.bool_,
+    'doi_hash': np.int64,
+    'line_hash': np.int64,
+}
+
+
+def cache_path(file_input, cache_dir='cache'):
+    # the directory is named after the input file and a short hash of its absolute path,
+    # so that dumps of the same name in different directories (e.g., a new monthly dump, see update_cache) have their own caches
+    name = os.path.basename(file_input)
+    for ext in ['.gz', '.jsonl']:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return os.path.join(cache_dir, name + '-' + hashlib.sha1(os.path.abspath(file_input).encode('utf-8')).hexdigest()[:10])
+
+
+def file_hash(file_input):
+    h = hashlib.sha1()
+    with open(file_input, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_valid(file_input, cache_dir='cache'):
+
+    # the cache is valid if it was built from a file with the same size and modification time
+    # if only the modification time differs (e.g., the file was copied), the content hash decides
+    try:
+        with open(os.path.join(cache_path(file_input, cache_dir), 'manifest.json')) as f:
+            manifest = json.load(f)
+    except:
+        return False
+
+    if manifest.get('version') != CACHE_VERSION:
+        return False
+
+    try:
+        stat = os.stat(file_input)
+    except OSError:
+        return False
+    if manifest['size'] != stat.st_size:
+        return False
+    if manifest['mtime'] == stat.st_mtime:
+        return True
+    if manifest['sha1'] != file_hash(file_input):
+        return False
+
+    manifest['mtime'] = stat.st_mtime
+    with open(os.path.join(cache_path(file_input, cache_dir), 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    return True
+
+
+def line_hash(line):
+    # 64-bit hash of a line (or of a DOI) of the input file
+    return int.from_bytes(hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def new_columns():
+    return {table: {column: array('q' if DTYPES.get(column) == np.int64 else 'i') for column in TABLES[table]} for table in TABLES}
+
+
+def append_record(columns, intern, article, json_obj, line):
+
+    # append the rows of a record (the $article$-th record of the cache) to the tables
+    articles = columns['articles']
+    authors_table = columns['authors']
+    citations_table = columns['citations']
+
+    biorxiv_month = records.month_ordinal(json_obj['month'])
+
+    # publication month of the publisher version (-1 if no valid publication month)
+    published_month = records.month_ordinal(json_obj.get('published_month'))
+    if published_month == None:
+        published_month = -1
+
+    authors = json_obj['author']['authors']
+
+    articles['month'].append(biorxiv_month)
+    articles['published_doi'].append(json_obj.get('published_doi', None) != None)
+    articles['published_month'].append(published_month)
+    articles['lag'].append(published_month - biorxiv_month if published_month != -1 else 0)
+    articles['journal'].append(intern('journal', json_obj.get('published_journalissnl', '')))
+    articles['estimate'].append(json_obj['author']['estimate'] == True)
+    articles['num_authors'].append(len(authors))
+    articles['num_citations'].append(len(json_obj['oc']))
+    articles['doi_hash'].append(line_hash(str(json_obj.get('doi', ''))))
+    articles['line_hash'].append(line_hash(line))
+
+    # author affiliation
+    for author_index, author in enumerate(authors):
+        affiliations = author['affiliations'] if len(author['affiliations']) > 0 else [None]
+        for a in affiliations:
+            authors_table['article'].append(article)
+            authors_table['author_index'].append(author_index)
+            authors_table['author_order'].append(author['author_order'])
+            authors_table['corresp'].append(author['corresp'] == True)
+            authors_table['num_affiliations'].append(len(author['affiliations']))
+            for field in ['ror_name', 'ror_country']:
+                try:
+                    authors_table[field].append(intern(field, a['ror'][field]))
+                except:
+                    authors_table[field].append(intern(field, 'unknown'))
+
+    # citations (month is -1 if no valid publication month of the citing entity)
+    citation_months, citation_preprint_flags = records.citation_arrays(json_obj['oc'])
+    citations_table['article'].extend([article] * len(citation_months))
+    citations_table['month'].extend(citation_months.tolist())
+    citations_table['preprint'].extend(citation_preprint_flags.tolist())
+
+
+def write_cache(file_input, columns, strings, cache_dir='cache'):
+
+    # write the tables into a temporary directory and replace the old cache at once
+    path = cache_path(file_input, cache_dir)
+    path_tmp = path + '.tmp'
+    shutil.rmtree(path_tmp, ignore_errors=True)
+    os.makedirs(path_tmp)
+
+    for table in TABLES:
+        for column in TABLES[table]:
+            np.save(os.path.join(path_tmp, table + '_' + column + '.npy'),
+                    np.asarray(columns[table][column], dtype=DTYPES.get(column, np.int32)))
+
+    with open(os.path.join(path_tmp, 'strings.json'), 'w') as f:
+        json.dump({name: list(strings[name].keys()) for name in STRINGS}, f)
+
+    stat = os.stat(file_input)
+    with open(os.path.join(path_tmp, 'manifest.json'), 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'file_input': file_input, 'size': stat.st_size,
+                   'mtime': stat.st_mtime, 'sha1': file_hash(file_input)}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(path_tmp, path)
+
+
+def build_cache(file_input, cache_dir='cache', decoder=None):
+
+    print('building cache of', file_input, flush=True)
+
+    columns = new_columns()
+    strings = {name: {} for name in STRINGS}
+
+    def intern(name, value):
+        return strings[name].setdefault(value, len(strings[name]))
+
+    decode = records.get_decoder(decoder)
+
+    for article, line in enumerate(reader.read_lines(file_input)):
+        append_record(columns, intern, article, decode(line), line)
+
+    write_cache(file_input, columns, strings, cache_dir)
+
+
+def update_cache(file_input, previous_cache, cache_dir='cache', decoder=None):
+
+    # build the cache of a new dump from the cache directory $previous_cache$ of the previous dump (see cache_path):
+    # only records that are new or changed (a line that is not in the previous dump) are decoded,
+    # and the rows of the unchanged records are copied from the previous cache
+    # the cache is identical to the one built by build_cache except for the order of the IDs of strings
+    # the previous dump itself is not needed, and it may have been overwritten by the new dump (then $previous_cache$ is the cache of $file_input$,
+    # which is replaced only after all its rows have been copied)
+    try:
+        with open(os.path.join(previous_cache, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except:
+        raise ValueError(previous_cache + ' is not a cache directory (see cache_path)')
+    if manifest.get('version') != CACHE_VERSION:
+        raise ValueError(previous_cache + ': cache of version ' + str(manifest.get('version')) + ' (expected ' + str(CACHE_VERSION) + ')')
+
+    print('updating cache of', manifest['file_input'], 'to', file_input, flush=True)
+
+    previous = {table: read_columns(previous_cache, table) for table in TABLES}
+    previous_rows = dict(zip(previous['articles']['line_hash'].tolist(), range(len(previous['articles']['line_hash']))))
+    previous_dois = set(previous['articles']['doi_hash'].tolist())
+
+    # the string tables of the previous cache are extended, so that the IDs in the copied rows stay valid
+    strings = {name: dict([(value, i) for i, value in enumerate(read_strings(previous_cache, name))]) for name in STRINGS}
+
+    def intern(name, value):
+        return strings[name].setdefault(value, len(strings[name]))
+
+    # rows of the new or changed records; $source$ is the row in the previous cache of each record (-1 if decoded)
+    columns = new_columns()
+    source = array('q')
+    decode = records.get_decoder(decoder)
+    num_changed = 0
+    for line in reader.read_lines(file_input):
+        row = previous_rows.get(line_hash(line))
+        if row != None:
+            source.append(row)
+            continue
+        source.append(-1)
+        json_obj = decode(line)
+        append_record(columns, intern, len(columns['articles']['month']), json_obj, line)
+        if columns['articles']['doi_hash'][-1] in previous_dois:
+            num_changed += 1
+
+    source = np.asarray(source, dtype=np.int64)
+    copied = source != -1
+    decoded = ~copied
+    num_records = len(source)
+    print('unchanged:', int(copied.sum()), 'changed:', num_changed, 'new:', int(decoded.sum()) - num_changed,
+          'removed:', len(previous['articles']['month']) - int(copied.sum()) - num_changed, flush=True)
+
+    # merge the copied and decoded rows in the order of the new dump
+    merged = {}
+    new = {table: {column: np.asarray(columns[table][column], dtype=DTYPES.get(column, np.int32)) for column in TABLES[table]} for table in TABLES}
+
+    merged['articles'] = {}
+    for column in TABLES['articles']:
+        merged['articles'][column] = np.empty(num_records, dtype=DTYPES.get(column, np.int32))
+        merged['articles'][column][copied] = previous['articles'][column][source[copied]]
+        merged['articles'][column][decoded] = new['articles'][column]
+
+    for table in ['authors', 'citations']:
+
+        # rows of each record in the previous, decoded, and merged tables
+        previous_indptr = np.concatenate([[0], np.cumsum(np.bincount(previous[table]['article'], minlength=len(previous['articles']['month'])))])
+        new_indptr = np.concatenate([[0], np.cumsum(np.bincount(new[table]['article'], minlength=int(decoded.sum())))])
+        counts = np.empty(num_records, dtype=np.int64)
+        counts[copied] = np.diff(previous_indptr)[source[copied]]
+        counts[decoded] = np.diff(new_indptr)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        positions_copied = record_index.range_positions(indptr, np.flatnonzero(copied))
+        positions_decoded = record_index.range_positions(indptr, np.flatnonzero(decoded))
+        positions_previous = record_index.range_positions(previous_indptr, source[copied])
+
+        merged[table] = {}
+        for column in TABLES[table]:
+            merged[table][column] = np.empty(indptr[-1], dtype=DTYPES.get(column, np.int32))
+            merged[table][column][positions_copied] = previous[table][column][positions_previous]
+            merged[table][column][positions_decoded] = new[table][column]
+        merged[table]['article'] = np.repeat(np.arange(num_records, dtype=np.int32), counts)
+
+    write_cache(file_input, merged, strings, cache_dir)
+
+
+def prepare_cache(file_input, cache_dir='cache', previous_cache=None, decoder=None):
+
+    # (re)build the cache if necessary, from the cache directory $previous_cache$ of the previous dump if it is given (see update_cache)
+    if cache_valid(file_input, cache_dir) == False:
+        if previous_cache != None:
+            update_cache(file_input, previous_cache, cache_dir, decoder)
+        else:
+            build_cache(file_input, cache_dir, decoder)
+
+
+def read_columns(path, table, columns=None):
+    # (memory-mapped) columns of a table in the cache directory $path$
+    if columns == None:
+        columns = TABLES[table]
+    return {column: np.load(os.path.join(path, table + '_' + column + '.npy'), mmap_mode='r') for column in columns}
+
+
+@lru_cache(maxsize=4)
+def parsed_strings(strings_file, size, mtime):
+    # string tables of a cache, parsed once per version of the file (the lists are shared, so they must not be modified)
+    with open(strings_file) as f:
+        return json.load(f)
+
+
+def read_strings(path, name):
+    strings_file = os.path.join(path, 'strings.json')
+    stat = os.stat(strings_file)
+    return parsed_strings(strings_file, stat.st_size, stat.st_mtime_ns)[name]
+
+
+def load_columns(file_input, table, columns=None, cache_dir='cache'):
+
+    # load (memory-mapped) columns of a table, (re)building the cache if necessary
+    if cache_valid(file_input, cache_dir) == False:
+        build_cache(file_input, cache_dir)
+
+    return read_columns(cache_path(file_input, cache_dir), table, columns)
+
+
+def load_strings(file_input, name, cache_dir='cache'):
+
+    if cache_valid(file_input, cache_dir) == False:
+        build_cache(file_input, cache_dir)
+
+    return read_strings(cache_path(file_input, cache_dir), name)
+
+
+if __name__ == '__main__':
+
+    # usage: python dump_cache.py <input file> [<cache directory of the previous dump>]
+    if len(sys.argv) > 2:
+        update_cache(sys.argv[1], sys.argv[2])
+    else:
+        build_cache(sys.argv[1])
@@ -0,0 +1,63 @@
+# -------------------------------------------
+#
+# all the figures (Lorenz curves, Figure 1, Figure 3, and Figure 4) drawn in parallel after the analyses
+#
+# -------------------------------------------
+
+# modules
+import argparse
+from datetime import datetime
+import citation_bias
+import citation_time
+import gini_time
+import plotting
+import instrumentation
+
+
+def figure_tasks(file_input, latest_month, max_months=24, cache_dir='cache', num_workers=1, result_dir='cache/results', metric='ln'):
+
+    # figures of all the analyses as a list for plotting.render
+    # the Gini coefficients are computed by citation_ineq_sweep (or read from the result cache in $result_dir$)
+    # and the Lorenz curves of cached results are drawn only if their figures do not exist
+    tasks = []
+    configs = citation_bias.paper_configs(latest_month, max_months)
+    citation_bias.citation_ineq_sweep(file_input, configs['institution_target_authors'] + configs['country_target_authors'] + configs['institution_all'] + configs['country_all'],
+                                      cache_dir=cache_dir, num_workers=num_workers, result_dir=result_dir, figures=tasks)
+
+    # Figure 3 and Figure 4
+    for level in gini_time.LEVELS.keys():
+        tasks.append(gini_time.gini_time_figure(file_input, latest_month, result_dir, level, max_months))
+
+    # Figure 1
+    counts = citation_time.monthly_counts(file_input, latest_month, max_months, 0, 'na', cache_dir=cache_dir, num_workers=num_workers)
+    tasks.append(citation_time.time_figure(counts, metric))
+
+    return tasks
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='all the figures, drawn in parallel after the analyses')
+    parser.add_argument('--file-input', default=['data/biorxiv_metadata-oc.jsonl.gz'], help='input file (or shard files)', nargs='+')
+    parser.add_argument('--latest-month', default='2021-06', help='latest month (YYYY-MM)')
+    parser.add_argument('--max-months', default=24, type=int, help='number of months for counting the number of citations after preprint publication')
+    parser.add_argument('--cache-dir', default='cache', help='directory of the columnar cache of the input file')
+    parser.add_argument('--no-cache', action='store_true', help='parse the JSON records instead of using the columnar cache')
+    parser.add_argument('--num-workers', default=1, type=int, help='number of worker processes parsing the JSON records and drawing the figures')
+    parser.add_argument('--result-dir', default='cache/results', help='directory of the cached results of citation_ineq')
+    parser.add_argument('--metric', default='ln', choices=['ln', 'arithmetic-mean'], help='metric of the number of citations of Figure 1')
+    args = parser.parse_args(argv)
+
+    # the columnar cache is built from a single dump, so shard files are parsed from their JSON records
+    if len(args.file_input) > 1 and not args.no_cache:
+        parser.error('several input files (shard files) require --no-cache')
+
+    tasks = figure_tasks(args.file_input[0] if len(args.file_input) == 1 else args.file_input, datetime.strptime(args.latest_month, '%Y-%m'), args.max_months,
+                         None if args.no_cache else args.cache_dir, args.num_workers, args.result_dir, args.metric)
+    with instrumentation.stage('plotting'):
+        plotting.render(tasks, args.num_workers)
+    print(len(tasks), 'figures')
+
+
+if __name__ == '__main__':
+    main()
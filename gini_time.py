@@ -10,7 +10,6 @@ import os
 import traceback
 import gzip
 from datetime import datetime
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 from statistics import mean
@@ -18,61 +17,54 @@ import math
 from operator import truediv
 
 
-df = pd.read_csv('result/gini_institution_all_3.tsv', sep='\t', names=('months', 'gini_preprint', 'gini_publisher', 'num_articles', 'num_affiliations'))
-# df = pd.read_csv('result/gini_country_all_5.tsv', sep='\t', names=('months', 'gini_preprint', 'gini_publisher', 'num_articles', 'num_affiliations'))
+import citation_bias
+import result_cache
+import plotting
+import argparse
 
-fig = plt.figure()
-fig.set_size_inches(5, 5.5)
+# input file and latest month of citation_bias.py
+file_input = 'data/biorxiv_metadata-oc.jsonl.gz'
+latest_month = datetime.strptime('2021-06', '%Y-%m')
 
-ax1 = fig.add_subplot(3, 1, 1)
-ax2 = fig.add_subplot(3, 1, 2)
-ax3 = fig.add_subplot(3, 1, 3)
+# directory of the results cached by citation_bias.py
+result_dir = 'cache/results'
 
-major_ticks = np.arange(0, 21, 5)
-minor_ticks = np.arange(0, 21, 1)
+# configurations of Section 3.3 and the TSV file written by citation_bias.py for each affiliation level (Figure 3 and Figure 4)
+LEVELS = {'institution': ('institution_all', 'gini_institution_all_3'), 'country': ('country_all', 'gini_country_all_5')}
 
-ax1.set_xticks(major_ticks)
-ax1.set_xticks(minor_ticks, minor=True)
 
-ax1.grid(which='major', alpha=0.5)
-ax1.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
-ax1.grid(which='minor', axis='y', alpha=0.2, linestyle=':')
+def gini_table(file_input, latest_month, result_dir, level='institution', max_months=24):
 
-ax2.set_axisbelow(True)
-ax2.set_xticks(major_ticks)
-ax2.set_xticks(minor_ticks, minor=True)
-ax2.grid(which='major', axis='x', alpha=0.5)
-ax2.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
-ax2.grid(which='major', axis='y', alpha=0.5)
+    configs_name, name = LEVELS[level]
 
-ax3.set_axisbelow(True)
-ax3.set_xticks(major_ticks)
-ax3.set_xticks(minor_ticks, minor=True)
-ax3.grid(which='major', axis='x', alpha=0.5)
-ax3.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
-ax3.grid(which='major', axis='y', alpha=0.5)
+    # results of Section 3.3 are read from the result cache if all of them are cached, otherwise from the TSV file written by citation_bias.py
+    configs = citation_bias.paper_configs(latest_month, max_months)[configs_name]
+    cached = [result_cache.load_result(file_input, config, result_dir) for config in configs] if result_dir != None else [None]
+    if None not in cached:
+        return pd.DataFrame([[config['diff_month_preprint_publisher_min']] + list(c['result'][:4]) for config, c in zip(configs, cached)],
+                            columns=('months', 'gini_preprint', 'gini_publisher', 'num_articles', 'num_affiliations'))
+    return pd.read_csv('result/' + name + '.tsv', sep='\t', names=('months', 'gini_preprint', 'gini_publisher', 'num_articles', 'num_affiliations'))
 
-ax1.plot(df['months'][0:19], df['gini_preprint'][0:19], marker="x", markersize=2, linewidth=1, color='r', label='preprint')
-ax1.plot(df['months'][0:19], df['gini_publisher'][0:19], marker="o", markersize=2, linewidth=1, color='b', label='publisher version')
-ax1.set_xlim(-1.1000, 19.202499999999997)
-ax1.tick_params(labelbottom=False, bottom=False)
 
-ax2.set_xticks(major_ticks)
-ax2.set_xticks(minor_ticks, minor=True)
-ax2.bar(df['months'][0:19], df['num_articles'][0:19], 0.25, color='green', label='number of articles')
-ax2.tick_params(labelbottom=False, bottom=False)
+def gini_time_figure(file_input, latest_month, result_dir, level='institution', max_months=24):
+    # figure of $level$ (drawn by plotting.render)
+    return (plotting.gini_time_figure, ('figure/' + LEVELS[level][1] + '.png', gini_table(file_input, latest_month, result_dir, level, max_months)))
 
-ax3.set_xticks(major_ticks)
-ax3.set_xticks(minor_ticks, minor=True)
-ax3.bar(df['months'][0:19], df['num_affiliations'][0:19], 0.25, color='gray', label='number of affiliations')
 
-ax1.set_ylabel('Gini coefficient')
-ax2.set_ylabel('number of articles')
-ax3.set_ylabel('number of affiliations')
-ax3.set_xlabel('months from publication of a preprint to its publisher version')
+def main(argv=None):
 
-ax1.legend()
-fig.tight_layout()
+    parser = argparse.ArgumentParser(description='Figure 3 (institutions) and Figure 4 (countries): Gini coefficients by the number of months from publication of a preprint to its publisher version')
+    parser.add_argument('--file-input', default=[file_input], help='input file (or shard files) of citation_bias.py', nargs='+')
+    parser.add_argument('--latest-month', default=latest_month.strftime('%Y-%m'), help='latest month (YYYY-MM) of citation_bias.py')
+    parser.add_argument('--max-months', default=24, type=int, help='number of months for counting the number of citations after preprint publication of citation_bias.py')
+    parser.add_argument('--result-dir', default=result_dir, help='directory of the results cached by citation_bias.py')
+    parser.add_argument('--levels', default=list(LEVELS.keys()), choices=list(LEVELS.keys()), nargs='+', help='affiliation levels')
+    parser.add_argument('--num-workers', default=1, type=int, help='number of worker processes drawing the figures')
+    args = parser.parse_args(argv)
 
-fig.savefig('figure/gini_institution_all_3.png', dpi=300)
-# fig.savefig('figure/gini_country_all_5.png', dpi=300)
+    plotting.render([gini_time_figure(args.file_input[0] if len(args.file_input) == 1 else args.file_input, datetime.strptime(args.latest_month, '%Y-%m'), args.result_dir, level, args.max_months)
+                     for level in args.levels], args.num_workers)
+
+
+if __name__ == '__main__':
+    main()
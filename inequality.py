@@ -0,0 +1,156 @@
+# -------------------------------------------
+#
+# Lorenz curve, Gini coefficient, and other inequality measures
+#
+# -------------------------------------------
+
+# modules
+import numpy as np
+import pandas as pd
+
+#=========================#
+# setting
+#=========================#
+
+# inequality aversion parameters of the Atkinson index
+EPSILONS = [0.5, 1, 2]
+
+# population shares of the top share (e.g., 0.1 is the share of the richest 10%)
+TOP_SHARES = [0.01, 0.1]
+
+
+def lorenz(x, weights=None):
+
+    # cumulative population and cumulative amount of x (sorted in ascending order), both starting from 0
+    # if $weights$ is given, each value of x counts $weights$ times (e.g., the number of articles of an affiliation)
+    x = np.asarray(x, dtype=float)
+    order = np.argsort(x, kind='stable')
+    if weights is None:
+        population = np.arange(len(x) + 1, dtype=float)
+        amount = np.concatenate([[0], np.cumsum(x[order])])
+    else:
+        weights = np.asarray(weights, dtype=float)
+        population = np.concatenate([[0], np.cumsum(weights[order])])
+        amount = np.concatenate([[0], np.cumsum(x[order] * weights[order])])
+    return population, amount
+
+
+def gini_lorenz(population, amount):
+
+    # Gini coefficient as one minus twice the area under the Lorenz curve
+    # (identical to half the relative mean absolute difference over all pairs including self-pairs)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        area = np.sum(np.diff(population) * (amount[1:] + amount[:-1])) / (2 * population[-1] * amount[-1])
+    return 1 - 2 * area
+
+
+def gini(x, weights=None):
+    # O(n log n) replacement for the mean absolute difference of np.subtract.outer(x, x)
+    return gini_lorenz(*lorenz(x, weights))
+
+
+def gini_rows(x, weights=None):
+
+    # Gini coefficient of each row of a 2-D array x
+    # values with weight 0 (or NaN values) do not count, so rows may hold different subsets of the same columns
+    x = np.asarray(x, dtype=float)
+    if weights is None:
+        weights = np.ones(x.shape)
+    weights = np.where(np.isnan(x), 0, np.asarray(weights, dtype=float))
+    x = np.where(weights > 0, x, np.inf)
+    order = np.argsort(x, axis=1, kind='stable')
+    x = np.take_along_axis(x, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    x = np.where(weights > 0, x, 0)
+    population = np.cumsum(weights, axis=1)
+    amount = np.cumsum(x * weights, axis=1)
+    amount_previous = amount - x * weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        area = np.sum(weights * (amount_previous + amount), axis=1) / (2 * population[:, -1] * amount[:, -1])
+    return 1 - 2 * area
+
+
+def pad_rows(vectors):
+    # stack vectors of different lengths into a 2-D array (padded with NaN, which does not count in inequality_measures)
+    x = np.full((len(vectors), max([len(vector) for vector in vectors] + [0])), np.nan)
+    for i, vector in enumerate(vectors):
+        x[i, :len(vector)] = vector
+    return x
+
+
+def lorenz_at(population, amount, share):
+    # value of each row of a Lorenz curve (cumulative shares starting from 0) at the population share $share$ (linear interpolation)
+    k = np.clip(np.sum(population < share, axis=1), 1, population.shape[1] - 1)
+    rows = np.arange(len(population))
+    population_0, population_1 = population[rows, k - 1], population[rows, k]
+    amount_0, amount_1 = amount[rows, k - 1], amount[rows, k]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(population_1 > population_0, amount_0 + (amount_1 - amount_0) * (share - population_0) / (population_1 - population_0), amount_1)
+
+
+def inequality_measures(x, weights=None, epsilons=EPSILONS, top_shares=TOP_SHARES):
+
+    # inequality measures of each row of x (a 1-D array is one row), from one sort and one cumulative sum per row:
+    # Gini coefficient, Theil T and Theil L (mean log deviation) indexes, Atkinson indexes for $epsilons$, Hoover index,
+    # Palma ratio (share of the top 10% / share of the bottom 40%), and top shares for $top_shares$
+    # values with weight 0 (or NaN values) do not count, as in gini_rows
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    if weights is None:
+        weights = np.ones(x.shape)
+    weights = np.where(np.isnan(x), 0, np.atleast_2d(np.asarray(weights, dtype=float)))
+    x = np.where(weights > 0, x, np.inf)
+    order = np.argsort(x, axis=1, kind='stable')
+    x = np.take_along_axis(x, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    x = np.where(weights > 0, x, 0)
+
+    # Lorenz curve as shares of population and amount, both starting from 0
+    zeros = np.zeros((len(x), 1))
+    population = np.concatenate([zeros, np.cumsum(weights, axis=1)], axis=1)
+    amount = np.concatenate([zeros, np.cumsum(x * weights, axis=1)], axis=1)
+    valid = (population[:, -1] > 0) & (amount[:, -1] > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        population = population / population[:, -1:]
+        amount = amount / amount[:, -1:]
+
+    # shares of population and relative values (x / mean) of the values
+    shares = np.diff(population, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative = x / np.sum(shares * x, axis=1, keepdims=True)
+    counted = shares > 0
+
+    measures = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        measures['gini'] = 1 - np.sum(shares * (amount[:, :-1] + amount[:, 1:]), axis=1)
+        measures['theil_t'] = np.sum(np.where(counted & (relative > 0), shares * relative * np.log(np.where(relative > 0, relative, 1)), 0), axis=1)
+        measures['theil_l'] = np.sum(np.where(counted, -shares * np.log(np.where(counted, relative, 1)), 0), axis=1)
+        for epsilon in epsilons:
+            if epsilon == 1:
+                measures['atkinson_' + str(epsilon)] = 1 - np.exp(np.sum(np.where(counted, shares * np.log(np.where(counted, relative, 1)), 0), axis=1))
+            else:
+                measures['atkinson_' + str(epsilon)] = 1 - np.sum(np.where(counted, shares * np.where(counted, relative, 1) ** (1 - epsilon), 0), axis=1) ** (1 / (1 - epsilon))
+        measures['hoover'] = np.max(population - amount, axis=1)
+        measures['palma'] = (1 - lorenz_at(population, amount, 0.9)) / lorenz_at(population, amount, 0.4)
+        for top_share in top_shares:
+            measures['top_' + str(top_share)] = 1 - lorenz_at(population, amount, 1 - top_share)
+
+    # rows without any positive value have no measures
+    return {name: np.where(valid, values, np.nan) for name, values in measures.items()}
+
+
+def inequality_table(vectors, weights=None, labels=None, epsilons=EPSILONS, top_shares=TOP_SHARES):
+
+    # table of the inequality measures (columns) of each vector (rows)
+    # $vectors$ is a list of 1-D arrays (e.g., metrics of affiliations in a sweep) or a 2-D array, and $weights$ the same shape or None
+    # $labels$ is a list of dictionaries whose items are added as columns (e.g., the parameters of each configuration)
+    if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+        x = vectors
+    else:
+        x = pad_rows(vectors)
+    if weights is not None and not (isinstance(weights, np.ndarray) and weights.ndim == 2):
+        weights = pad_rows(weights)
+    table = pd.DataFrame(inequality_measures(x, weights, epsilons, top_shares))
+    table.insert(0, 'n', np.sum(~np.isnan(x) & (weights > 0 if weights is not None else True), axis=1))
+    if labels != None:
+        table = pd.concat([pd.DataFrame(labels), table], axis=1)
+    return table
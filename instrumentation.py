@@ -0,0 +1,120 @@
+# -------------------------------------------
+#
+# opt-in timers of stages and counters of rejected records
+#
+# -------------------------------------------
+
+# modules
+import os
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+from datetime import datetime
+
+#=========================#
+# setting
+#=========================#
+
+# nothing is recorded unless enable() is called (the instrumented code checks this flag before recording)
+enabled = False
+
+# wall time (in seconds) of each stage
+stages = {}
+
+# counters of each scope ('records' for the record-level filters, 'config <k>' for the filters of the k-th configuration)
+counters = {}
+
+start_time = None
+
+
+def reset():
+    global start_time
+    stages.clear()
+    counters.clear()
+    start_time = time.perf_counter()
+
+
+def enable():
+    global enabled
+    enabled = True
+    reset()
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def add_time(name, seconds):
+    stages[name] = stages.get(name, 0) + seconds
+
+
+def count(reason, n=1, scope='records'):
+    scope_counters = counters.setdefault(scope, {})
+    scope_counters[reason] = scope_counters.get(reason, 0) + n
+
+
+@contextmanager
+def stage(name):
+    if enabled == False:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+def snapshot():
+    return {'stages': dict(stages), 'counters': {scope: dict(scope_counters) for scope, scope_counters in counters.items()}}
+
+
+def merge(other):
+    # add the timers and counters of a snapshot (e.g., of a worker process)
+    for name, seconds in other['stages'].items():
+        add_time(name, seconds)
+    for scope, scope_counters in other['counters'].items():
+        for reason, n in scope_counters.items():
+            count(reason, n, scope)
+
+
+def run(function, *arguments):
+    # run $function$ with instrumentation in a worker process and return its result with the snapshot of the worker
+    enable()
+    result = function(*arguments)
+    return result, snapshot()
+
+
+def map_instrumented(executor, function, *arguments):
+    # executor.map that merges the timers and counters of the workers when instrumentation is enabled
+    if enabled == False:
+        return list(executor.map(function, *arguments))
+    results = []
+    for result, worker_snapshot in executor.map(run, *([[function] * len(arguments[0])] + list(arguments))):
+        merge(worker_snapshot)
+        results.append(result)
+    return results
+
+
+def peak_rss():
+    # peak resident set size of this process and of its finished worker processes in MB (ru_maxrss is in KB on Linux and in bytes on macOS)
+    unit = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit}
+
+
+def write_report(report_file, parameters=None):
+
+    # machine-readable report of the run (JSON)
+    wall_time = time.perf_counter() - start_time
+    num_records = counters.get('records', {}).get('read', 0)
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'argv': sys.argv, 'wall_time': wall_time,
+              'records': num_records, 'records_per_second': num_records / wall_time if wall_time > 0 else None,
+              'peak_rss_mb': peak_rss(), 'stages': stages, 'counters': counters, 'parameters': parameters}
+
+    if os.path.dirname(report_file) != '':
+        os.makedirs(os.path.dirname(report_file), exist_ok=True)
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=1, default=str)
@@ -0,0 +1,233 @@
+# -------------------------------------------
+#
+# partial-state files of the analyses of one shard of the input file, and their merge
+#
+# -------------------------------------------
+
+# modules
+import os
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import citation_bias
+import citation_time
+import instrumentation
+import plotting
+import dump_cache
+from accumulator import AffiliationAccumulator
+
+#=========================#
+# setting
+#=========================#
+
+# version of the partial-state files (states of other versions are rejected when merged)
+# version 3 records the identity (size and content hash) of the input file and the shard of each state
+PARTIAL_STATE_VERSION = 3
+
+# kinds of the partial states
+# affiliations: totals of each affiliation per configuration of citation_bias.py (with the interned affiliations)
+# monthly_counts: counters per month since preprint publication of citation_time.py
+KINDS = ['affiliations', 'monthly_counts']
+
+
+def input_identity(file_input):
+    # the input file is identified by its size and content hash (see dump_cache.file_hash), so that copies of it on other machines (with other paths and modification times) are the same input
+    return [os.path.getsize(file_input), dump_cache.file_hash(file_input)]
+
+
+def write_state(state_file, kind, parameters, arrays, counters, file_input, shard):
+
+    # one compressed NumPy archive: the metadata (JSON) and the arrays of the state
+    meta = {'version': PARTIAL_STATE_VERSION, 'kind': kind, 'parameters': parameters, 'counters': counters,
+            'input': input_identity(file_input), 'shard': list(shard) if shard != None else None,
+            'created': datetime.now().isoformat(timespec='seconds')}
+    if os.path.dirname(state_file) != '':
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    with open(state_file + '.tmp', 'wb') as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta, default=str)), **arrays)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def read_state(state_file):
+
+    with np.load(state_file, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        arrays = {name: data[name] for name in data.files if name != 'meta'}
+    if meta['version'] != PARTIAL_STATE_VERSION:
+        raise ValueError(state_file + ': partial state of version ' + str(meta['version']) + ' (expected ' + str(PARTIAL_STATE_VERSION) + ')')
+    return meta, arrays
+
+
+def affiliation_state(state_file, file_input, configs, shard=None, decoder=None):
+
+    # partial state of citation_bias.citation_ineq_sweep over one shard ($shard$ = (k, n), or a pre-split shard file, see reader.py)
+    configs = [citation_bias.config_defaults(config) for config in configs]
+    ror_fields = ['ror_name' if config['affiliation_level'] == 'institution' else 'ror_country' for config in configs]
+
+    # the numbers of rejected records are recorded with the state
+    instrumentation.enable()
+    accumulators = citation_bias.affiliation_citations_json(file_input, configs, ror_fields, shard, decoder)
+
+    arrays = {}
+    for k, accumulator in enumerate(accumulators):
+        names, totals = accumulator.to_arrays()
+        # affiliations are kept as JSON, since they may be None
+        arrays['names_' + str(k)] = np.array(json.dumps(names))
+        arrays['totals_' + str(k)] = totals
+    parameters = {'configs': [dict(config, latest_month=config['latest_month'].strftime('%Y-%m')) for config in configs]}
+    write_state(state_file, 'affiliations', parameters, arrays, instrumentation.snapshot()['counters'], file_input, shard)
+
+
+def monthly_counts_state(state_file, file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, shard=None, decoder=None):
+
+    # partial state of citation_time.monthly_counts over one shard
+    instrumentation.enable()
+    counts = citation_time.monthly_counts_json(file_input, latest_month, max_months, diff_month_preprint_publisher_min, diff_month_preprint_publisher_max, shard, decoder)
+
+    arrays = {name: np.asarray(counts[name]) for name in citation_time.COUNTERS + ['num_articles']}
+    parameters = {'latest_month': latest_month.strftime('%Y-%m'), 'max_months': max_months,
+                  'diff_month_preprint_publisher_min': diff_month_preprint_publisher_min, 'diff_month_preprint_publisher_max': diff_month_preprint_publisher_max}
+    write_state(state_file, 'monthly_counts', parameters, arrays, instrumentation.snapshot()['counters'], file_input, shard)
+
+
+def check_shards(state_files, metas):
+
+    # every record must be counted exactly once in the merge
+    # states of shards (k, n) of one input file must have the same input file and n, and cover k = 0, ..., n-1 once each;
+    # states of whole files (e.g., pre-split shard files, see reader.split_dump) must have different input files
+    shards = [meta['shard'] for meta in metas]
+    if None in shards:
+        if shards.count(None) != len(shards):
+            raise ValueError('partial states of shards (k, n) cannot be merged with partial states of whole input files')
+        seen = {}
+        for state_file, meta in zip(state_files, metas):
+            if tuple(meta['input']) in seen:
+                raise ValueError(state_file + ': partial state of the same input file as ' + seen[tuple(meta['input'])])
+            seen[tuple(meta['input'])] = state_file
+        return
+
+    for state_file, meta in zip(state_files, metas):
+        if meta['input'] != metas[0]['input']:
+            raise ValueError(state_file + ': partial state of another input file (other size or content) than ' + state_files[0])
+        if meta['shard'][1] != shards[0][1]:
+            raise ValueError(state_file + ': partial state of shard ' + str(meta['shard']) + ', but ' + state_files[0] + ' is of one of ' + str(shards[0][1]) + ' shards')
+    seen = {}
+    for state_file, (k, n) in zip(state_files, shards):
+        if k in seen:
+            raise ValueError(state_file + ': partial state of the same shard ' + str([k, n]) + ' as ' + seen[k])
+        seen[k] = state_file
+    missing = [k for k in range(shards[0][1]) if k not in seen]
+    if len(missing) > 0:
+        raise ValueError('partial states of shards ' + str(missing) + ' of ' + str(shards[0][1]) + ' are missing')
+
+
+def merge_states(state_files):
+
+    # (kind, parameters, merged state, counters) of partial states of the same kind and parameters
+    # the merged state is a list of AffiliationAccumulator (one per configuration) or the counts of citation_time.monthly_counts
+    states = [read_state(state_file) for state_file in state_files]
+    kind = states[0][0]['kind']
+    parameters = states[0][0]['parameters']
+    for state_file, (meta, arrays) in zip(state_files, states):
+        if meta['kind'] != kind or json.dumps(meta['parameters'], sort_keys=True) != json.dumps(parameters, sort_keys=True):
+            raise ValueError(state_file + ': partial state of other kind or parameters than ' + state_files[0])
+    check_shards(state_files, [meta for meta, arrays in states])
+
+    counters = {}
+    for meta, arrays in states:
+        for scope, scope_counters in meta['counters'].items():
+            for reason, n in scope_counters.items():
+                counters.setdefault(scope, {})[reason] = counters.get(scope, {}).get(reason, 0) + n
+
+    if kind == 'affiliations':
+        merged = []
+        for k in range(len(parameters['configs'])):
+            accumulators = [AffiliationAccumulator.from_arrays(json.loads(str(arrays['names_' + str(k)])), arrays['totals_' + str(k)]) for meta, arrays in states]
+            for accumulator in accumulators[1:]:
+                accumulators[0].merge(accumulator)
+            merged.append(accumulators[0])
+    elif kind == 'monthly_counts':
+        merged = citation_time.merge_monthly_counts([{name: (arrays[name].tolist() if name != 'num_articles' else int(arrays[name])) for name in citation_time.COUNTERS + ['num_articles']}
+                                                     for meta, arrays in states])
+
+    return kind, parameters, merged, counters
+
+
+def merge(state_files, output_file=None, fig=True, num_workers=1, metric='ln'):
+
+    # merge partial states and compute the Gini coefficients (and Lorenz curves) or the series of Figure 1 from them
+    # the results are the same as those of a single run over the whole input file ($metric$ is that of Figure 1, see citation_time.py)
+    kind, parameters, merged, counters = merge_states(state_files)
+    figures = []
+
+    if kind == 'affiliations':
+        rows = []
+        for config, accumulator in zip(parameters['configs'], merged):
+            config = dict(config, latest_month=datetime.strptime(config['latest_month'], '%Y-%m'), fig=config['fig'] and fig)
+            citations_affiliations = citation_bias.affiliation_metrics(accumulator.to_frame(), config['num_articles_min'], config['unknown_excluded'], config['metric'])
+            result = citation_bias.affiliation_ineq(citations_affiliations, **citation_bias.ineq_parameters(config), figures=figures)
+            rows.append(dict({name: value for name, value in config.items() if name != 'fig' and name not in citation_bias.TEST_PARAMETERS},
+                             gini_preprint=result[0], gini_publisher=result[1], num_articles=result[2], num_affiliations=result[3]))
+        table = pd.DataFrame(rows)
+    elif kind == 'monthly_counts':
+        table = pd.DataFrame({name: merged[name] for name in citation_time.COUNTERS})
+        table.index.name = 'month'
+        print(merged['num_articles'])
+        if fig == True:
+            figures.append(citation_time.time_figure(merged, metric))
+
+    with instrumentation.stage('plotting'):
+        plotting.render(figures, num_workers)
+
+    if output_file != None:
+        table.to_csv(output_file, sep='\t')
+    return table, counters
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='partial-state files of the analyses of one shard of the input file, and their merge')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for command in ['bias', 'time']:
+        subparser = commands.add_parser(command, help='write the partial state of ' + ('citation_bias.py' if command == 'bias' else 'citation_time.py') + ' for one shard')
+        subparser.add_argument('state_file', help='partial-state file (.npz)')
+        subparser.add_argument('--file-input', default='data/biorxiv_metadata-oc.jsonl.gz', help='input file (or one pre-split shard file)')
+        subparser.add_argument('--shard', default=None, type=int, nargs=2, metavar=('K', 'N'), help='read every N-th line starting from the K-th line')
+        subparser.add_argument('--latest-month', default='2021-06', help='latest month (YYYY-MM)')
+        subparser.add_argument('--max-months', default=24, type=int, help='number of months for counting the number of citations after preprint publication')
+        subparser.add_argument('--decoder', default=None, help="JSON decoder ('msgspec', 'orjson', or 'json')")
+        if command == 'bias':
+            subparser.add_argument('--sections', default=list(citation_bias.SECTIONS.keys()), choices=list(citation_bias.SECTIONS.keys()), nargs='+', help='sections of citation_bias.py')
+        else:
+            subparser.add_argument('--lag-min', default=0, type=citation_time.month_bound, help="minimum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+            subparser.add_argument('--lag-max', default='na', type=citation_time.month_bound, help="maximum number of months from publication of preprint to publication of publisher version ('na' for no criteria)")
+
+    subparser = commands.add_parser('merge', help='merge partial states and compute the results')
+    subparser.add_argument('state_files', help='partial-state files (of the same kind and parameters)', nargs='+')
+    subparser.add_argument('--output', default=None, help='TSV file of the results')
+    subparser.add_argument('--no-figures', action='store_true', help='do not draw the Lorenz curves or Figure 1')
+    subparser.add_argument('--num-workers', default=1, type=int, help='number of worker processes drawing the figures')
+    subparser.add_argument('--metric', default='ln', choices=['ln', 'arithmetic-mean'], help='metric of the number of citations of Figure 1')
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        table, counters = merge(args.state_files, args.output, args.no_figures == False, args.num_workers, args.metric)
+        print(table.to_string())
+        print(json.dumps(counters))
+        return
+
+    latest_month = datetime.strptime(args.latest_month, '%Y-%m')
+    shard = tuple(args.shard) if args.shard != None else None
+    if args.command == 'bias':
+        configs = citation_bias.paper_configs(latest_month, args.max_months)
+        configs = [config for section in args.sections for name in citation_bias.SECTIONS[section] for config in configs[name]]
+        affiliation_state(args.state_file, args.file_input, configs, shard, args.decoder)
+    else:
+        monthly_counts_state(args.state_file, args.file_input, latest_month, args.max_months, args.lag_min, args.lag_max, shard, args.decoder)
+
+
+if __name__ == '__main__':
+    main()
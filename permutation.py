@@ -0,0 +1,107 @@
+# -------------------------------------------
+#
+# permutation test for the difference between the Gini coefficients of preprints and publisher versions
+#
+# -------------------------------------------
+
+# modules
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from inequality import gini_rows
+from accumulator import NUM_ARTICLES_TOLERANCE
+
+#=========================#
+# setting
+#=========================#
+
+# maximum size (in bytes) of the permutation x entry arrays of one chunk of permutations
+CHUNK_BYTES = 1 << 28
+
+# maximum number of permutations in one chunk (the test may stop after every chunk)
+CHUNK_PERMUTATIONS = 200
+
+# the test stops when the p-value is farther than $STOP_Z$ standard errors from the significance level
+STOP_Z = 3.29
+
+
+def metric_values(metric, vectors):
+    # per-article values that are summed up per affiliation for $metric$
+    if metric == 'ln':
+        return vectors['preprint_ln'], vectors['published_ln']
+    return vectors['preprint'].astype(float), vectors['published'].astype(float)
+
+
+def gini_gaps(preprint, published, num_articles_affiliations, selected, metric, weighted):
+
+    # absolute differences between the Gini coefficients of the preprints and of the publisher versions (one per row)
+    if metric == 'ln' or metric == 'arithmetic-mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            preprint = preprint / num_articles_affiliations
+            published = published / num_articles_affiliations
+    weights = np.where(selected, num_articles_affiliations if weighted == True else 1, 0)
+    return np.abs(gini_rows(preprint, weights) - gini_rows(published, weights))
+
+
+def permutation_chunk(seed, num_permutations, entry_rows, entry_columns, entry_weights, differences, totals, selected, metric, weighted, observed):
+
+    # number of permutations whose gap is at least the observed gap
+    # in each permutation, the preprint and publisher counts of every article are swapped with probability 1/2
+    rng = np.random.default_rng(seed)
+    swaps = rng.integers(0, 2, size=(num_permutations, len(differences)), dtype=np.int8)
+
+    # a swapped article moves (publisher - preprint) of its weight from the publisher versions to the preprints of its affiliations
+    num_columns = len(selected)
+    keys = (np.arange(num_permutations)[:, None] * num_columns + entry_columns[None, :]).ravel()
+    moved = np.bincount(keys, weights=(swaps[:, entry_rows] * (entry_weights * differences[entry_rows])[None, :]).ravel(),
+                        minlength=num_permutations * num_columns).reshape(num_permutations, num_columns)
+
+    gaps = gini_gaps(totals['preprint'][None, :] + moved, totals['published'][None, :] - moved, totals['num_articles'][None, :], selected[None, :], metric, weighted)
+    return int(np.sum(gaps >= observed - 1e-12))
+
+
+def permutation_test(entry_rows, entry_columns, entry_weights, vectors, num_articles, num_columns, included, num_articles_min, metric, weighted=False,
+                     num_permutations=10000, seed=0, alpha=0.05, num_workers=1, chunk_bytes=CHUNK_BYTES):
+
+    # p-value of the paired permutation test of |gini_preprint - gini_publisher| (and the number of permutations used)
+    # the articles are given as in bootstrap.bootstrap_gini; affiliations are filtered as in affiliation_metrics
+    # (the number of articles of an affiliation does not change by swapping, so the same affiliations are kept in all permutations)
+    # the permutations are processed in chunks, and the test stops early once the p-value is clearly above or below $alpha$
+    # every chunk has its own seed derived from $seed$ and the stopping rule is checked chunk by chunk, so the result does not depend on $num_workers$
+    if num_articles == 0 or num_permutations == 0:
+        return np.nan, 0
+
+    preprint, published = metric_values(metric, vectors)
+    totals = {'num_articles': np.bincount(entry_columns, weights=entry_weights, minlength=num_columns),
+              'preprint': np.bincount(entry_columns, weights=entry_weights * preprint[entry_rows], minlength=num_columns),
+              'published': np.bincount(entry_columns, weights=entry_weights * published[entry_rows], minlength=num_columns)}
+    selected = included & (totals['num_articles'] > 0) & (totals['num_articles'] >= num_articles_min - NUM_ARTICLES_TOLERANCE)
+    observed = gini_gaps(totals['preprint'][None, :], totals['published'][None, :], totals['num_articles'][None, :], selected[None, :], metric, weighted)[0]
+    if np.isnan(observed):
+        return np.nan, 0
+
+    chunk_size = int(max(1, min(CHUNK_PERMUTATIONS, num_permutations, chunk_bytes // (8 * max(len(entry_rows), num_columns) * 3))))
+    chunk_sizes = [min(chunk_size, num_permutations - start) for start in range(0, num_permutations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+    num_done = 0
+    num_extreme = 0
+    try:
+        for start in range(0, len(chunk_sizes), max(1, num_workers)):
+            end = min(start + max(1, num_workers), len(chunk_sizes))
+            arguments = [seeds[start:end], chunk_sizes[start:end]] + [[argument] * (end - start) for argument in [
+                entry_rows, entry_columns, entry_weights, published - preprint, totals, selected, metric, weighted, observed]]
+            counts = list(executor.map(permutation_chunk, *arguments)) if executor != None else list(map(permutation_chunk, *arguments))
+
+            for size, count in zip(chunk_sizes[start:end], counts):
+                num_done += size
+                num_extreme += count
+                p_value = (num_extreme + 1) / (num_done + 1)
+                if abs(p_value - alpha) > STOP_Z * math.sqrt(p_value * (1 - p_value) / num_done):
+                    return p_value, num_done
+    finally:
+        if executor != None:
+            executor.shutdown()
+
+    return (num_extreme + 1) / (num_done + 1), num_done
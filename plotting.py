@@ -0,0 +1,198 @@
+# -------------------------------------------
+#
+# figures drawn from computed results (Lorenz curves, Figure 1, Figure 3, and Figure 4)
+#
+# -------------------------------------------
+
+# modules
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+#=========================#
+# setting
+#=========================#
+
+# font size of the Lorenz curves (Figure 1, Figure 3 and Figure 4 use the default font size of matplotlib)
+FONT_SIZE = 18
+
+# resolution of the figures
+DPI = 300
+
+# maximum number of points of a Lorenz curve that are drawn
+MAX_POINTS = 2000
+
+
+def pyplot():
+
+    # matplotlib is imported only when a figure is drawn, so that importing the analyses (e.g., in worker processes) does not load it
+    # the non-interactive Agg backend is used unless pyplot has already been imported (e.g., in a notebook)
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+
+    # at most about $max_points$ points of the curve ($x$ and $y$ ascending), evenly spaced along both axes
+    # (a Lorenz curve is flat at the beginning and steep at the end, so both ranges have to be covered); both ends are kept
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(x) <= max_points:
+        return x, y
+    grid = np.linspace(0, 1, max_points // 2)
+    indices = np.unique(np.concatenate([[0, len(x) - 1],
+                                        np.minimum(np.searchsorted(x, grid * x[-1]), len(x) - 1),
+                                        np.minimum(np.searchsorted(y, grid * y[-1]), len(y) - 1)]))
+    return x[indices], y[indices]
+
+
+def lorenz_curve(population, citations_cum, max_points=MAX_POINTS):
+    # normalized and downsampled Lorenz curve (see inequality.lorenz)
+    return downsample(population / population[-1], citations_cum / citations_cum[-1], max_points)
+
+
+def lorenz_figure(filename, curve_preprints, curve_published):
+
+    plt = pyplot()
+    with plt.rc_context({'font.size': FONT_SIZE}):
+        fig, ax = plt.subplots()
+
+        fig.tight_layout()
+
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1)
+        ax.plot(curve_preprints[0], curve_preprints[1], marker="x", markersize=0, linewidth=1, color='r', label='preprint')
+        ax.plot(curve_published[0], curve_published[1], marker="o", markersize=0, linewidth=1, color='b', label='publisher version')
+        ax.grid(which='both', axis='y')
+        ax.legend()
+
+        save(fig, filename)
+
+
+def time_figure(filename, citations_preprint, citations_published, articles_preprint, articles_published):
+
+    # Figure 1: numbers of citations and of articles per month since preprint publication
+    plt = pyplot()
+    l = list(range(0, len(citations_preprint)))
+
+    fig = plt.figure()
+
+    ax1 = fig.add_subplot(2, 1, 1)
+    ax2 = fig.add_subplot(2, 1, 2)
+
+    ax1.minorticks_on()
+    ax1.grid(which='major', axis='x')
+    ax1.grid(which='major', axis='y')
+    ax1.grid(which='minor', axis='y', linestyle=':')
+
+    ax2.set_axisbelow(True)
+    ax2.grid(which='both', axis='x')
+    ax2.grid(which='both', axis='y')
+
+    ax1.set_xlim(-1.3925000000000003, 25.392500000000002)
+    ax1.plot(l, citations_preprint, marker="x", markersize=2, linewidth=1, color='r', label='preprint')
+    ax1.plot(l, citations_published, marker="o", markersize=2, linewidth=1, color='b', label='publisher version')
+    ax1.tick_params(labelbottom=False, bottom=False)
+
+    ax2.bar(l, articles_preprint, 0.35, color='r', label='preprint')
+    ax2.bar(l, articles_published, 0.35, color='b', bottom=articles_preprint, label='publisher version')
+
+    ax1.set_ylabel('number of citations\n(log-transformed\nafter addition of 1)')
+    ax2.set_ylabel('number of articles')
+    ax2.set_xlabel('months after preprint publication')
+
+    ax1.legend()
+    ax2.legend()
+    fig.tight_layout()
+
+    save(fig, filename)
+
+
+def gini_time_figure(filename, df):
+
+    # Figure 3 and Figure 4: Gini coefficients and numbers of articles and affiliations by the number of months from publication of a preprint to its publisher version
+    # $df$ has the columns 'months', 'gini_preprint', 'gini_publisher', 'num_articles', and 'num_affiliations'
+    plt = pyplot()
+    fig = plt.figure()
+    fig.set_size_inches(5, 5.5)
+
+    ax1 = fig.add_subplot(3, 1, 1)
+    ax2 = fig.add_subplot(3, 1, 2)
+    ax3 = fig.add_subplot(3, 1, 3)
+
+    major_ticks = np.arange(0, 21, 5)
+    minor_ticks = np.arange(0, 21, 1)
+
+    ax1.set_xticks(major_ticks)
+    ax1.set_xticks(minor_ticks, minor=True)
+
+    ax1.grid(which='major', alpha=0.5)
+    ax1.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
+    ax1.grid(which='minor', axis='y', alpha=0.2, linestyle=':')
+
+    ax2.set_axisbelow(True)
+    ax2.set_xticks(major_ticks)
+    ax2.set_xticks(minor_ticks, minor=True)
+    ax2.grid(which='major', axis='x', alpha=0.5)
+    ax2.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
+    ax2.grid(which='major', axis='y', alpha=0.5)
+
+    ax3.set_axisbelow(True)
+    ax3.set_xticks(major_ticks)
+    ax3.set_xticks(minor_ticks, minor=True)
+    ax3.grid(which='major', axis='x', alpha=0.5)
+    ax3.grid(which='minor', axis='x', alpha=0.2, linestyle=':')
+    ax3.grid(which='major', axis='y', alpha=0.5)
+
+    ax1.plot(df['months'][0:19], df['gini_preprint'][0:19], marker="x", markersize=2, linewidth=1, color='r', label='preprint')
+    ax1.plot(df['months'][0:19], df['gini_publisher'][0:19], marker="o", markersize=2, linewidth=1, color='b', label='publisher version')
+    ax1.set_xlim(-1.1000, 19.202499999999997)
+    ax1.tick_params(labelbottom=False, bottom=False)
+
+    ax2.set_xticks(major_ticks)
+    ax2.set_xticks(minor_ticks, minor=True)
+    ax2.bar(df['months'][0:19], df['num_articles'][0:19], 0.25, color='green', label='number of articles')
+    ax2.tick_params(labelbottom=False, bottom=False)
+
+    ax3.set_xticks(major_ticks)
+    ax3.set_xticks(minor_ticks, minor=True)
+    ax3.bar(df['months'][0:19], df['num_affiliations'][0:19], 0.25, color='gray', label='number of affiliations')
+
+    ax1.set_ylabel('Gini coefficient')
+    ax2.set_ylabel('number of articles')
+    ax3.set_ylabel('number of affiliations')
+    ax3.set_xlabel('months from publication of a preprint to its publisher version')
+
+    ax1.legend()
+    fig.tight_layout()
+
+    save(fig, filename)
+
+
+def save(fig, filename):
+
+    # the figure is closed after saving, so that figures do not pile up in memory when many of them are drawn
+    if os.path.dirname(filename) != '':
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    fig.savefig(filename, dpi=DPI)
+    pyplot().close(fig)
+
+
+def render_task(task):
+    function, arguments = task
+    function(*arguments)
+
+
+def render(tasks, num_workers=1):
+
+    # draw the figures of $tasks$, a list of (drawing function of this module, its arguments), in $num_workers$ processes
+    if num_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(tasks))) as executor:
+            list(executor.map(render_task, tasks))
+    else:
+        for task in tasks:
+            render_task(task)
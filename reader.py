@@ -0,0 +1,158 @@
+# -------------------------------------------
+#
+# read (sharded) bioRxiv/OpenCitations dumps
+#
+# -------------------------------------------
+
+# modules
+import os
+import gzip
+import queue
+import threading
+import time
+import records
+import instrumentation
+
+# faster implementations of gzip decompression, if installed
+try:
+    from isal import igzip as fast_gzip
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as fast_gzip
+    except ImportError:
+        fast_gzip = None
+
+
+def open_dump(file_input):
+    if fast_gzip != None:
+        return fast_gzip.open(file_input, 'rb')
+    return gzip.open(file_input, 'rb')
+
+
+def read_batches(file_input, shard=None, block_size=1 << 22, queue_size=8):
+
+    # batches of lines of the input file
+    # a background thread decompresses the file in blocks of $block_size$ bytes and splits them into lines,
+    # while the caller parses the previous batches; at most $queue_size$ batches are held in memory
+    # if $shard$ = (k, n) is given, only every n-th line starting from the k-th line is returned
+    batches = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            num_lines = 0
+            rest = b''
+            with open_dump(file_input) as f:
+                while True:
+                    if instrumentation.enabled:
+                        start = time.perf_counter()
+                    block = f.read(block_size)
+                    if len(block) == 0:
+                        lines = [rest.decode('utf-8')] if len(rest.strip()) > 0 else []
+                    else:
+                        block = rest + block
+                        end = block.rfind(b'\n')
+                        if end == -1:
+                            rest = block
+                            continue
+                        rest = block[end + 1:]
+                        lines = block[:end].decode('utf-8').split('\n')
+
+                    if shard != None:
+                        first = (shard[0] - num_lines) % shard[1]
+                        num_lines += len(lines)
+                        lines = lines[first::shard[1]]
+
+                    if instrumentation.enabled:
+                        instrumentation.add_time('decompress', time.perf_counter() - start)
+
+                    if len(lines) > 0 and put(lines) == False:
+                        return
+                    if len(block) == 0:
+                        break
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+        producer.join()
+
+
+def read_lines(file_input, shard=None):
+
+    # lines of the input file (see read_batches)
+    for batch in read_batches(file_input, shard):
+        yield from batch
+
+
+def read_records(file_input, shard=None, decoder=None, target_journals=None):
+
+    # decoded records of the input file that pass records.prefilter (see read_batches)
+    # if instrumentation is enabled, the lines read, the lines rejected by records.prefilter (with the reason), and the time of decoding are recorded
+    decode = records.get_decoder(decoder)
+    for batch in read_batches(file_input, shard):
+        if instrumentation.enabled == False:
+            for line in batch:
+                if records.prefilter(line, target_journals) == False:
+                    continue
+                yield decode(line)
+            continue
+
+        instrumentation.count('read', len(batch))
+        for line in batch:
+            if records.prefilter(line, target_journals) == False:
+                instrumentation.count('no published_doi (prefilter)' if '"published_doi"' not in line else 'not in target journals (prefilter)')
+                continue
+            start = time.perf_counter()
+            json_obj = decode(line)
+            instrumentation.add_time('json_decode', time.perf_counter() - start)
+            yield json_obj
+
+
+def shard_tasks(file_input, num_workers):
+
+    # split the input among workers
+    # $file_input$ is either one file (every worker reads every n-th line of it) or a list of pre-split shard files (see split_dump)
+    if isinstance(file_input, (list, tuple)):
+        return [(shard_file, None) for shard_file in file_input]
+    if num_workers <= 1:
+        return [(file_input, None)]
+    return [(file_input, (k, num_workers)) for k in range(num_workers)]
+
+
+def split_dump(file_input, num_shards, output_dir):
+
+    # write a sharded copy of the input file (lines are distributed round-robin)
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.basename(file_input)
+    if name.endswith('.jsonl.gz'):
+        name = name[:-len('.jsonl.gz')]
+    shard_files = [os.path.join(output_dir, name + '-' + str(k).zfill(4) + '.jsonl.gz') for k in range(num_shards)]
+
+    fws = [gzip.open(shard_file, 'wt', compresslevel=6) for shard_file in shard_files]
+    for i, line in enumerate(read_lines(file_input)):
+        fws[i % num_shards].write(line + '\n')
+    for fw in fws:
+        fw.close()
+
+    return shard_files
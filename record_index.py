@@ -0,0 +1,98 @@
+# -------------------------------------------
+#
+# index of the records of the columnar cache by lag, journal, and month
+#
+# -------------------------------------------
+
+# modules
+import os
+import shutil
+import numpy as np
+import dump_cache
+
+#=========================#
+# setting
+#=========================#
+
+# indexed columns of the articles table
+# lag: number of months from preprint publication to publication of the publisher version
+# journal: ID of the ISSN-L of the journal of the publisher version
+# month: bioRxiv month (as ordinal)
+INDEXED_COLUMNS = ['lag', 'journal', 'month']
+
+# arrays of an index: distinct values (ascending), offsets of the values in positions, and positions of the records sorted by value
+PARTS = ['values', 'offsets', 'positions']
+
+
+def index_path(file_input, column, cache_dir='cache'):
+    # the indexes are stored in the directory of the columnar cache, so they are removed when the cache is rebuilt
+    return os.path.join(dump_cache.cache_path(file_input, cache_dir), 'index', column)
+
+
+def build_index(file_input, column, cache_dir='cache'):
+
+    values = np.asarray(dump_cache.load_columns(file_input, 'articles', [column], cache_dir=cache_dir)[column])
+
+    # records with the same value keep their order, so the positions of one value are ascending
+    positions = np.argsort(values, kind='stable').astype(np.int64)
+    distinct, counts = np.unique(values, return_counts=True)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    path = index_path(file_input, column, cache_dir)
+    path_tmp = path + '.tmp'
+    shutil.rmtree(path_tmp, ignore_errors=True)
+    os.makedirs(path_tmp)
+    for name, part in zip(PARTS, [distinct, offsets, positions]):
+        np.save(os.path.join(path_tmp, name + '.npy'), part)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(path_tmp, path)
+
+
+def load_index(file_input, column, cache_dir='cache'):
+
+    # (values, offsets, positions) of the index (memory-mapped), building it if necessary
+    if dump_cache.cache_valid(file_input, cache_dir) == False:
+        dump_cache.build_cache(file_input, cache_dir)
+
+    path = index_path(file_input, column, cache_dir)
+    if os.path.exists(path) == False:
+        build_index(file_input, column, cache_dir)
+
+    return tuple([np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in PARTS])
+
+
+def value_range(index, value_min=None, value_max=None):
+
+    # range [start, end) of the distinct values in [$value_min$, $value_max$] (None means no bound)
+    values, offsets, positions = index
+    start = 0 if value_min == None else np.searchsorted(values, value_min, side='left')
+    end = len(values) if value_max == None else np.searchsorted(values, value_max, side='right')
+    return start, max(start, end)
+
+
+def lookup_count(index, value_min=None, value_max=None):
+    # number of the records whose value is in [$value_min$, $value_max$], from the offsets alone (no position is read)
+    start, end = value_range(index, value_min, value_max)
+    return int(index[1][end] - index[1][start])
+
+
+def lookup(index, value_min=None, value_max=None):
+
+    # positions (ascending) of the records whose value is in [$value_min$, $value_max$] (None means no bound)
+    values, offsets, positions = index
+    start, end = value_range(index, value_min, value_max)
+    if end - start == 1:
+        return np.asarray(positions[offsets[start]:offsets[end]])
+    return np.sort(positions[offsets[start]:offsets[end]])
+
+
+def range_positions(indptr, rows, max_count=None):
+
+    # positions indptr[i] ... indptr[i + 1] - 1 of all rows i in $rows$ (e.g., the citations of some articles)
+    # if $max_count$ is given, only the first $max_count$ positions of each row
+    rows = np.asarray(rows)
+    counts = indptr[rows + 1] - indptr[rows]
+    if max_count != None:
+        counts = np.minimum(counts, max_count)
+    ends = np.cumsum(counts)
+    return np.repeat(indptr[rows] - (ends - counts), counts) + np.arange(ends[-1] if len(ends) > 0 else 0)
@@ -0,0 +1,181 @@
+# -------------------------------------------
+#
+# fields of the records of the bioRxiv/OpenCitations dump
+#
+# -------------------------------------------
+
+# modules
+import json
+import sys
+import time
+import gzip
+import itertools
+from datetime import datetime
+from typing import Any, List, Optional, TypedDict
+import numpy as np
+
+# optional fast JSON decoders
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# memo table of parsed months
+month_ordinals = {}
+
+
+def date_ordinal(d):
+    return d.year * 12 + d.month
+
+
+def month_ordinal(month, year_allowed=False):
+
+    # 'YYYY-MM' -> year * 12 + month (None if the month is invalid)
+    # if $year_allowed$ is True, 'YYYY' is also accepted as January of the year (as for the publication month of a citing entity)
+    try:
+        if year_allowed and len(month) == 4:
+            month = month + '-01'
+        return month_ordinals[month]
+    except KeyError:
+        pass
+    except:
+        return None
+
+    try:
+        ordinal = date_ordinal(datetime.strptime(month, '%Y-%m'))
+    except:
+        ordinal = None
+    month_ordinals[month] = ordinal
+    return ordinal
+
+
+def citation_arrays(citations):
+
+    # publication months of the citing entities (-1 if invalid) and whether the preprint (not the publisher version) is cited
+    months = [month_ordinal(citation.get('creation_month'), year_allowed=True) for citation in citations]
+    months = np.array([-1 if month == None else month for month in months], dtype=int)
+    preprint = np.array([citation.get('cited_doi', '').startswith('10.1101') for citation in citations], dtype=bool)
+    return months, preprint
+
+
+def citation_window(months, biorxiv_month, max_months):
+
+    # number of months from preprint publication to each citation and whether it is within $max_months$ months
+    months_since = months - biorxiv_month
+    window = (months != -1) & (months_since >= 0) & (months_since <= max_months)
+    return months_since, window
+
+
+#=========================#
+# decoders
+#=========================#
+
+# fields of a record that are used by the analyses (the other fields are skipped by the msgspec decoder)
+class Ror(TypedDict, total=False):
+    ror_name: Any
+    ror_country: Any
+
+
+class Affiliation(TypedDict, total=False):
+    ror: Optional[Ror]
+
+
+class Author(TypedDict, total=False):
+    author_order: Any
+    corresp: Any
+    affiliations: List[Affiliation]
+
+
+class Authors(TypedDict, total=False):
+    estimate: Any
+    authors: List[Author]
+
+
+class Citation(TypedDict, total=False):
+    creation_month: Any
+    cited_doi: Any
+
+
+class Record(TypedDict, total=False):
+    doi: Any
+    month: Any
+    published_doi: Any
+    published_month: Any
+    published_journalissnl: Any
+    author: Authors
+    oc: List[Citation]
+
+
+def decode_json(line):
+    return json.loads(line)
+
+
+def decode_orjson(line):
+    return orjson.loads(line)
+
+
+if msgspec != None:
+    record_decoder = msgspec.json.Decoder(Record)
+
+
+def decode_msgspec(line):
+    # records that do not follow the schema above are decoded by the standard library
+    try:
+        return record_decoder.decode(line)
+    except msgspec.ValidationError:
+        return json.loads(line)
+
+
+# available decoders from the fastest one
+DECODERS = {}
+if msgspec != None:
+    DECODERS['msgspec'] = decode_msgspec
+if orjson != None:
+    DECODERS['orjson'] = decode_orjson
+DECODERS['json'] = decode_json
+
+
+def get_decoder(backend=None):
+    # if $backend$ is None, the fastest available decoder is used
+    if backend == None:
+        return next(iter(DECODERS.values()))
+    return DECODERS[backend]
+
+
+def prefilter(line, target_journals=None):
+
+    # reject a record before decoding if it cannot be analyzed:
+    # it has no DOI of the publisher version, or it is not published in any of $target_journals$ (None means all journals)
+    # records passing this check are still checked after decoding
+    if '"published_doi"' not in line:
+        return False
+    if target_journals != None:
+        for target_journal in target_journals:
+            if '"' + target_journal + '"' in line:
+                return True
+        return False
+    return True
+
+
+def benchmark_decoders(file_input, num_lines=100000):
+
+    # number of records decoded per second by each available decoder
+    with gzip.open(file_input, 'rt') as f:
+        lines = list(itertools.islice(f, num_lines))
+
+    records_per_second = {}
+    for backend, decode in DECODERS.items():
+        start = time.perf_counter()
+        for line in lines:
+            decode(line)
+        records_per_second[backend] = len(lines) / (time.perf_counter() - start)
+    return records_per_second
+
+
+if __name__ == '__main__':
+    for backend, speed in benchmark_decoders(sys.argv[1]).items():
+        print(backend, '{:,.0f}'.format(speed), 'records/s')
@@ -0,0 +1,101 @@
+# -------------------------------------------
+#
+# on-disk cache of the results of citation_ineq
+#
+# -------------------------------------------
+
+# modules
+import os
+import json
+import pickle
+import hashlib
+import shutil
+from datetime import datetime
+
+#=========================#
+# setting
+#=========================#
+
+# version of the cached results (results of other versions are not reused)
+# version 2: affiliations are compared with num_articles_min up to rounding (see accumulator.NUM_ARTICLES_TOLERANCE), and the bootstrap intervals are bias-corrected
+RESULT_CACHE_VERSION = 2
+
+# maximum total size of the cached results (least recently used results are removed first)
+MAX_BYTES = 1 << 30
+
+# parameters that do not change the results
+IGNORED_PARAMETERS = ['fig']
+
+
+def file_identity(file_input):
+
+    # identity of the input file (or of the list of its shard files)
+    if isinstance(file_input, (list, tuple)):
+        return [file_identity(shard_file) for shard_file in file_input]
+    stat = os.stat(file_input)
+    return [os.path.abspath(file_input), stat.st_size, stat.st_mtime]
+
+
+def result_key(file_input, config):
+
+    # hash of the identity of the input file and every parameter of citation_ineq
+    # (optional parameters that are not given take their default values, see citation_bias.config_defaults)
+    import citation_bias
+
+    parameters = {}
+    for name, value in citation_bias.config_defaults(config).items():
+        if name in IGNORED_PARAMETERS:
+            continue
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m')
+        parameters[name] = value
+    key = json.dumps({'version': RESULT_CACHE_VERSION, 'file_input': file_identity(file_input), 'parameters': parameters}, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def load_result(file_input, config, result_dir='cache/results'):
+
+    # cached result ({'result': return value of citation_ineq, 'affiliations': table of affiliations}) or None
+    path = os.path.join(result_dir, result_key(file_input, config) + '.pkl')
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+    except:
+        return None
+
+    # the modification time records the last use of the result
+    os.utime(path)
+    return cached
+
+
+def save_result(file_input, config, result, citations_affiliations, result_dir='cache/results', max_bytes=MAX_BYTES):
+
+    os.makedirs(result_dir, exist_ok=True)
+    path = os.path.join(result_dir, result_key(file_input, config) + '.pkl')
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump({'config': config, 'result': result, 'affiliations': citations_affiliations}, f)
+    os.replace(path + '.tmp', path)
+
+    evict(result_dir, max_bytes)
+
+
+def evict(result_dir='cache/results', max_bytes=MAX_BYTES):
+
+    # remove the least recently used results until the total size is at most $max_bytes$
+    files = []
+    for name in os.listdir(result_dir):
+        if name.endswith('.pkl'):
+            stat = os.stat(os.path.join(result_dir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+    files.sort()
+
+    total = sum([size for mtime, size, name in files])
+    for mtime, size, name in files:
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(result_dir, name))
+        total -= size
+
+
+def clear_results(result_dir='cache/results'):
+    shutil.rmtree(result_dir, ignore_errors=True)
@@ -0,0 +1,132 @@
+# -------------------------------------------
+#
+# seeded samples of the articles of the columnar cache stratified by bioRxiv month and journal
+#
+# -------------------------------------------
+
+# modules
+import os
+import sys
+import shutil
+import numpy as np
+import dump_cache
+
+#=========================#
+# setting
+#=========================#
+
+# sampling rates of the pre-built samples
+RATES = [0.01, 0.1]
+
+# number of random groups of the sampled articles for the standard errors (delete-a-group jackknife)
+NUM_GROUPS = 20
+
+# minimum credit of sampled articles of an affiliation in approximate Gini coefficients (see citation_bias.citation_ineq_sample)
+# the means of affiliations with fewer sampled articles are too noisy, whatever their estimated number of articles
+MIN_SAMPLED_ARTICLES = 2
+
+# arrays of a sample: sampled records (ascending), their weights (size of the stratum / number of sampled records of the stratum), and their random groups
+PARTS = ['rows', 'weights', 'groups']
+
+
+def sample_path(file_input, rate, seed=0, cache_dir='cache'):
+    # the samples are stored in the directory of the columnar cache, so they are removed when the cache is rebuilt
+    return os.path.join(dump_cache.cache_path(file_input, cache_dir), 'sample', str(rate) + '_' + str(seed))
+
+
+def build_sample(file_input, rate, seed=0, cache_dir='cache'):
+
+    # records are stratified by bioRxiv month and journal of the publisher version,
+    # and round($rate$ x size of the stratum) records (at least one) are drawn from every stratum without replacement
+    # journals with less than 1 / $rate$ records in a month are collapsed into one stratum of the month, so that the sample is not inflated by small strata
+    articles = dump_cache.load_columns(file_input, 'articles', ['month', 'journal'], cache_dir=cache_dir)
+    month = np.asarray(articles['month']).astype(np.int64)
+    journal = np.asarray(articles['journal']).astype(np.int64)
+    num_records = len(month)
+
+    keys = (month - month.min(initial=0)) * (journal.max(initial=0) + 2) + journal + 1
+    distinct, strata, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+    small = rate * sizes[strata] < 1
+    keys[small] = keys[small] - journal[small] - 1
+    distinct, strata, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+    sizes_sample = np.maximum(1, np.round(rate * sizes)).astype(np.int64)
+
+    # random rank of every record within its stratum
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(num_records), strata))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ranks = np.empty(num_records, dtype=np.int64)
+    ranks[order] = np.arange(num_records) - starts[strata[order]]
+
+    rows = np.flatnonzero(ranks < sizes_sample[strata])
+    weights = sizes[strata[rows]] / sizes_sample[strata[rows]]
+    groups = (rng.permutation(len(rows)) % NUM_GROUPS).astype(np.int16)
+
+    path = sample_path(file_input, rate, seed, cache_dir)
+    path_tmp = path + '.tmp'
+    shutil.rmtree(path_tmp, ignore_errors=True)
+    os.makedirs(path_tmp)
+    for name, part in zip(PARTS, [rows, weights, groups]):
+        np.save(os.path.join(path_tmp, name + '.npy'), part)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(path_tmp, path)
+
+
+def load_sample(file_input, rate, seed=0, cache_dir='cache'):
+
+    # (rows, weights, groups) of the sample (memory-mapped), building it if necessary
+    if dump_cache.cache_valid(file_input, cache_dir) == False:
+        dump_cache.build_cache(file_input, cache_dir)
+
+    path = sample_path(file_input, rate, seed, cache_dir)
+    if os.path.exists(path) == False:
+        build_sample(file_input, rate, seed, cache_dir)
+
+    return tuple([np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in PARTS])
+
+
+def sample_weights(sample, rows):
+    # weights and groups of the sampled records $rows$
+    sample_rows, weights, groups = sample
+    positions = np.searchsorted(sample_rows, rows)
+    return np.asarray(weights[positions]), np.asarray(groups[positions])
+
+
+def replicate_weights(weights, groups, num_groups=NUM_GROUPS):
+
+    # weights of the articles in the full sample (first row) and in the replicates without one of the groups (the other rows)
+    kept = groups[None, :] != np.arange(num_groups)[:, None]
+    return np.vstack([weights[None, :], np.where(kept, weights[None, :] * num_groups / (num_groups - 1), 0)])
+
+
+def standard_errors(estimates, rate, num_groups=NUM_GROUPS):
+
+    # delete-a-group jackknife standard errors of the estimates of the full sample (estimates[0]) from those of the replicates (estimates[1:]),
+    # with the finite population correction (1 - $rate$)
+    replicates = np.asarray(estimates, dtype=float)[1:]
+    with np.errstate(invalid='ignore'):
+        variance = (num_groups - 1) / num_groups * np.sum((replicates - np.mean(replicates, axis=0)) ** 2, axis=0)
+    return np.sqrt(variance * (1 - rate))
+
+
+def jackknife_bias(estimates, rate, num_groups=NUM_GROUPS):
+
+    # delete-a-group jackknife estimates of the bias of the estimates of the full sample (estimates[0]) from those of the replicates (estimates[1:]),
+    # with the finite population correction (1 - $rate$)
+    # (e.g., Gini coefficients of means of sampled articles are biased upward, since the noise of the means adds to their differences)
+    estimates = np.asarray(estimates, dtype=float)
+    return (num_groups - 1) * (np.mean(estimates[1:], axis=0) - estimates[0]) * (1 - rate)
+
+
+def build_samples(file_input, rates=RATES, seed=0, cache_dir='cache'):
+    for rate in rates:
+        build_sample(file_input, rate, seed, cache_dir)
+        print(rate, len(load_sample(file_input, rate, seed, cache_dir)[0]), 'records')
+
+
+if __name__ == '__main__':
+
+    # usage: python sampling.py <input file> [<rate> ...]
+    file_input = sys.argv[1] if len(sys.argv) > 1 else 'data/biorxiv_metadata-oc.jsonl.gz'
+    rates = [float(rate) for rate in sys.argv[2:]] if len(sys.argv) > 2 else RATES
+    build_samples(file_input, rates)
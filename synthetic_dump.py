@@ -0,0 +1,102 @@
+# -------------------------------------------
+#
+# generate a synthetic dump in the schema of biorxiv_metadata-oc.jsonl.gz
+#
+# -------------------------------------------
+
+# modules
+import json
+import gzip
+import random
+import sys
+import itertools
+
+#=========================#
+# setting
+#=========================#
+
+# ISSN-L of journals and their share of publisher versions
+JOURNALS = {
+    '1932-6203': 0.08,  # PLoS ONE
+    '2045-2322': 0.06,  # Scientific Reports
+    '0305-1048': 0.03,  # Nucleic acids research
+    '0006-3495': 0.02,  # Biophysical journal
+    '1061-4036': 0.01,  # Nature Genetics
+    '0028-0836': 0.01,  # Nature
+    '0036-8075': 0.01,  # Science
+}
+
+
+def month_string(ordinal):
+    return str((ordinal - 1) // 12) + '-' + str((ordinal - 1) % 12 + 1).zfill(2)
+
+
+def generate_dump(file_output, num_records=10000, authors_per_paper=6, affiliations_per_author=1.3, citations_per_paper=10, unknown_fraction=0.2,
+                  journals=JOURNALS, num_other_journals=2000, num_institutions=20000, num_countries=150, published_fraction=0.7, estimate_fraction=0.05,
+                  first_month='2013-11', latest_month='2021-06', seed=0):
+
+    # the numbers of authors, affiliations, and citations follow geometric-like distributions with the given means,
+    # and institutions and countries are drawn from Zipf-like distributions (a few large ones and a long tail)
+    r = random.Random(seed)
+
+    first_month = int(first_month[:4]) * 12 + int(first_month[5:7])
+    latest_month = int(latest_month[:4]) * 12 + int(latest_month[5:7])
+
+    institutions = ['Institution ' + str(i) for i in range(num_institutions)]
+    institution_countries = [r.randrange(num_countries) for i in range(num_institutions)]
+    institution_weights = list(itertools.accumulate([1 / (i + 1) for i in range(num_institutions)]))
+    other_journals = [str(1000 + i) + '-' + str(i % 10000).zfill(4) for i in range(num_other_journals)]
+    journal_names = list(journals.keys()) + ['other']
+    journal_weights = list(journals.values()) + [max(0, 1 - sum(journals.values()))]
+
+    def count(mean):
+        # number with mean $mean$ (at least 0)
+        return int(r.expovariate(1 / mean)) if mean > 0 else 0
+
+    with gzip.open(file_output, 'wt') as fw:
+        for k in range(num_records):
+
+            month = r.randint(first_month, latest_month)
+            record = {'doi': '10.1101/' + str(k).zfill(8), 'month': month_string(month)}
+
+            # publisher version
+            if r.random() < published_fraction:
+                record['published_doi'] = '10.9999/' + str(k).zfill(8)
+                record['published_month'] = month_string(month + count(8))
+                journal = r.choices(journal_names, journal_weights)[0]
+                record['published_journalissnl'] = journal if journal != 'other' else r.choice(other_journals)
+
+            # authors and their affiliations
+            num_authors = max(1, count(authors_per_paper)) if r.random() > 0.01 else 0
+            corresp = r.randrange(num_authors) if num_authors > 0 else -1
+            authors = []
+            for order in range(1, num_authors + 1):
+                affiliations = []
+                for j in range(max(1, count(affiliations_per_author)) if r.random() > 0.05 else 0):
+                    if r.random() < unknown_fraction:
+                        affiliations.append({'name': 'Unresolved affiliation ' + str(r.randrange(100000))})
+                    else:
+                        i = r.choices(range(num_institutions), cum_weights=institution_weights)[0]
+                        affiliations.append({'name': institutions[i], 'ror': {'ror_name': institutions[i], 'ror_country': 'Country ' + str(institution_countries[i])}})
+                authors.append({'author_order': order, 'corresp': order - 1 == corresp, 'affiliations': affiliations})
+            record['author'] = {'estimate': r.random() < estimate_fraction, 'authors': authors}
+
+            # citations (to the preprint or to the publisher version)
+            citations = []
+            for j in range(count(citations_per_paper)):
+                citation_month = min(month + count(12) - 1, latest_month)
+                creation_month = month_string(citation_month) if r.random() > 0.05 else month_string(citation_month)[:4]
+                if 'published_doi' in record and r.random() < 0.6:
+                    cited_doi = record['published_doi']
+                else:
+                    cited_doi = record['doi']
+                citations.append({'citing_doi': '10.9998/' + str(r.randrange(10 ** 8)), 'cited_doi': cited_doi, 'creation_month': creation_month})
+            record['oc'] = citations
+
+            fw.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+
+    # usage: python synthetic_dump.py <output file> <number of records>
+    generate_dump(sys.argv[1], num_records=int(sys.argv[2]))
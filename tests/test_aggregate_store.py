@@ -0,0 +1,50 @@
+import io
+import re
+import contextlib
+from datetime import datetime
+import numpy as np
+import pytest
+import aggregate_store
+import citation_bias
+import synthetic_dump
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('store')
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    cache_dir = str(tmp_path / 'cache')
+    synthetic_dump.generate_dump(file_input, num_records=2000, seed=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        connection = aggregate_store.open_store(file_input, cache_dir)
+    yield file_input, cache_dir, connection
+    connection.close()
+
+
+def paper_configs():
+    configs = citation_bias.paper_configs(datetime.strptime('2021-06', '%Y-%m'))
+    return [dict(config, fig=False) for name in ['institution_target_authors', 'institution_all', 'journals'] for config in configs[name][:4]]
+
+
+def test_weights_are_looked_up_by_article(store):
+
+    # the articles are selected first and the weights are searched by row, never scanned
+    file_input, cache_dir, connection = store
+    for config in paper_configs():
+        query, parameters = aggregate_store.affiliation_query(config)
+        plan = [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + query, parameters).fetchall()]
+        index = 'articles_lag' if config['target_journal'] == 'all' else 'articles_journal'
+        assert re.match('SEARCH a USING (COVERING )?INDEX ' + index + ' ', plan[0])
+        assert any(step.startswith('SEARCH w USING PRIMARY KEY (row=? AND target_author=? AND level=?)') for step in plan)
+        assert not any(step.startswith('SCAN w') for step in plan)
+
+
+def test_store_equals_cache(store):
+    file_input, cache_dir, connection = store
+    configs = paper_configs()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = citation_bias.citation_ineq_sweep(file_input, configs, cache_dir=cache_dir)
+        for config, result in zip(configs, results):
+            result_store = aggregate_store.citation_ineq_store(file_input, **citation_bias.ineq_parameters(config), cache_dir=cache_dir, connection=connection)
+            assert result_store[3] == result[3]
+            assert np.allclose(result_store[:3], result[:3], rtol=1e-9, equal_nan=True)
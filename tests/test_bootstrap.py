@@ -0,0 +1,36 @@
+import io
+import contextlib
+from datetime import datetime
+import pytest
+import citation_bias
+import synthetic_dump
+
+
+@pytest.fixture(scope='module')
+def dump(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('bootstrap')
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=5000, seed=0)
+    return file_input, str(tmp_path / 'cache')
+
+
+@pytest.mark.parametrize('affiliation_level, num_articles_min', [('institution', 3), ('country', 5)])
+def test_interval_contains_point_estimate(dump, affiliation_level, num_articles_min):
+
+    # the resampled Gini coefficients are biased upward, which the intervals correct for
+    file_input, cache_dir = dump
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = citation_bias.citation_ineq(file_input, datetime.strptime('2021-06', '%Y-%m'), 24, 'all', affiliation_level, 'all', 0, 'na', num_articles_min, True, True, 'ln',
+                                             fig=False, cache_dir=cache_dir, bootstrap=200, bootstrap_seed=0)
+    for gini, (lower, upper) in zip(result[:2], result[4:6]):
+        assert lower <= gini <= upper
+
+
+def test_interval_does_not_depend_on_num_workers(dump):
+    file_input, cache_dir = dump
+    config = dict(latest_month=datetime.strptime('2021-06', '%Y-%m'), max_months=24, weighted=False, target_author='all', affiliation_level='country', target_journal='all',
+                  diff_month_preprint_publisher_min=0, diff_month_preprint_publisher_max='na', num_articles_min=5, none_citation_included=True, unknown_excluded=True, metric='ln')
+    with contextlib.redirect_stdout(io.StringIO()):
+        intervals = [citation_bias.affiliation_bootstrap(file_input, dict(config, bootstrap=100, bootstrap_seed=1, bootstrap_confidence=0.9), 'ror_country', cache_dir, num_workers)
+                     for num_workers in [1, 2]]
+    assert intervals[0] == intervals[1]
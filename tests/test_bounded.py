@@ -0,0 +1,69 @@
+import io
+import re
+import contextlib
+from datetime import datetime
+import numpy as np
+import pytest
+import citation_bias
+import synthetic_dump
+from accumulator import BoundedAccumulator
+
+# memory of the sketches (small enough that most affiliations are discarded, large enough that the sketches have few collisions)
+MEMORY_BUDGET = 1 << 18
+
+
+@pytest.fixture(scope='module')
+def dump(tmp_path_factory):
+    file_input = str(tmp_path_factory.mktemp('bounded') / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=5000, seed=0)
+    return file_input
+
+
+def paper_configs():
+    return [dict(config, fig=False) for configs in citation_bias.paper_configs(datetime.strptime('2021-06', '%Y-%m')).values() for config in configs]
+
+
+def test_bounded_equals_exact(dump):
+
+    # a count-min sketch never underestimates, so no affiliation reaching $num_articles_min$ is discarded
+    configs = paper_configs()
+    with contextlib.redirect_stdout(io.StringIO()):
+        exact = citation_bias.citation_ineq_sweep(dump, configs)
+        bounded = citation_bias.citation_ineq_sweep(dump, configs, memory_budget=MEMORY_BUDGET)
+    for result_exact, result_bounded in zip(exact, bounded):
+        assert result_exact[3] == result_bounded[3]
+        assert np.allclose(result_exact[:3], result_bounded[:3], rtol=1e-9, equal_nan=True)
+
+
+def test_tail_is_the_discarded_mass(dump):
+
+    # the tail of a bounded accumulator holds the totals of exactly the affiliations it discarded, all of which are below $num_articles_min$
+    configs = [citation_bias.config_defaults(config) for config in paper_configs()]
+    ror_fields = ['ror_name' if config['affiliation_level'] == 'institution' else 'ror_country' for config in configs]
+    with contextlib.redirect_stdout(io.StringIO()):
+        exact = citation_bias.affiliation_citations_json(dump, configs, ror_fields)
+        accumulators = citation_bias.bounded_accumulators(dump, configs, ror_fields, memory_budget=MEMORY_BUDGET)[0]
+        bounded = citation_bias.affiliation_citations_json(dump, configs, ror_fields, accumulators=accumulators)
+
+    num_discarded = 0
+    for k, (config, accumulator_exact, accumulator) in enumerate(zip(configs, exact, bounded)):
+        if config['num_articles_min'] == 0:
+            continue
+        assert isinstance(accumulator, BoundedAccumulator)
+        table_exact = accumulator_exact.to_frame()
+        table = accumulator.to_frame()
+        discarded = table_exact.loc[[name not in accumulator.ids for name in table_exact.index]]
+        num_discarded += len(discarded)
+        assert (discarded['num_articles'] < config['num_articles_min']).all()
+        assert np.allclose(table.reindex(table_exact.index).fillna(0).sum().to_numpy() + accumulator.tail, table_exact.sum().to_numpy())
+        assert np.allclose(accumulator.tail, discarded.sum().to_numpy())
+
+        # shares printed by report_tail
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            citation_bias.report_tail(accumulator, k)
+        shares = [float(share) / 100 for share in re.findall(r'\(([0-9.]+)%\)', output.getvalue())]
+        totals = table_exact.sum()
+        assert shares[0] == pytest.approx(discarded['num_articles'].sum() / totals['num_articles'], abs=1e-4)
+        assert shares[1] == pytest.approx((discarded['preprint'].sum() + discarded['published'].sum()) / (totals['preprint'] + totals['published']), abs=1e-4)
+    assert num_discarded > 0
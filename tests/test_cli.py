@@ -0,0 +1,11 @@
+import pytest
+import citation_bias
+import citation_time
+import figures
+
+
+@pytest.mark.parametrize('main', [citation_bias.main, citation_time.main, figures.main])
+def test_shard_files_require_no_cache(main):
+    # the columnar cache is keyed by a single dump, so shard files with a cache directory are rejected
+    with pytest.raises(SystemExit):
+        main(['--file-input', 'shard_0.jsonl.gz', 'shard_1.jsonl.gz'])
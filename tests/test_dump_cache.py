@@ -0,0 +1,135 @@
+import os
+import io
+import gzip
+import json
+import contextlib
+import numpy as np
+import dump_cache
+import synthetic_dump
+
+# columns holding IDs of the string tables
+STRING_COLUMNS = {('articles', 'journal'): 'journal', ('authors', 'ror_name'): 'ror_name', ('authors', 'ror_country'): 'ror_country'}
+
+
+def read_dump(file_input):
+    with gzip.open(file_input, 'rt') as f:
+        return f.read().splitlines()
+
+
+def write_dump(file_input, lines):
+    with gzip.open(file_input, 'wt') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def next_dump(lines, new_lines):
+
+    # the dump of the next month: some records are removed, some are changed, and new ones are inserted
+    result = []
+    for i, line in enumerate(lines):
+        if i % 7 == 3:
+            continue
+        if i % 5 == 1:
+            json_obj = json.loads(line)
+            json_obj['oc'] = json_obj['oc'][1:]
+            json_obj['published_journalissnl'] = 'new-journal'
+            for author in json_obj['author']['authors'][:1]:
+                author['affiliations'] = [{'ror': {'ror_name': 'New Institute ' + str(i), 'ror_country': 'New Country'}}]
+            line = json.dumps(json_obj)
+        result.append(line)
+        if i % 10 == 9:
+            result.append(new_lines[i // 10])
+    return result
+
+
+def cache_columns(path):
+    # columns of the cache in $path$ with the IDs of the string tables replaced by the strings
+    columns = {}
+    for table, names in dump_cache.TABLES.items():
+        for name, values in dump_cache.read_columns(path, table).items():
+            if (table, name) in STRING_COLUMNS:
+                strings = dump_cache.read_strings(path, STRING_COLUMNS[(table, name)])
+                values = [strings[k] for k in values]
+            columns[(table, name)] = np.asarray(values)
+    return columns
+
+
+def assert_same_cache(path, path_expected):
+    columns = cache_columns(path)
+    columns_expected = cache_columns(path_expected)
+    for key, values in columns_expected.items():
+        assert columns[key].tolist() == values.tolist(), key
+
+
+def test_update_equals_build(tmp_path):
+
+    file_previous = str(tmp_path / '2021-05' / 'dump.jsonl.gz')
+    file_input = str(tmp_path / '2021-06' / 'dump.jsonl.gz')
+    file_new = str(tmp_path / 'new.jsonl.gz')
+    os.makedirs(os.path.dirname(file_previous))
+    os.makedirs(os.path.dirname(file_input))
+    synthetic_dump.generate_dump(file_previous, num_records=300, seed=0)
+    synthetic_dump.generate_dump(file_new, num_records=30, seed=1)
+    write_dump(file_input, next_dump(read_dump(file_previous), read_dump(file_new)))
+
+    # dumps of the same name in different directories have their own caches
+    cache_dir = str(tmp_path / 'cache')
+    assert dump_cache.cache_path(file_input, cache_dir) != dump_cache.cache_path(file_previous, cache_dir)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dump_cache.build_cache(file_previous, cache_dir)
+        dump_cache.build_cache(file_input, str(tmp_path / 'cache_expected'))
+        dump_cache.update_cache(file_input, dump_cache.cache_path(file_previous, cache_dir), cache_dir)
+    assert dump_cache.cache_valid(file_previous, cache_dir)
+    assert dump_cache.cache_valid(file_input, cache_dir)
+    assert_same_cache(dump_cache.cache_path(file_input, cache_dir), dump_cache.cache_path(file_input, str(tmp_path / 'cache_expected')))
+
+
+def test_update_of_overwritten_dump(tmp_path):
+
+    # the dump is overwritten every month, and the previous dump is no longer on disk
+    file_input = str(tmp_path / 'data' / 'dump.jsonl.gz')
+    file_new = str(tmp_path / 'new.jsonl.gz')
+    os.makedirs(os.path.dirname(file_input))
+    synthetic_dump.generate_dump(file_input, num_records=300, seed=0)
+    synthetic_dump.generate_dump(file_new, num_records=30, seed=1)
+    cache_dir = str(tmp_path / 'cache')
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        dump_cache.build_cache(file_input, cache_dir)
+        write_dump(file_input, next_dump(read_dump(file_input), read_dump(file_new)))
+        assert dump_cache.cache_valid(file_input, cache_dir) == False
+        dump_cache.prepare_cache(file_input, cache_dir, dump_cache.cache_path(file_input, cache_dir))
+        dump_cache.build_cache(file_input, str(tmp_path / 'cache_expected'))
+    assert 'updating cache' in output.getvalue()
+    assert dump_cache.cache_valid(file_input, cache_dir)
+    assert_same_cache(dump_cache.cache_path(file_input, cache_dir), dump_cache.cache_path(file_input, str(tmp_path / 'cache_expected')))
+
+
+def test_missing_input_is_not_valid(tmp_path):
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=50, seed=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dump_cache.build_cache(file_input, str(tmp_path / 'cache'))
+    os.remove(file_input)
+    assert dump_cache.cache_valid(file_input, str(tmp_path / 'cache')) == False
+
+
+def test_strings_are_parsed_once_per_cache(tmp_path):
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=50, seed=0)
+    cache_dir = str(tmp_path / 'cache')
+    with contextlib.redirect_stdout(io.StringIO()):
+        dump_cache.build_cache(file_input, cache_dir)
+    journals = dump_cache.load_strings(file_input, 'journal', cache_dir=cache_dir)
+    misses = dump_cache.parsed_strings.cache_info().misses
+    assert dump_cache.load_strings(file_input, 'journal', cache_dir=cache_dir) is journals
+    dump_cache.load_strings(file_input, 'ror_name', cache_dir=cache_dir)
+    assert dump_cache.parsed_strings.cache_info().misses == misses
+    # a rebuilt cache is parsed again
+    strings_file = os.path.join(dump_cache.cache_path(file_input, cache_dir), 'strings.json')
+    with open(strings_file) as f:
+        strings = json.load(f)
+    strings['journal'] = strings['journal'] + ['x']
+    with open(strings_file, 'w') as f:
+        json.dump(strings, f)
+    assert dump_cache.load_strings(file_input, 'journal', cache_dir=cache_dir) == journals + ['x']
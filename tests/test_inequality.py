@@ -0,0 +1,45 @@
+import numpy as np
+from inequality import gini, gini_lorenz, lorenz
+
+
+def mean_absolute_difference_gini(x):
+    # the former n x n definition of the Gini coefficient
+    x = np.asarray(x, dtype=float)
+    return np.abs(np.subtract.outer(x, x)).mean() / (2 * x.mean())
+
+
+def test_gini_matches_mean_absolute_difference():
+    rng = np.random.default_rng(0)
+    x = rng.lognormal(size=200)
+    assert np.isclose(gini(x), mean_absolute_difference_gini(x))
+
+
+def test_weighted_equals_expanded():
+
+    # a value with weight w counts as w copies of the value
+    rng = np.random.default_rng(1)
+    preprint = rng.lognormal(size=50)
+    published = rng.lognormal(size=50)
+    weights = rng.integers(1, 6, size=50)
+
+    for x in [preprint, published]:
+        population, amount = lorenz(x, weights)
+        population_expanded, amount_expanded = lorenz(np.repeat(x, weights))
+        assert np.isclose(gini_lorenz(population, amount), gini_lorenz(population_expanded, amount_expanded))
+        assert np.isclose(gini(x, weights), gini(np.repeat(x, weights)))
+        # the weighted curve passes through the points of the expanded curve at its steps
+        assert np.allclose(amount, amount_expanded[population.astype(int)])
+
+
+def test_weighted_curves_have_their_own_population():
+
+    # the preprint and publisher curves sort the affiliations differently, so their populations differ
+    preprint = np.array([1.0, 2.0, 3.0])
+    published = np.array([3.0, 2.0, 1.0])
+    weights = np.array([1, 2, 5])
+    population_preprint, amount_preprint = lorenz(preprint, weights)
+    population_published, amount_published = lorenz(published, weights)
+    assert population_preprint.tolist() == [0, 1, 3, 8]
+    assert population_published.tolist() == [0, 5, 7, 8]
+    assert np.isclose(gini_lorenz(population_preprint, amount_preprint), gini(np.repeat(preprint, weights)))
+    assert np.isclose(gini_lorenz(population_published, amount_published), gini(np.repeat(published, weights)))
@@ -0,0 +1,23 @@
+import io
+import contextlib
+from datetime import datetime
+import numpy as np
+import citation_bias
+import synthetic_dump
+
+
+def test_parallel_equals_serial(tmp_path):
+
+    # the worker processes sum the credit of the affiliations in another order than a single process,
+    # which must not move affiliations across $num_articles_min$ (see accumulator.NUM_ARTICLES_TOLERANCE)
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=5000, seed=0)
+    configs = [dict(config, fig=False) for configs_section in citation_bias.paper_configs(datetime.strptime('2021-06', '%Y-%m')).values() for config in configs_section]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = citation_bias.citation_ineq_sweep(file_input, configs)
+        parallel = citation_bias.citation_ineq_sweep(file_input, configs, num_workers=4)
+
+    for result_serial, result_parallel in zip(serial, parallel):
+        assert result_serial[3] == result_parallel[3]
+        assert np.allclose(result_serial[:3], result_parallel[:3], rtol=1e-9, equal_nan=True)
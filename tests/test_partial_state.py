@@ -0,0 +1,67 @@
+import io
+import os
+import shutil
+import contextlib
+from datetime import datetime
+import pytest
+import citation_time
+import partial_state
+import synthetic_dump
+
+
+def write_states(tmp_path, file_input, shards):
+    state_files = []
+    for k, n in shards:
+        state_file = str(tmp_path / ('state-' + str(k) + '-' + str(n) + '.npz'))
+        partial_state.monthly_counts_state(state_file, file_input, datetime.strptime('2021-06', '%Y-%m'), 24, 0, 'na', (k, n))
+        state_files.append(state_file)
+    return state_files
+
+
+@pytest.fixture
+def file_input(tmp_path):
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=500, seed=0)
+    return file_input
+
+
+def test_merge_equals_single_run(tmp_path, file_input):
+    state_files = write_states(tmp_path, file_input, [(0, 3), (1, 3), (2, 3)])
+    kind, parameters, merged, counters = partial_state.merge_states(state_files)
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts = citation_time.monthly_counts(file_input, datetime.strptime('2021-06', '%Y-%m'), 24, 0, 'na')
+    assert merged['num_articles'] == counts['num_articles']
+    for name in citation_time.COUNTERS:
+        assert list(merged[name]) == pytest.approx(list(counts[name]))
+
+
+def test_merge_rejects_duplicate_shards(tmp_path, file_input):
+    state_files = write_states(tmp_path, file_input, [(0, 2), (1, 2)])
+    with pytest.raises(ValueError, match='same shard'):
+        partial_state.merge_states(state_files + state_files[:1])
+
+
+def test_merge_rejects_missing_shards(tmp_path, file_input):
+    state_files = write_states(tmp_path, file_input, [(0, 3), (2, 3)])
+    with pytest.raises(ValueError, match='missing'):
+        partial_state.merge_states(state_files)
+
+
+def test_merge_accepts_copies_of_the_input_file(tmp_path, file_input):
+
+    # each node of a batch has its own copy of the dump (other path and modification time)
+    copied_input = str(tmp_path / 'node' / 'dump.jsonl.gz')
+    os.makedirs(os.path.dirname(copied_input))
+    shutil.copy(file_input, copied_input)
+    os.utime(copied_input, (0, 0))
+    state_files = write_states(tmp_path, file_input, [(0, 2)]) + write_states(tmp_path / 'node', copied_input, [(1, 2)])
+    kind, parameters, merged, counters = partial_state.merge_states(state_files)
+    assert merged['num_articles'] == partial_state.merge_states(write_states(tmp_path / 'single', file_input, [(0, 1)]))[2]['num_articles']
+
+
+def test_merge_rejects_other_input_files(tmp_path, file_input):
+    other_input = str(tmp_path / 'other.jsonl.gz')
+    synthetic_dump.generate_dump(other_input, num_records=500, seed=1)
+    state_files = write_states(tmp_path, file_input, [(0, 2)]) + write_states(tmp_path / 'other', other_input, [(1, 2)])
+    with pytest.raises(ValueError, match='another input file'):
+        partial_state.merge_states(state_files)
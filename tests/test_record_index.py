@@ -0,0 +1,19 @@
+import numpy as np
+import record_index
+
+
+def make_index(column):
+    # (values, offsets, positions) as written by record_index.build_index
+    positions = np.argsort(column, kind='stable').astype(np.int64)
+    distinct, counts = np.unique(column, return_counts=True)
+    return distinct, np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), positions
+
+
+def test_lookup_and_count():
+    rng = np.random.default_rng(0)
+    column = rng.integers(-1, 30, size=1000)
+    index = make_index(column)
+    for value_min, value_max in [(None, None), (None, 5), (5, None), (3, 3), (10, 20), (20, 10), (100, None), (None, -5)]:
+        expected = np.flatnonzero((column >= (value_min if value_min != None else column.min())) & (column <= (value_max if value_max != None else column.max())))
+        assert record_index.lookup(index, value_min, value_max).tolist() == expected.tolist()
+        assert record_index.lookup_count(index, value_min, value_max) == len(expected)
@@ -0,0 +1,16 @@
+from datetime import datetime
+import citation_bias
+import result_cache
+
+
+def test_default_parameters_share_the_key(tmp_path):
+
+    # a config without its optional parameters has the same key as the one with their default values
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    with open(file_input, 'w') as f:
+        f.write('\n')
+    config = {'latest_month': datetime.strptime('2021-06', '%Y-%m'), 'max_months': 24, 'target_author': 'all', 'affiliation_level': 'country', 'target_journal': 'all',
+              'diff_month_preprint_publisher_min': 0, 'diff_month_preprint_publisher_max': 'na', 'num_articles_min': 10, 'none_citation_included': True, 'unknown_excluded': True, 'metric': 'ln'}
+    assert result_cache.result_key(file_input, config) == result_cache.result_key(file_input, citation_bias.config_defaults(config))
+    assert result_cache.result_key(file_input, config) == result_cache.result_key(file_input, dict(config, fig=False))
+    assert result_cache.result_key(file_input, config) != result_cache.result_key(file_input, dict(config, bootstrap=100))
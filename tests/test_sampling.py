@@ -0,0 +1,28 @@
+import io
+import contextlib
+from datetime import datetime
+import pytest
+import citation_bias
+import synthetic_dump
+
+
+@pytest.fixture(scope='module')
+def dump(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('sampling')
+    file_input = str(tmp_path / 'dump.jsonl.gz')
+    synthetic_dump.generate_dump(file_input, num_records=20000, seed=0)
+    return file_input, str(tmp_path / 'cache')
+
+
+@pytest.mark.parametrize('affiliation_level, num_articles_min', [('institution', 5), ('country', 10)])
+def test_exact_gini_within_standard_errors(dump, affiliation_level, num_articles_min):
+
+    # at a moderate rate, the (bias-corrected) estimates are within about 3 standard errors of the exact Gini coefficients
+    file_input, cache_dir = dump
+    parameters = (file_input, datetime.strptime('2021-06', '%Y-%m'), 24, 'all', affiliation_level, 'all', 0, 'na', num_articles_min, True, True, 'ln')
+    with contextlib.redirect_stdout(io.StringIO()):
+        exact = citation_bias.citation_ineq(*parameters, fig=False, cache_dir=cache_dir)
+        for sample_seed in range(4):
+            estimate = citation_bias.citation_ineq_sample(*parameters, cache_dir=cache_dir, sample_rate=0.2, sample_seed=sample_seed)
+            for k in range(2):
+                assert abs(estimate[k] - exact[k]) <= 3.5 * estimate[4 + k]
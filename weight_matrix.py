@@ -0,0 +1,125 @@
+# -------------------------------------------
+#
+# sparse article x affiliation matrices of fractional credit
+#
+# -------------------------------------------
+
+# modules
+import os
+import shutil
+import numpy as np
+import dump_cache
+import record_index
+
+#=========================#
+# setting
+#=========================#
+
+TARGET_AUTHORS = ['first', 'last', 'corresp', 'all']
+ROR_FIELDS = ['ror_name', 'ror_country']
+
+# arrays of a matrix in the compressed sparse row format (one row per article, one column per affiliation)
+PARTS = ['indptr', 'indices', 'data']
+
+
+def matrix_path(file_input, target_author, ror_field, cache_dir='cache'):
+    # the matrices are stored in the directory of the columnar cache, so they are removed when the cache is rebuilt
+    return os.path.join(dump_cache.cache_path(file_input, cache_dir), 'weights', target_author + '_' + ror_field)
+
+
+def build_weight_matrix(file_input, target_author, ror_field, cache_dir='cache'):
+
+    # weight of an affiliation in an article:
+    # 1 / (number of affiliations of the author) for the (first) author playing the target role,
+    # summed over all authors and divided by the number of authors if $target_author$ is 'all'
+    articles = dump_cache.load_columns(file_input, 'articles', ['num_authors'], cache_dir=cache_dir)
+    authors = dump_cache.load_columns(file_input, 'authors', [
+        'article', 'author_index', 'author_order', 'corresp', 'num_affiliations', ror_field], cache_dir=cache_dir)
+    num_records = len(articles['num_authors'])
+    num_affiliations = len(dump_cache.load_strings(file_input, ror_field, cache_dir=cache_dir))
+
+    # authors playing the target role (only the first one in the author list of each record)
+    if target_author == 'all':
+        target = np.ones(len(authors['article']), dtype=bool)
+        weights = 1 / articles['num_authors'][authors['article']]
+    else:
+        if target_author == 'first':
+            candidate = authors['author_order'] == 1
+        elif target_author == 'corresp':
+            candidate = authors['corresp'] == True
+        elif target_author == 'last':
+            candidate = authors['author_order'] == articles['num_authors'][authors['article']]
+        first_index = np.full(num_records, np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(first_index, authors['article'][candidate], authors['author_index'][candidate])
+        target = candidate & (authors['author_index'] == first_index[authors['article']])
+        weights = np.ones(len(authors['article']))
+    weights = (weights / np.maximum(authors['num_affiliations'], 1))[target]
+
+    # entries of the same article and affiliation (e.g., two authors of the same institution) are summed up
+    keys, inverse = np.unique(authors['article'][target].astype(np.int64) * num_affiliations + authors[ror_field][target], return_inverse=True)
+    data = np.bincount(inverse.ravel(), weights=weights, minlength=len(keys))
+    indices = (keys % num_affiliations).astype(np.int32)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(keys // num_affiliations, minlength=num_records))]).astype(np.int64)
+
+    path = matrix_path(file_input, target_author, ror_field, cache_dir)
+    path_tmp = path + '.tmp'
+    shutil.rmtree(path_tmp, ignore_errors=True)
+    os.makedirs(path_tmp)
+    for name, part in zip(PARTS, [indptr, indices, data]):
+        np.save(os.path.join(path_tmp, name + '.npy'), part)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(path_tmp, path)
+
+
+def load_weight_matrix(file_input, target_author, ror_field, cache_dir='cache'):
+
+    # (indptr, indices, data) of the matrix (memory-mapped), building it if necessary
+    if dump_cache.cache_valid(file_input, cache_dir) == False:
+        dump_cache.build_cache(file_input, cache_dir)
+
+    path = matrix_path(file_input, target_author, ror_field, cache_dir)
+    if os.path.exists(path) == False:
+        build_weight_matrix(file_input, target_author, ror_field, cache_dir)
+
+    return tuple([np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in PARTS])
+
+
+def build_weight_matrices(file_input, cache_dir='cache'):
+    for target_author in TARGET_AUTHORS:
+        for ror_field in ROR_FIELDS:
+            build_weight_matrix(file_input, target_author, ror_field, cache_dir)
+
+
+def rows_nonempty(matrix, rows):
+    # whether each of the articles $rows$ has at least one affiliation
+    indptr, indices, data = matrix
+    return indptr[rows + 1] > indptr[rows]
+
+
+def row_entries(matrix, rows):
+
+    # nonzero entries of the articles $rows$: index in $rows$, column (affiliation), and weight
+    indptr, indices, data = matrix
+    positions = record_index.range_positions(indptr, rows)
+    entry_rows = np.repeat(np.arange(len(rows)), indptr[rows + 1] - indptr[rows])
+    return entry_rows, np.asarray(indices[positions]), np.asarray(data[positions])
+
+
+def column_sums(matrix, rows, vectors, num_columns):
+
+    # for each vector v of values of the articles $rows$, sum_k W[rows[k], j] * v[k] (sparse matrix-vector product restricted to the rows)
+    # only the nonzero entries of $rows$ are read
+    indptr, indices, data = matrix
+    positions = record_index.range_positions(indptr, rows)
+    columns = indices[positions]
+    weights = data[positions]
+    row_of_entry = np.repeat(np.arange(len(rows)), indptr[rows + 1] - indptr[rows])
+
+    sums = {}
+    for name, vector in vectors.items():
+        if vector is None:
+            sums[name] = np.bincount(columns, weights=weights, minlength=num_columns)
+        else:
+            sums[name] = np.bincount(columns, weights=weights * vector[row_of_entry], minlength=num_columns)
+    sums['present'] = np.bincount(columns, minlength=num_columns) > 0
+    return sums